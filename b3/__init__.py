@@ -38,6 +38,7 @@ from b3.actions.wait import Wait
 from b3.decorators.inverter import Inverter
 from b3.decorators.limiter import Limiter
 from b3.decorators.maxtime import MaxTime
+from b3.decorators.budget import Budget
 from b3.decorators.repeater import Repeater
 from b3.decorators.repeatuntilfailure import RepeatUntilFailure
 from b3.decorators.repeatuntilsuccess import RepeatUntilSuccess
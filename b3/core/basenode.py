@@ -1,5 +1,6 @@
 import b3
 import uuid
+import time
 
 
 __all__ = ['BaseNode']
@@ -149,7 +150,15 @@ class BaseNode(object):
             print('basenode: ', self.Name, " ticked ")
         #BH count the ticks
         self.N_ticks_all += 1
+        trace = tick.tree.trace
+        if trace is not None:
+            unk = tick.blackboard.get('curr_unk')   # (before the tick, assigner changes it)
+            t0 = time.monotonic()
         status = self.tick(tick)
+        if trace is not None:
+            trace.emit('tick', node=self.Name, unknown=getattr(unk, 'symbol', None),
+                       elapsed=time.monotonic() - t0, status=status,
+                       category=self.category)
         #BH count the total cost 
         tick.blackboard.inc('TotalCost',self.Cost)
         
@@ -16,6 +16,7 @@ class BehaviorTree(object):
         self.tick_count = 0
         self.log_flag = 0  # write a log of node results 1 = SUCCESS only 2 = both S+F
         self.log_file = None  # file object
+        self.trace = None     # ikbtbasics.solve_trace.SolveTrace: JSON event per node tick
 
     def load(self, data, names=None):
         names = names or {}
@@ -0,0 +1,219 @@
+import b3
+import os
+import time
+import math
+import signal
+import traceback
+import unittest
+import multiprocessing as mp
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+__all__ = ['Budget']
+
+#  BH  Unlike MaxTime (which only looks at the clock after the child has
+#  returned), Budget runs the child in a forked worker process and kills it
+#  when it goes over budget:
+#
+#      max_time:   wall clock seconds   (parent stops waiting, kills worker)
+#      max_cpu:    cpu seconds          (RLIMIT_CPU in the worker)
+#      max_memory: bytes of address space (RLIMIT_AS in the worker)
+#
+#  The worker sends the blackboard memory back when the child finishes so
+#  the rest of the tree sees the child's results.  An overrun returns
+#  FAILURE (so a Priority can move on) and is recorded on the blackboard
+#  under 'budget_overruns' and in the tree log (if logging).
+#
+#  Where fork is not available the child is ticked in-process and only the
+#  wall clock is checked afterwards (same as MaxTime).
+#
+#  Any other exception in the child (a bug in a leaf, a blackboard that
+#  can't be pickled back) is not an overrun: it is sent back and raised
+#  again in the parent, as if the child had been ticked without a budget.
+
+
+def _limit(want, hard):
+    # soft limit: setrlimit() refuses one above the hard limit
+    if hard != resource.RLIM_INFINITY:
+        return min(want, hard)
+    return want
+
+
+def _budget_worker(node, tick, conn, max_cpu, max_memory):
+    if resource is not None:
+        if max_cpu is not None:
+            soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            used = resource.getrusage(resource.RUSAGE_SELF).ru_utime
+            resource.setrlimit(resource.RLIMIT_CPU, (_limit(int(math.ceil(used + max_cpu)), hard), hard))
+        if max_memory is not None:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (_limit(int(max_memory), hard), hard))
+    try:
+        status = node._execute(tick)
+        bb = tick.blackboard
+        conn.send([status, bb._base_memory, bb._tree_memory, None])
+    except MemoryError:
+        conn.send([b3.FAILURE, None, None, 'memory'])
+    except Exception as e:
+        tb = traceback.format_exc()
+        try:
+            conn.send([None, e, tb, 'error'])
+        except Exception:   # (the exception itself won't pickle)
+            conn.send([None, None, tb, 'error'])
+    conn.close()
+
+
+class Budget(b3.Decorator):
+    def __init__(self, child, max_time=None, max_cpu=None, max_memory=None):
+        super(Budget, self).__init__(child)
+
+        self.max_time = max_time
+        self.max_cpu = max_cpu
+        self.max_memory = max_memory
+        self.N_overruns = 0
+
+    def tick(self, tick):
+        if not self.child:
+            return b3.ERROR
+
+        t0 = time.time()
+        if 'fork' not in mp.get_all_start_methods():
+            status = self.child._execute(tick)
+            if self.max_time is not None and time.time() - t0 > self.max_time:
+                return self.overrun(tick, 'time', time.time() - t0)
+            return status
+
+        ctx = mp.get_context('fork')
+        rcv, snd = ctx.Pipe(duplex=False)
+        p = ctx.Process(target=_budget_worker,
+                        args=(self.child, tick, snd, self.max_cpu, self.max_memory))
+        p.start()
+        snd.close()
+        result = None
+        timedout = True
+        if rcv.poll(self.max_time):
+            timedout = False
+            try:
+                result = rcv.recv()
+            except EOFError:   # worker died (e.g. SIGXCPU from RLIMIT_CPU)
+                result = None
+        rcv.close()
+        elapsed = time.time() - t0
+
+        if result is None:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+            if timedout:
+                return self.overrun(tick, 'time', elapsed)
+            if p.exitcode == -signal.SIGXCPU:
+                return self.overrun(tick, 'cpu', elapsed)
+            return self.overrun(tick, 'crash', elapsed)
+        p.join()
+
+        [status, base, trees, reason] = result
+        if reason == 'error':   # base: the exception, trees: its traceback
+            remote = RuntimeError('in the Budget worker:\n' + trees)
+            if base is not None:
+                raise base from remote
+            raise remote
+        if reason is not None:
+            return self.overrun(tick, reason, elapsed)
+
+        # copy back the child's view of the blackboard
+        bb = tick.blackboard
+        bb._base_memory.clear()
+        bb._base_memory.update(base)
+        bb._tree_memory.clear()
+        bb._tree_memory.update(trees)
+        return status
+
+    def overrun(self, tick, reason, elapsed):
+        self.N_overruns += 1
+        rec = {'node': self.child.Name, 'reason': reason, 'elapsed': elapsed,
+               'max_time': self.max_time, 'max_cpu': self.max_cpu,
+               'max_memory': self.max_memory}
+        overruns = tick.blackboard.get('budget_overruns')
+        if overruns is None:
+            overruns = []
+        overruns.append(rec)
+        tick.blackboard.set('budget_overruns', overruns)
+        print('Budget: ', self.child.Name, ' over ', reason, ' budget after {:.1f} sec'.format(elapsed))
+        if tick.tree.log_flag > 0:
+            tick.tree.log_file.write('O '+self.child.Name+' '+reason+' {:.3f}\n'.format(elapsed))
+        if tick.tree.trace is not None:
+            tick.tree.trace.emit('overrun', node=self.child.Name, elapsed=elapsed, reason=reason)
+        return b3.FAILURE
+
+
+class _Leaf(b3.Action):
+    # test leaf: does what() and writes 'done' to the blackboard
+    def __init__(self, what=None):
+        super(_Leaf, self).__init__()
+        self.what = what
+
+    def tick(self, tick):
+        if self.what is not None:
+            self.what()
+        tick.blackboard.set('done', 42)
+        return b3.SUCCESS
+
+
+def _fail():
+    raise ValueError('leaf bug')
+
+
+def _hog():
+    x = bytearray(2**30)
+    return x
+
+
+class TestBudget(unittest.TestCase):
+    def run_tree(self, node):
+        bb = b3.Blackboard()
+        tree = b3.BehaviorTree()
+        tree.root = node
+        return [tree.tick('test the Budget', bb), bb]
+
+    def test_success(self):
+        [status, bb] = self.run_tree(Budget(_Leaf(), max_time=60, max_cpu=60))
+        self.assertEqual(status, b3.SUCCESS)
+        self.assertEqual(bb.get('done'), 42)    # (written in the worker)
+        self.assertEqual(bb.get('budget_overruns'), None)
+
+    def test_time(self):
+        node = Budget(_Leaf(lambda: time.sleep(10)), max_time=0.5)
+        [status, bb] = self.run_tree(node)
+        self.assertEqual(status, b3.FAILURE)
+        self.assertEqual(bb.get('done'), None)
+        self.assertEqual([r['reason'] for r in bb.get('budget_overruns')], ['time'])
+        self.assertEqual(node.N_overruns, 1)
+
+    @unittest.skipUnless(resource is not None and os.path.isfile('/proc/self/statm'), 'needs RLIMIT_AS (linux)')
+    def test_memory(self):
+        with open('/proc/self/statm') as f:
+            vm = int(f.read().split()[0]) * resource.getpagesize()
+        [status, bb] = self.run_tree(Budget(_Leaf(_hog), max_time=60, max_memory=vm + 2**28))
+        self.assertEqual(status, b3.FAILURE)
+        self.assertEqual([r['reason'] for r in bb.get('budget_overruns')], ['memory'])
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            self.run_tree(Budget(_Leaf(_fail), max_time=60))
+
+    def test_no_fork(self):
+        from unittest import mock
+        with mock.patch.object(mp, 'get_all_start_methods', return_value=['spawn']):
+            [status, bb] = self.run_tree(Budget(_Leaf(), max_time=60))
+            self.assertEqual([status, bb.get('done')], [b3.SUCCESS, 42])
+            [status, bb] = self.run_tree(Budget(_Leaf(lambda: time.sleep(0.2)), max_time=0.1))
+            self.assertEqual(status, b3.FAILURE)    # (checked after the fact, like MaxTime)
+            self.assertEqual(bb.get('done'), 42)
+            self.assertEqual([r['reason'] for r in bb.get('budget_overruns')], ['time'])
+
+
+if __name__ == '__main__':
+    unittest.main()
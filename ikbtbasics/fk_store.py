@@ -0,0 +1,290 @@
+#!/usr/bin/python
+#
+#   Storage format for the pre-computed forward kinematics (fk_eqns/NAME_pickle.p)
+#
+#   The file holds three pickles:
+#       header:  {'format': FORMAT, 'version': VERSION, 'sympy': ...}
+#       table:   every sympy expression in the Mech, Robot and unknowns,
+#                as a DAG of shared subexpressions: one entry per distinct
+#                subexpression, either  [atom]  or  [func, argument indices]
+#       state:   [m, R, unknowns], pickled with the expressions replaced by
+#                indices into the table
+#
+#   Expression and Matrix attributes of kequation, matrix_equation and
+#   mechanism are only rebuilt from the table when they are first used
+#   (LazyAttributes), so loading doesn't build the equations a solution never
+#   looks at.  Files written before this format (a plain pickle of
+#   [m, R, unknowns]) still load.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import io
+import pickle
+import unittest
+import sympy as sp
+
+FORMAT = 'IKBT forward kinematics'
+VERSION = 2     # change when the layout of the table or state changes
+                #   (or what the FK+SOA step stores: 2 = single SOA aux eqns)
+
+PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+class ExprTable(object):
+    """deduplicated DAG of sympy expressions.  add(expr) -> index while
+    saving, expr(index) -> expression while loading (each entry built once)"""
+
+    def __init__(self, nodes=None):
+        self.nodes = nodes if nodes is not None else []
+        self.index = {}      # expression: index  (saving)
+        self.built = {}      # index: expression  (loading)
+
+    def add(self, expr):
+        # post order, without recursion (FK expressions can be deep)
+        if expr in self.index:
+            return self.index[expr]
+        stack = [expr]
+        while len(stack) > 0:
+            e = stack[-1]
+            if e in self.index:
+                stack.pop()
+                continue
+            if e.is_Atom or len(e.args) == 0:
+                entry = [e]
+            else:
+                todo = [a for a in e.args if a not in self.index]
+                if len(todo) > 0:
+                    stack.extend(todo)
+                    continue
+                entry = [e.func, [self.index[a] for a in e.args]]
+            stack.pop()
+            self.index[e] = len(self.nodes)
+            self.nodes.append(entry)
+        return self.index[expr]
+
+    def expr(self, i):
+        if i in self.built:
+            return self.built[i]
+        stack = [i]
+        while len(stack) > 0:
+            j = stack[-1]
+            if j in self.built:
+                stack.pop()
+                continue
+            entry = self.nodes[j]
+            if len(entry) == 1:
+                self.built[j] = entry[0]
+                stack.pop()
+                continue
+            todo = [k for k in entry[1] if k not in self.built]
+            if len(todo) > 0:
+                stack.extend(todo)
+                continue
+            self.built[j] = rebuild(entry[0], [self.built[k] for k in entry[1]])
+            stack.pop()
+        return self.built[i]
+
+    def add_matrix(self, M):
+        return [type(M), M.rows, M.cols, [self.add(e) for e in M]]
+
+    def matrix(self, spec):
+        [cls, rows, cols, elems] = spec
+        return cls(rows, cols, [self.expr(k) for k in elems])
+
+    def __reduce__(self):
+        # the table is written on its own; the state only refers to it
+        raise pickle.PicklingError('ExprTable is stored by fk_store.save()')
+
+
+def rebuild(func, args):
+    #  expr.func(*expr.args) == expr, without re-evaluating Add/Mul/Pow
+    if issubclass(func, sp.core.operations.AssocOp):
+        return func._from_args(args)
+    if func is sp.Pow:
+        return sp.Pow(*args, evaluate=False)
+    return func(*args)
+
+
+def is_matrix(x):
+    return isinstance(x, sp.MatrixBase)
+
+
+class LazyAttributes(object):
+    """Mixin: attributes listed in self._lazy (name: [kind, spec]) are built
+    from self._exprs (an ExprTable) the first time they are used."""
+
+    def __getattr__(self, name):
+        # (only called when name is not in __dict__)
+        lazy = self.__dict__.get('_lazy')
+        if lazy is None or name not in lazy:
+            raise AttributeError(name)
+        [kind, spec] = lazy.pop(name)
+        table = self.__dict__['_exprs']
+        if kind == 'matrix':
+            value = table.matrix(spec)
+        else:
+            value = table.expr(spec)
+        self.__dict__[name] = value
+        return value
+
+    def materialize(self):
+        for name in list(self.__dict__.get('_lazy', {})):
+            getattr(self, name)
+        self.__dict__.pop('_lazy', None)
+        self.__dict__.pop('_exprs', None)
+
+    def __getstate__(self):     # plain pickle / copy: everything built
+        self.materialize()
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+def _load_object(cls, state, table, lazy):
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    if len(lazy) > 0:
+        obj.__dict__['_lazy'] = lazy
+        obj.__dict__['_exprs'] = table
+    return obj
+
+
+def _load_expr(table, i):
+    return table.expr(i)
+
+
+def _load_matrix(table, spec):
+    return table.matrix(spec)
+
+
+class StorePickler(pickle.Pickler):
+    def __init__(self, f, table):
+        super(StorePickler, self).__init__(f, protocol=PROTOCOL)
+        self.table = table
+
+    def persistent_id(self, obj):
+        if obj is self.table:
+            return 'exprs'
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, sp.Basic):
+            return (_load_expr, (self.table, self.table.add(obj)))
+        if is_matrix(obj):
+            return (_load_matrix, (self.table, self.table.add_matrix(obj)))
+        if isinstance(obj, LazyAttributes):
+            if '_lazy' in obj.__dict__:
+                obj.materialize()
+            state = {}
+            lazy = {}
+            for [name, v] in obj.__dict__.items():
+                if isinstance(v, sp.Basic):
+                    lazy[name] = ['expr', self.table.add(v)]
+                elif is_matrix(v):
+                    lazy[name] = ['matrix', self.table.add_matrix(v)]
+                else:
+                    state[name] = v
+            return (_load_object, (type(obj), state, self.table, lazy))
+        return NotImplemented
+
+
+class StoreUnpickler(pickle.Unpickler):
+    def __init__(self, f, table):
+        super(StoreUnpickler, self).__init__(f)
+        self.table = table
+
+    def persistent_load(self, pid):
+        if pid == 'exprs':
+            return self.table
+        raise pickle.UnpicklingError('unknown persistent id: ' + str(pid))
+
+
+def save(fname, m, R, unknowns):
+    table = ExprTable()
+    buf = io.BytesIO()
+    StorePickler(buf, table).dump([m, R, list(unknowns)])
+    header = {'format': FORMAT, 'version': VERSION, 'sympy': sp.__version__,
+              'nexprs': len(table.nodes)}
+    with open(fname, 'wb') as pf:
+        pickle.dump(header, pf, protocol=PROTOCOL)
+        pickle.dump(table.nodes, pf, protocol=PROTOCOL)
+        pf.write(buf.getvalue())
+
+
+def load(fname):
+    """returns [m, R, unknowns], or None if the file is in an older
+    version of this format (then it has to be computed again)"""
+    with open(fname, 'rb') as pf:
+        header = pickle.load(pf)
+        if isinstance(header, list):        # plain pickle (before fk_store)
+            return header
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            print('fk_store: ', fname, ' is not a forward kinematics file')
+            return None
+        if header['version'] != VERSION:
+            print('fk_store: ', fname, ' is version ', header['version'],
+                  ' (need ', VERSION, ')')
+            return None
+        table = ExprTable(pickle.load(pf))
+        return StoreUnpickler(pf, table).load()
+
+
+class TestFKStore(unittest.TestCase):
+    def test_exprtable(self):
+        (x, y, z) = sp.symbols('x y z')
+        exprs = [sp.cos(x + y) * sp.sin(z) - sp.Rational(1, 2),
+                 sp.sqrt(x**2 + y**2) + sp.cos(x + y),
+                 sp.atan2(-sp.sin(z), x*y), sp.Float(0.1) * sp.pi, sp.Integer(0)]
+        t = ExprTable()
+        ids = [t.add(e) for e in exprs]
+        self.assertEqual(t.add(x + y), t.add(y + x))   # shared subexpression
+        t2 = ExprTable(pickle.loads(pickle.dumps(t.nodes)))
+        for [e, i] in zip(exprs, ids):
+            self.assertEqual(sp.srepr(t2.expr(i)), sp.srepr(e))
+
+    def test_lazy(self):
+        import tempfile
+        import os
+        import ikbtbasics.kin_cl as kc
+        (x, y) = sp.symbols('x y')
+        m = kc.mechanism(sp.Matrix([[0, 0, x, y]]), [y], [x])
+        m.T_06 = sp.ImmutableMatrix([[sp.cos(x), -sp.sin(x)], [sp.sin(x), y]])
+        e = kc.kequation(sp.sin(x), y * sp.cos(x))
+        unks = [kc.unknown(x)]
+        unks[0].eqnlist.append(e)
+        state = [m, [e, e], unks]  # (R is any object)
+        fd, fname = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            save(fname, *state)
+            [m2, l2, u2] = load(fname)
+        finally:
+            os.remove(fname)
+        self.assertTrue(l2[0] is l2[1])
+        self.assertTrue(l2[0] is u2[0].eqnlist[0])
+        self.assertTrue('RHS' in l2[0].__dict__['_lazy'])   # not built yet
+        self.assertEqual(l2[0].RHS, e.RHS)
+        self.assertFalse('RHS' in l2[0].__dict__['_lazy'])
+        self.assertEqual(m2.T_06, m.T_06)
+        self.assertEqual(type(m2.T_06), type(m.T_06))
+        self.assertEqual(m2.DH, m.DH)
+        e3 = pickle.loads(pickle.dumps(l2[0]))    # plain pickle still works
+        self.assertEqual(e3.LHS, e.LHS)
+        self.assertFalse('_lazy' in e3.__dict__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,7 +27,11 @@ import os as os
 import ikbtbasics.pykinsym as pks
 import re
 from ikbtbasics.solution_graph_v2 import *
+import ikbtbasics.solution_graph_v2 as sgv2
 import ikbtbasics.matching as mtch
+import ikbtbasics.fk_store as fk_store
+import ikbtbasics.symtab as symtab
+import ikbtbasics.mem_profile as mem_profile
 import sys as sys
 import b3 as b3  # behavior trees
 import pickle
@@ -52,7 +56,7 @@ sp.var("l_5 l_6")
 sp.var("th_12, th_23, th_34, th_45, th_56")
 sp.var("th_123,th_234,th_345,th_456")
 sp.var("c_12 s_12 c_23 s_23 c_34 s_34 c_45 s_45 c_56 s_56 c_13 s_13")
-sp.var("x")  # super generic place holder
+x = symtab.PLACEHOLDER  # super generic place holder
 soa_vars = [th_12, th_23, th_34, th_45, th_56]  # a list of the sum-of-angles variables
 
 soa_expansions = {}
@@ -66,7 +70,6 @@ soa_expansions[th_234] = th_2 + th_3 + th_4
 soa_expansions[th_345] = th_3 + th_4 + th_5
 soa_expansions[th_456] = th_4 + th_5 + th_6
 
-pprotocol = 2
 #
 #   retrieve forward kinematics from a pickle file if it exists.
 #      if it doesn't, compute the FK and store it in a pickle file.
@@ -86,12 +89,14 @@ def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
 
     print("kinematics pickle: trying to open ", name, " in ", os.getcwd())
 
+    stored = None
     if os.path.isfile(name):
-        with open(name, "rb") as pick:
-            print("\Trying to read pre-computed forward kinematics from " + name)
-            [m, R, unknowns] = pickle.load(pick)
-            print("Successfully read pre-computed forward kinematics")
-            print("pickle contained ", len(unknowns), " unknowns")
+        print("\nTrying to read pre-computed forward kinematics from " + name)
+        stored = fk_store.load(name)  # None if the file format is out of date
+    if stored is not None:
+        [m, R, unknowns] = stored
+        print("Successfully read pre-computed forward kinematics")
+        print("pickle contained ", len(unknowns), " unknowns")
     else:
         # print 'WRONG - quitting, error: ',sys.exc_info()[0]
         # sys.exit
@@ -101,24 +106,26 @@ def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
         print("Did not find VALID stored pickle file: ", name)
         print("Starting Forward Kinematics")
         m.forward_kinematics()
+        mem_profile.checkpoint("FK")
         print("Completed Forward Kinematics")
         print("Starting Sum of Angles scan (slow!)")
 
         # set up Robot Object instance
         R = Robot(m, rname)  # set up IK structs etc
+        mem_profile.checkpoint("mequations")
         R.scan_for_equations(unks)  # generate equation lists
 
         # below is commented out for testing and devel of sum_of_angles_transform
         R.sum_of_angles_transform(unks)  # find sum of angles
+        mem_profile.checkpoint("SOA")
 
         R.generate_solution_nodes(unks)  # generate solution nodes
 
         print(" Storing kinematics pickle for " + rname + "(" + name + ")")
-        with open(name, "wb") as pf:
-            pickle.dump([m, R, unks], pf, protocol=pprotocol)
+        fk_store.save(name, m, R, unks)
         unknowns = unks  # be sure to return updated unknown list (including SOAs)
 
-    return [m, R, unknowns]
+    return [m, R, kc.UnknownList(unknowns)]
 
 
 def check_the_pickle(dh1, dh2):  # check that two mechanisms have identical DH params
@@ -162,12 +169,15 @@ def find_xy(thx, thy):
     thxy_lookup[th_45] = [th_345, th_456]
     thxy_lookup[th_56] = [th_456]
 
-    # one symbol in common is the th_xy we're looking for
-    thx_s = set(thxy_lookup[thx])
-    thy_s = set(thxy_lookup[thy])
-    thxy_s = thx_s.intersection(thy_s)
-    thxy = thxy_s.pop()
-    return thxy
+    # a symbol in common is the th_xy we're looking for.  th_3, th_4 have
+    #   th_34, th_234 and th_345 in common: take the exact sum (th_34),
+    #   never an arbitrary set.pop()
+    common = [t for t in thxy_lookup[thx] if t in thxy_lookup[thy]]
+    digits = sorted(str(thx)[3:] + str(thy)[3:])
+    for t in common:
+        if sorted(str(t)[3:]) == digits:
+            return t
+    return sorted(common, key=str)[0]
 
 
 # def find_sum(thx,thy):
@@ -182,11 +192,12 @@ class Robot:
         self.soltag = ""  # suffix tag for current solution level leafs
         self.params = []  # constant dh params such as l_4 etc.
         self.solution_nodes = []  # first one is the root, by solve order
+        self.node_index = {}  # symbol: node in solution_nodes (see find_node())
         self.variables_symbols = []
         #
         #   "notations" means specifically labeled solution variables such as
         #          th_1s2  (theta-1, solution 2)
-        self.notation_graph = set()  # solution nodes notation graph
+        self.notation_graph = sgv2.NotationGraph()  # solution nodes notation graph (set of Edges)
         self.notation_collections = []  # solution notations divided into subgroups
 
         self.min_index = 0
@@ -195,6 +206,8 @@ class Robot:
         self.mequation_list = []
         # kequation_aux_list:    sum of angle eqns such as eg th_23 = th_2+th_3
         self.kequation_aux_list = []
+        # eqn_index:   the equations above by symbol (scan_for_equations())
+        self.eqn_index = kc.EquationIndex()
         # a matrix equation in which to embed important kequations equations
         #    this is done for compatibility with the id/solvers
         #    self.SOA_eqns = kc.matrix_equation()
@@ -227,6 +240,50 @@ class Robot:
             )  # all the Matrix FK equations
             print("ik_classes: length Robot.mequation_list: ", len(self.mequation_list))
 
+    def __getstate__(self):  # (eqn_index is rebuilt by the next scan)
+        state = self.__dict__.copy()
+        state.pop("eqn_index", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "node_index" not in state:  # pickled before the index
+            self.node_index = {}
+        self.eqn_index = kc.EquationIndex()
+
+    def find_node(self, symbol):
+        """solution node for symbol (or None)"""
+        node = self.node_index.get(symbol)
+        if len(self.node_index) != len(self.solution_nodes):
+            # solution_nodes was changed directly: re-index
+            self.node_index = {}
+            for n in reversed(self.solution_nodes):  # first one wins
+                self.node_index[n.symbol] = n
+            node = self.node_index.get(symbol)
+        return node
+
+    def squeeze_map(self):
+        """notation_squeeze() map for this robot: its revolute joints (from
+        the DH table, any names) and the sums of angles found so far
+        (kequation_aux_list)"""
+        joints = range(1, 7)
+        Mech = getattr(self, "Mech", None)
+        if Mech is not None:
+            joints = set()
+            for i in range(Mech.DH.shape[0]):
+                if Mech.vv[i] == 1:
+                    joints |= Mech.DH[i, 3].free_symbols
+            joints = sorted(joints, key=str)
+        sums = {}
+        for e in self.kequation_aux_list:  # th_23 = th_2 + th_3
+            if isinstance(e.LHS, sp.Symbol) and e.RHS.is_Add:
+                sums[e.LHS] = e.RHS
+        return pks.squeeze_map(joints, sums)
+
+    def add_node(self, node):
+        self.solution_nodes.append(node)
+        self.node_index.setdefault(node.symbol, node)
+
     def generate_solution_nodes(self, unknowns):
         """generate solution nodes"""
         for unk in unknowns:
@@ -234,7 +291,7 @@ class Robot:
                 unk.solvemethod != ""
             ):  # this means the unk was not used at all in solution
                 #  typically SOA unknowns like th_23
-                self.solution_nodes.append(Node(unk))
+                self.add_node(Node(unk))
                 self.variables_symbols.append(unk.symbol)
 
         print(self.solution_nodes)
@@ -243,65 +300,32 @@ class Robot:
     # get lists of unsolved equations having 1 and 2 unks
     # class Robot:
     def scan_for_equations(self, variables):
-        self.l1 = []  # equations with one unk nown (if any)
-        self.l2 = []  # equations with two unknowns
-        self.l3p = []  # 3 OR MORE unknowns
-        sp.var("x")  # this will be used to generate 'algebraic zero'
-        # elist = self.mequation_list.append(self.kequation_aux_list)
-        elist = self.mequation_list
-        # print '------------------------- elist----'
-        # print elist
-        # print ('-------- (aux eqns):')
-        # print (self.kequation_aux_list)
-        # print ('--------')
-        assert len(elist) > 0, "  not enough equations "
-        # i=0
-        # for e in self.kequation_aux_list:
-        # elist[0][3][i] = e  # HACK: put aux eqns into row 4 Meqn[0]
-        # print 'scan_for_equns: putting ', e, 'into eqn'
-        # i+=1
-        for eqn in elist:
-            lhs = eqn.Td  # 4x4 matrix
-            rhs = eqn.Ts  # 4x4 matrix
-            for i in [0, 1, 2, 3]:
-                for j in range(0, 4):
-                    lh1x1 = lhs[i, j]
-                    rh1x1 = rhs[i, j]
-                    n = count_unknowns(variables, lh1x1) + count_unknowns(
-                        variables, rh1x1
-                    )
-                    e1 = kc.kequation(lh1x1, rh1x1)
-                    if n == 1:
-                        flag = False
-
-                        if e1 not in self.l1:
-                            self.l1.append(e1)  # only append if not already there
-                    if n == 2:
-                        flag = False
-
-                        if e1 not in self.l2:
-                            self.l2.append(e1)  # only append if not already there
-                    if n > 2:
-
-                        if e1 not in self.l3p:
-                            self.l3p.append(e1)  # only append if not already there
+        # equations from the index: only elements changed since the last
+        #   scan are rebuilt, and the unknowns' eqnlists are views of it
+        assert len(self.mequation_list) > 0, "  not enough equations "
+        idx = self.eqn_index.refresh(self.mequation_list, self.kequation_aux_list)
+        unsolved = [u.symbol for u in variables if u.solved == False]
+        for u in variables:
+            u.eqn_index = idx
+        ls = [[], [], []]  # 1, 2, 3 OR MORE unknowns
+        seen = [set(), set(), set()]
+        for e in idx.matrix_equations():
+            n = e.count(unsolved)
+            if n > 0:
+                k = min(n, 3) - 1
+                if (e.LHS, e.RHS) not in seen[k]:  # only append if not already there
+                    seen[k].add((e.LHS, e.RHS))
+                    ls[k].append(e)
         # Process the SOA equations
-        for e in self.kequation_aux_list:
-            lhs = e.LHS
-            rhs = e.RHS
-            n = count_unknowns(variables, lhs) + count_unknowns(variables, rhs)
-            if n == 1:
-                self.l1.append(
-                    kc.kequation(lhs, rhs)
-                )  # change from 0, rhs-lhs !!  ************
-            if n == 2:
-                self.l2.append(kc.kequation(lhs, rhs))
-
-        self.l1 = erank(
-            self.l1
-        )  # sort the equations (in place) so solvers get preferred eqns first
-        self.l2 = erank(self.l2)
-        self.l3p = erank(self.l3p)
+        for e in idx.aux_equations():
+            n = e.count(unsolved)
+            if n == 1 or n == 2:
+                ls[n - 1].append(e)
+
+        # sort the equations so solvers get preferred eqns first (as erank())
+        [self.l1, self.l2, self.l3p] = [
+            [e.kequation() for e in sorted(l, key=kc.IndexedEquation.ops)] for l in ls
+        ]
         return [self.l1, self.l2, self.l3p]
         # end of scan_for_eqns
 
@@ -341,6 +365,7 @@ class Robot:
     def sum_of_angles_transform(self, variables):
         print("Starting sum-of-angles scan. Please be patient")
         unkn_sums_sym = set()  # keep track of joint variable symbols
+        cands = soa_candidates(getattr(self, "Mech", None))  # th_2 + th_3 etc. from the DH table
 
         # k = equation number
         # i = row, j=col
@@ -368,20 +393,12 @@ class Robot:
                     lhs = Meq.Td[i, j]
                     rhs = Meq.Ts[i, j]
 
+                    # sum_of_angles_sub() adds new SOA variables and their
+                    #   equations to variables and self.kequation_aux_list
                     # simplify LHS
-
-                    lhs, newj, newe = sum_of_angles_sub(self, lhs, variables)
-
-                    if newj:
-                        variables.append(newj)
-                    if newe:
-                        self.kequation_aux_list.append(newe)
+                    lhs, newj, newe = sum_of_angles_sub(self, lhs, variables, cands)
                     # simplify RHS
-                    rhs, newj, newe = sum_of_angles_sub(self, rhs, variables)
-                    if newj:
-                        variables.append(newj)
-                    if newe:
-                        self.kequation_aux_list.append(newe)
+                    rhs, newj, newe = sum_of_angles_sub(self, rhs, variables, cands)
 
                     Meq.Td[i, j] = lhs
                     Meq.Ts[i, j] = rhs
@@ -398,7 +415,79 @@ class Robot:
 # (april: separate out for easier testing)
 
 
-def sum_of_angles_sub(R, expr, variables):
+def soa_candidates(Mech):
+    """sums of angles which can appear in the FK of Mech: {th_2 + th_3: [th_2, th_3], ...}
+    runs of revolute joints with parallel axes (alpha == 0 between them, see
+    mechanism.parallel_axes()), all sums of 2 or 3 consecutive ones.
+    (alpha == pi gives differences, th_5 - th_6: left to the wildcard search)"""
+    if Mech is None:
+        return {}
+    par = set([j for j in Mech.parallel_axes() if Mech.DH[j, 0] == 0])
+    runs = []
+    run = []
+    for i in range(Mech.DH.shape[0]):
+        if i not in par:  # new run of parallel axes
+            runs.append(run)
+            run = []
+        th = Mech.DH[i, 3]
+        if Mech.vv[i] == 1 and isinstance(th, sp.Symbol):
+            run.append(th)  # (prismatic joints don't break a run)
+    runs.append(run)
+    cands = {}
+    for run in runs:
+        for n in [2, 3]:
+            for k in range(0, len(run) - n + 1):
+                cands[sp.Add(*run[k : k + n])] = run[k : k + n]
+    return cands
+
+
+def angle_sums(expr):
+    # the sin()/cos() in expr whose argument is a sum (one walk)
+    return [f for f in expr.atoms(sp.sin, sp.cos) if f.args[0].is_Add]
+
+
+def sum_of_angles_sub(R, expr, variables, cands=None):
+    #  sums of angles from the DH table (soa_candidates()) are replaced in
+    #    one xreplace.  Anything else (no Mech, th_5 - th_6, ...) goes on to
+    #    the wildcard search below.
+    if cands is None:
+        cands = soa_candidates(getattr(R, "Mech", None))
+    newjoint = None
+    tmpeqn = None
+    rule = {}
+    leftover = False
+    for f in sorted(angle_sums(expr), key=sp.default_sort_key):
+        arg = f.args[0]
+        if arg in rule:
+            continue
+        if arg not in cands:
+            leftover = True
+            continue
+        nil = sorted([str(get_variable_index(variables, v)) for v in cands[arg]])
+        ni = "".join(nil)  # e.g. 234
+        th_new = symtab.soa(ni)
+        rule[arg] = th_new
+        if len([v for v in variables if v.n == int(ni)]) == 0:
+            print(":  found new 'joint' (sumofangle) variable: ", th_new)
+            newjoint = kc.unknown(th_new)
+            newjoint.n = int(ni)
+            newjoint.solved = False  # just to be clear for count_unknowns
+            variables.append(newjoint)  # add it to unknowns list
+            tmpeqn = kc.kequation(th_new, arg)
+            print("sum_of_angles_sub: created new equation:", tmpeqn)
+            R.kequation_aux_list.append(tmpeqn)
+    if len(rule) > 0:
+        expr = expr.xreplace(rule)
+    if leftover:
+        [expr, nj, ne] = sum_of_angles_wild(R, expr, variables)
+        if nj is not None:
+            newjoint = nj
+        if ne is not None:
+            tmpeqn = ne
+    return (expr, newjoint, tmpeqn)
+
+
+def sum_of_angles_wild(R, expr, variables):  # (the general version)
     aw = sp.Wild("aw")
     bw = sp.Wild("bw")
     cw = sp.Wild("cw")
@@ -454,7 +543,7 @@ def sum_of_angles_sub(R, expr, variables):
                     vexists = True
             newjoint = None
             tmpeqn = None
-            th_new = sp.var("th_" + ni)  # create iff doesn't yet exist
+            th_new = symtab.soa(ni)  # (same Symbol if it already exists)
             th_subval = th_new
             if not vexists:
                 print(":  found new 'joint' (sumofangle) variable: ", th_new)
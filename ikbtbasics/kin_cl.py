@@ -23,6 +23,11 @@ import numpy as np
 from ikbtbasics.pykinsym import *
 
 from ikbtbasics.solution_graph_v2 import *
+import ikbtbasics.solution_graph_v2 as sgv2  # (Node, when imported from there)
+from ikbtbasics.solution_record import *
+import ikbtbasics.symtab as symtab
+import ikbtbasics.solve_trace as solve_trace
+from ikbtbasics.fk_store import LazyAttributes  # (loading fk_eqns/ files)
 
 import ikbtfunctions.helperfunctions as hf
 
@@ -44,11 +49,11 @@ JACOBIAN = True  #  False = disable velocity calculations for FK speed
 #        Revision 4  25-May-2017  (update to unittest debugging)
 #
 
-sp.init_printing()
-sp.var("x")
+hf.init_printing()
+x = symtab.PLACEHOLDER
 
 #  Kinematic Equation class
-class kequation:
+class kequation(LazyAttributes):
     def __init__(self, LHS=x, RHS=x):
         self.LHS = LHS
         self.RHS = RHS
@@ -78,15 +83,16 @@ class kequation:
     def __hash__(self):
         return hash(str(self.LHS) + str(self.RHS))
 
-    def LaTexOutput(self, align=False):
-        tmp = sp.latex(self.RHS)
+    def LaTexOutput(self, align=False, latex=sp.latex):
+        # latex: the printer (e.g. output_latex.latex(), sp.latex memoized)
+        tmp = latex(self.RHS)
         # TODO: delete these comments or restore functionality
         # tmp = tmp.replace(r'^(.+)/(.+)', '\\frac{\1}{\2}')
         # tmp = tmp.replace('\\frac{(.+)}{(.+)}(.+)',r'\\frac{\1\3}{\2}')
         tab = " "
         if align:
             tab = " &"
-        self.string = sp.latex(self.LHS) + tab + "= " + tmp
+        self.string = latex(self.LHS) + tab + "= " + tmp
 
         tmp = self.string
         tmp = tmp.replace(r"th_", r"\theta_")  # change to greek theta
@@ -95,27 +101,170 @@ class kequation:
         return tmp
 
 
+class UnknownList(list):
+    """list of unknowns which can also find an unknown by its symbol
+    (find_obj()) without a scan.  The index is rebuilt after any change."""
+
+    _index = None
+
+    def find(self, symbol):
+        if self._index is None:
+            self._index = {}
+            for u in reversed(self):  # first one wins, like find_obj()
+                self._index[u.symbol] = u
+        return self._index.get(symbol)
+
+    def __getstate__(self):  # (pickle just the list)
+        return None
+
+
+def _changes_list(name):
+    def method(self, *args, **kw):
+        self._index = None
+        return getattr(list, name)(self, *args, **kw)
+    return method
+
+
+for _name in ["append", "extend", "insert", "remove", "pop", "clear", "sort",
+              "reverse", "__setitem__", "__delitem__", "__iadd__", "__imul__"]:
+    setattr(UnknownList, _name, _changes_list(_name))
+
+
+class IndexedEquation(object):
+    """one equation of an EquationIndex: LHS = RHS and the symbols of each side"""
+
+    __slots__ = ("LHS", "RHS", "lsyms", "rsyms", "_eqn", "_ops")
+
+    def __init__(self, LHS, RHS):
+        self.LHS = LHS
+        self.RHS = RHS
+        self.lsyms = getattr(LHS, "free_symbols", set())
+        self.rsyms = getattr(RHS, "free_symbols", set())
+        self._eqn = None
+        self._ops = None
+
+    def count(self, symbols):
+        # same as count_unknowns(LHS) + count_unknowns(RHS)
+        n = 0
+        for s in symbols:
+            if s in self.lsyms:
+                n += 1
+            if s in self.rsyms:
+                n += 1
+        return n
+
+    def kequation(self):  # built when first needed (str() of both sides)
+        if self._eqn is None:
+            self._eqn = kequation(self.LHS, self.RHS)
+        return self._eqn
+
+    def ops(self):  # erank() length
+        if self._ops is None:
+            self._ops = int(sp.count_ops(self.RHS)) + int(sp.count_ops(self.LHS))
+        return self._ops
+
+
+class EquationIndex(object):
+    """The equations of a Robot (every Td[i,j] = Ts[i,j] of mequation_list,
+    then the aux SOA eqns), indexed by symbol.
+
+    refresh() re-reads the equations.  Leaves replace matrix elements (subs,
+    SOA substitution) rather than change them, so an equation whose two
+    sides are the same objects as last time is kept with its kequation,
+    symbols and ops count; only new ones are built, and ones no longer in
+    the robot are dropped from the index.
+    """
+
+    def __init__(self):
+        self.entries = {}  # position: IndexedEquation
+        self.order = []  # positions, in mequation_list order then aux
+        self.naux = 0  # (the aux eqns are the last naux of order)
+        self.by_symbol = {}  # symbol: set of positions
+        self.views = {}  # symbol: erank'ed [kequation]  (see equations())
+
+    def refresh(self, mequations, auxeqns=[]):
+        old = self.entries
+        self.entries = {}
+        order = []
+        for [k, meqn] in enumerate(mequations):
+            lhs = list(meqn.Td)  # (row major)
+            rhs = list(meqn.Ts)
+            for ij in range(len(lhs)):
+                order.append(self._update(old, (0, k, ij), lhs[ij], rhs[ij]))
+        for [k, e] in enumerate(auxeqns):
+            order.append(self._update(old, (1, k), e.LHS, e.RHS))
+        for [pos, ent] in old.items():  # retired
+            self._forget(pos, ent)
+        self.order = order
+        self.naux = len(auxeqns)
+        return self
+
+    def _update(self, old, pos, lhs, rhs):
+        ent = old.pop(pos, None)
+        if ent is not None and ent.LHS is lhs and ent.RHS is rhs:
+            self.entries[pos] = ent
+            return pos
+        if ent is not None:
+            self._forget(pos, ent)
+        ent = IndexedEquation(lhs, rhs)
+        self.entries[pos] = ent
+        for s in ent.lsyms | ent.rsyms:
+            self.by_symbol.setdefault(s, set()).add(pos)
+            self.views.pop(s, None)
+        return pos
+
+    def _forget(self, pos, ent):
+        for s in ent.lsyms | ent.rsyms:
+            self.by_symbol[s].discard(pos)
+            self.views.pop(s, None)
+
+    def matrix_equations(self):
+        return [self.entries[p] for p in self.order[: len(self.order) - self.naux]]
+
+    def aux_equations(self):
+        return [self.entries[p] for p in self.order[len(self.order) - self.naux :]]
+
+    def equations(self, symbol):
+        """kequations containing symbol (no repeats), shortest first (as erank())"""
+        if symbol not in self.views:
+            ents = []
+            seen = set()
+            for p in sorted(self.by_symbol.get(symbol, ())):
+                ent = self.entries[p]
+                if (ent.LHS, ent.RHS) not in seen:
+                    seen.add((ent.LHS, ent.RHS))
+                    ents.append(ent)
+            ents.sort(key=IndexedEquation.ops)
+            self.views[symbol] = [ent.kequation() for ent in ents]
+        return self.views[symbol]
+
+
 class unknown(object):
+    # solutions, argument, solvemethod etc. live in self.rec (a
+    #  SolutionRecord, shared with the solution graph Node)
+    solutions = record_field("solutions")  # list of solutions, store final solutions
+    nsolutions = record_field("nsolutions")  # number of solutions (== len(self.solutions))
+    argument = record_field("argument")  # argument to arcin() for example (used for generating checking code output)
+    assumption = record_field("assumption")  # assumputions about the solutions
+    solvemethod = record_field("solvemethod")
+
     def __init__(self, u=sp.var("x"), mat_eqn=None):
+        self.rec = SolutionRecord()
         self.symbol = u
         self.n = 0  # index of the unk in the serial chain (1-6) 0=unset
         #  NEW: self.n can be 23 e.g. for (th2+th3) or 234 for (th2+th3+th4)
-        self.eqnlist = []  # list of kequations containing this UNK
+        self.eqn_index = None  # EquationIndex for eqnlist (else a plain list)
+        self._eqnlist = []
         self.readytosolve = False
         self.eqntosolve = None  # this has to be NONE, otherwise the None judgement in tan_solver wouldn't work
 
         self.secondeqn = None
 
-        self.solvemethod = ""
         self.solved = False
         self.solveorder = 0
         self.usedfortransform = (
             False  # if solved, has this been used for transform yet?
         )
-        self.solutions = []  # list of solutions, store final solutions
-        self.argument = sp.var("a") * sp.var(
-            "b"
-        )  # argument to arcin() for example (used for generating checking code output)
 
         # for nodes ranking
         self.sincos_solutions = []  # solutions from sin or cos
@@ -125,8 +274,6 @@ class unknown(object):
         self.tan_eqnlist = []
         self.solvable_tan = False
         # end: nodes ranking
-        self.nsolutions = 0  # number of solutions (== len(self.solutions))
-        self.assumption = []  # assumputions about the solutions
         # self.nodelist = []   # list of solution tree nodes for this variable
         if mat_eqn != None:  #  list of kequation scontaining this unknown
             self.scan(mat_eqn)
@@ -142,6 +289,32 @@ class unknown(object):
     def __repr__(self):  # string representation
         return self.symbol.__repr__()
 
+    # list of kequations containing this UNK: a view of the robot's
+    #   EquationIndex once scan_for_equations() has run
+    @property
+    def eqnlist(self):
+        if self.__dict__.get("eqn_index") is not None:
+            return self.eqn_index.equations(self.symbol)
+        return self.__dict__.setdefault("_eqnlist", [])
+
+    @eqnlist.setter
+    def eqnlist(self, eqns):
+        self.eqn_index = None
+        self._eqnlist = eqns
+
+    def __getstate__(self):  # (the index belongs to the Robot)
+        state = self.__dict__.copy()
+        if state.get("eqn_index") is not None:
+            state["_eqnlist"] = list(self.eqnlist)
+        state["eqn_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        if "eqnlist" in state:  # pickled before the index
+            state["_eqnlist"] = state.pop("eqnlist")
+            state["eqn_index"] = None
+        record_setstate(self, state)
+
     # class unknown:
     def set_solved(self, R, unknowns):  # indicate that a this variable has been solved
         #  and update the solution tree
@@ -154,6 +327,8 @@ class unknown(object):
         assert len(self.solutions) >= 1, fs
         assert self.nsolutions > 0, fs
         print("            ", self.symbol, "=", self.solutions[0], "\n\n")
+        solve_trace.emit('solved', unknown=self.symbol, eqns=[self.eqntosolve, self.secondeqn],
+                         nsolutions=self.nsolutions, method=self.solvemethod)
         # print 'Robot instance.name: ', R.name      # shouldn't change!!
         #########################################
         #
@@ -162,38 +337,18 @@ class unknown(object):
         R.solveN += 1  # increment solution level counter
         self.solveorder = R.solveN  # first solution starts with 1 (0 is the root)
 
-        curr_node = None
-
-        found = False
-        for sol_node in R.solution_nodes:  # make sure there is a node for this var
-            if sol_node.symbol == self.symbol:
-                found = True
-                print("set_solved: Found existing node: ", sol_node)
-
-        if not found:
-            n = Node(self)
-            R.solution_nodes.append(n)
-            print(" Generated node: ", type(n))
+        curr_node = R.find_node(self.symbol)  # make sure there is a node for this var
+        if curr_node is None:
+            curr_node = sgv2.Node(self)
+            R.add_node(curr_node)
+            print(" Generated node: ", type(curr_node))
             R.variables_symbols.append(self.symbol)
+        else:
+            print("set_solved: Using  existing node: ", curr_node)
 
-        # for new solution graph
-        for sol_node in R.solution_nodes:
-            if sol_node.symbol == self.symbol:
-                curr_node = sol_node
-                print("set_solved: Using  existing node: ", curr_node)
-
-        # print ' -  - - - - '
-        # print R.solution_nodes
-        # print 'Trying to solution tree node for: ',  self.symbol
-        # print ' - - - - - '
-        assert curr_node is not None, " Trouble finding solution tree node"
         print("current node is: ", curr_node)
         curr_node.solveorder = R.solveN
-        curr_node.solvemethod = self.solvemethod
-        curr_node.argument = self.argument
-        curr_node.nsolutions = self.nsolutions
-        curr_node.solutions = self.solutions
-        curr_node.assumption = self.assumption
+        curr_node.rec = self.rec  # solvemethod, argument, solutions etc.
         curr_node.solution_with_notations = {}  # shouldn't be necessary(??)
 
         # set the equations
@@ -213,25 +368,10 @@ class unknown(object):
         print("\n\n")
 
     def scan(self, MatEqn):  # find list of kequations containing this UNK
-        self.eqnlist = []  # reset eqn list
-        rng = [0, 1, 2, 3]
-        for i in rng:
-            for j in rng:
-                eqn = MatEqn.Ts[i, j]
-                if eqn != 0:
-                    if eqn.has(self.symbol):
-                        self.eqnlist.append(kc.kequation(MatEqn.Td[i, j], eqn))
-
-                eqn = MatEqn.Td[i, j]
-                if eqn != 0:
-                    if eqn.has(self.symbol):
-                        # print "Equation [", eqn.string, "] has ", self.symbol
-                        self.eqnlist.append(kc.kequation(MatEqn.Ts[i, j], eqn))
+        self.eqn_index = EquationIndex().refresh([MatEqn], MatEqn.auxeqns)
 
-        self.eqnlist = erank(self.eqnlist)  # sort them in place
 
-
-class matrix_equation:
+class matrix_equation(LazyAttributes):
     def __init__(self, Td=sp.zeros(4), Ts=sp.zeros(4)):
         self.Td = sp.zeros(4)  # LHS (T desired)
         self.Ts = sp.zeros(4)  # RHS (T symbolic)
@@ -262,7 +402,7 @@ class matrix_equation:
         return " "
 
 
-class mechanism:
+class mechanism(LazyAttributes):
     def __init__(self, dh, params, varvect):
         self.DH = dh
         self.vv = varvect
@@ -282,6 +422,12 @@ class mechanism:
             np.zeros(36).reshape(6, 6)
         )  # a place to store numerical Jacobian
 
+    # DH rows j whose joint axis is parallel to the one of row j-1
+    #   (alpha in row j is 0 or pi): sums of angles, see ik_classes.soa_candidates()
+    def parallel_axes(self):
+        return [j for j in range(1, self.DH.shape[0])
+                if self.DH[j, 0] == 0 or self.DH[j, 0] == sp.pi]
+
     ###############  compute kinematic transforms and equations for the manipulator (including Jacobian)
     def forward_kinematics(self):
         ###   set up symbolic variables
@@ -377,11 +523,8 @@ class mechanism:
         #
 
         simp = np.zeros(6)
-        for j in range(
-            1, 5
-        ):  # we will only trigsimp if \alpha_N-1 == {0,pi} signifying
-            # parallel axes
-            if self.DH[j, al] == 0 or self.DH[j, al] == sp.pi:
+        for j in self.parallel_axes():  # we will only trigsimp if \alpha_N-1 == {0,pi}
+            if j < 5:
                 simp[j] = 1
 
         if JACOBIAN:
@@ -39,17 +39,6 @@ from ikbtbasics.ik_classes import *
 import ikbtbasics.kin_cl as kc
 from ikbtbasics.solution_graph_v2 import *
 
-# find subset contains certain symbol
-def find_subset(notation_collections, symbol):
-    for subset in notation_collections:
-        if symbol in subset:
-            return subset
-# delete some subset
-def delete_subset(notation_collections, subset):
-    for i in range(len(notation_collections)):
-        if subset == notation_collections[i]:
-            del notation_collections[i]
-            return notation_collections
 # sort notation_collections' sets by their contents
 # start with the ones with most notations
 def sort_by_length(notation_collections):
@@ -69,178 +58,194 @@ def sort_by_length(notation_collections):
         
     return notation_d, max_len
     
-# find groups that contains the goals
-def search_notation(search_list, goals, start):
-    potential_groups = []
-    for subgroup in search_list:
-        for goal in goals:
-            for goal_notation in goal.sol_notations:
-                if goal_notation in subgroup:
-                    potential_groups.append(subgroup)
-
-    # sort them!
-    # 1) number of elements 2) how many common elements
-    # assign scores
-    group_d = {}
-    for pten_group in potential_groups:
-        score = len(pten_group)
-        for sym in pten_group:
-            if sym in start:
-                score = score + 1
-        if score not in group_d.keys():
-            group_d[score] = []
-        group_d[score].append(pten_group)
-
-    keys = group_d.keys()
-    keys = sorted(keys, reverse= True)
-    sorted_potential_groups = []
-    for i in keys:
-        sorted_potential_groups.extend(group_d[i])
-
-    return sorted_potential_groups
-
-
-# check to see if all variables are found
-def finish_found(check_list):
-
-    for check in check_list:
-        if not check:
-            return False
-    return True
-# check off the variables that are found
-def mark_off(notation_set, solution_nodes):
-    check_list = []
-    goals = [] #what to look for
-    start_pts = [] #what the set already has
-    for node in solution_nodes:
-        check_list.append(False)
-        for single_notation in notation_set:
-            if single_notation in node.sol_notations:
-                check_list[-1] = True
-        if check_list[-1] == False:
-            goals.append(node)
-        else:
-            start_pts.append(node)
-
-    return check_list, goals, start_pts
+# index of the solution nodes: notation -> node index (node order)
+def notation_owners(solution_nodes):
+    owner = {}
+    for i in range(len(solution_nodes)):
+        for nt in solution_nodes[i].sol_notations:
+            if nt not in owner:
+                owner[nt] = i
+    return owner
+
+# a group of notations as an integer bitset of the nodes it covers,
+#  plus its notations sorted by node:  {node index: set(notations)}
+def group_index(group, owner):
+    mask = 0
+    by_node = {}
+    for nt in group:
+        i = owner.get(nt)
+        if i is not None:
+            mask |= 1 << i
+            by_node.setdefault(i, set()).add(nt)
+    return mask, by_node
 
 # main function of matching
+#   (same merging rules as before, but every "which node is this
+#    notation in" question is a dict lookup, and "which nodes does this
+#    group cover" is a bit mask)
 def matching_func(notation_collections, solution_nodes):
     notation_d, max_len = sort_by_length(notation_collections)
     if(max_len) < 1:
         print('matching.py: bad notation collection')
         quit()
     start_list = notation_d[max_len] # get lists with most variables
-    
+
+    owner = notation_owners(solution_nodes)
+    full = (1 << len(solution_nodes)) - 1
+    # per group: set, node mask, notations by node
+    index = [[set(g)] + list(group_index(g, owner)) for g in notation_collections]
+
     final_group = set()
-    goals = []
-    contained = []
 
     # go through the start_list, and try find their matches
     for start in start_list:
         if len(start) == len(solution_nodes): # if it has all the unknown symbols
             return notation_d[max_len]
-        else:
-            # check off the list
-            print("looking missing pieces for: ")
-            print(start)
-
-            check_list, goals, contained = mark_off(start, solution_nodes)
-            # find groups contains the target   
-            potential_groups = search_notation(notation_collections, goals, start)  
-#
-            new_set = start[:]
-            new_set = set(new_set)
-
-            # go through the pential groups
-            # merge when find match
-            for pten_group in potential_groups:
-                print("currently at: %s"%pten_group)
-                group_to_add = set(pten_group)
-                # if there's overlapping, merge
-                for single_notation in start:
-                    if single_notation in pten_group:
-                        has_new_sym = False
-                        
-                        # check if symbols already in the merged group                        
-                        for sym in pten_group:
-                            for i in range(len(solution_nodes)):
-                                if sym in solution_nodes[i].sol_notations:
-                                    if check_list[i]:
-                                        has_new_sym = True
-
-                        
-                        # check if there's conflict, e.g.: th3s1 vs. th3s2
-                        no_conflict = True
-                        for sym in pten_group:
-                            for sym_in_set in new_set:
-                                if not(sym == sym_in_set): 
-                                    for i in range(len(solution_nodes)):
-                                        if (sym in solution_nodes[i].sol_notations) \
-                                            and (sym_in_set in solution_nodes[i].sol_notations):
-                                            
-                                                no_conflict= False
-                        # if none of the symbols clashes
-                        if no_conflict:
-                            print("no conflicts")
-                                
-
-                        if has_new_sym and no_conflict:
-                            print("merging (1)")
-                            print(pten_group)
-                            print("\n")
-                            new_set = new_set.union(group_to_add)
-                            check_list, goals, contained = mark_off(new_set, solution_nodes)
-                            #print "current goals: %s"%goals
-
-
-                
-                common_ele = group_to_add.intersection(new_set)
-                # no commen elements, needs to satisfy two conditions
-                if len(common_ele) == 0: 
-                    countains_unmarked = False
-                    for goal in goals:
-                        for single_notation in pten_group:
-                            if single_notation in goal.sol_notations:
-                                #print "contains unmarked %s"%goal
-                                countains_unmarked = True
-
-                    no_repeats = True
-                    for pt in contained:
-                        for single_notation in pten_group:
-                            if single_notation in pt.sol_notations:
-                                #print "repeat: %s"%single_notation
-                                no_repeats = False
-
-                    if countains_unmarked and no_repeats:
-                        print("merging (2)")
-                        print(pten_group)
-                        print("\n")
-                        new_set = new_set.union(group_to_add)
-                        check_list, goals, countained = mark_off(new_set, solution_nodes)
-
-
-                if finish_found(check_list):
-                    new_list = list(new_set)
-                    sorted_ls = sort_variables(new_list, solution_nodes)
-                    sorted_tp = tuple(sorted_ls)
-                    final_group.add(sorted_tp)
-                    print("sorted finished list:")
-                    print(sorted_ls)
+        # check off the list
+        print("looking missing pieces for: ")
+        print(start)
+
+        start_set = set(start)
+        new_set = set(start[:])
+        checked, new_by_node = group_index(new_set, owner)
+        contained = checked    # (not updated by the 2nd merge rule, as before)
+
+        # find groups containing the targets (= the unchecked nodes),
+        #  listed once per target notation they contain,
+        #  sorted by 1) number of elements 2) how many common elements
+        potential_groups = []
+        for k in range(len(notation_collections)):
+            [gset, gmask, gby_node] = index[k]
+            n_hits = 0
+            for i in gby_node:
+                if not (checked >> i) & 1:
+                    n_hits += len(gby_node[i])
+            g = notation_collections[k]
+            score = len(g) + len([sym for sym in g if sym in start_set])
+            potential_groups.extend([[-score, k]]*n_hits)
+        potential_groups.sort(key=lambda x: x[0])   # stable
+
+        # go through the pential groups
+        # merge when find match
+        for [score, k] in potential_groups:
+            pten_group = notation_collections[k]
+            [group_to_add, gmask, gby_node] = index[k]
+            print("currently at: %s"%pten_group)
+            # if there's overlapping, merge (once per common notation, as before)
+            for single_notation in start:
+                if single_notation not in group_to_add:
+                    continue
+                # check if symbols already in the merged group
+                has_new_sym = (gmask & checked) != 0
+                # check if there's conflict, e.g.: th3s1 vs. th3s2
+                no_conflict = True
+                for i in gby_node:
+                    if i in new_by_node:
+                        if not (len(gby_node[i]) == 1 and gby_node[i] == new_by_node[i]):
+                            no_conflict = False
+                            break
+                # if none of the symbols clashes
+                if no_conflict:
+                    print("no conflicts")
+                if has_new_sym and no_conflict:
+                    print("merging (1)")
+                    print(pten_group)
                     print("\n")
-                    
-
-                    break
+                    new_set = new_set.union(group_to_add)
+                    checked, new_by_node = group_index(new_set, owner)
+                    contained = checked
+
+            # no commen elements, needs to satisfy two conditions
+            if group_to_add.isdisjoint(new_set):
+                countains_unmarked = (gmask & ~checked) != 0
+                no_repeats = (gmask & contained) == 0
+                if countains_unmarked and no_repeats:
+                    print("merging (2)")
+                    print(pten_group)
+                    print("\n")
+                    new_set = new_set.union(group_to_add)
+                    checked, new_by_node = group_index(new_set, owner)
+
+            if checked == full:
+                sorted_ls = sort_variables(list(new_set), solution_nodes, owner)
+                sorted_tp = tuple(sorted_ls)
+                final_group.add(sorted_tp)
+                print("sorted finished list:")
+                print(sorted_ls)
+                print("\n")
+                break
     # this is sorted
     return final_group
 
-# sort the list
-def sort_variables(one_list, solution_nodes):
-    # find the symbol one by one
-    sorted_list = []
-    for node in solution_nodes:
-        for ele in one_list:
-            if ele in node.sol_notations:
-                sorted_list.append(ele)
-
-    return sorted_list
+# Streaming version:  yields one complete, consistent solution set (tuple
+#  of notations in solve order) at a time, by a depth first walk of the
+#  notation DAG.  A notation can be used once every notation it was
+#  derived from (its entry in notation_collections) is in the set.
+#   limit: stop after this many sets (None = all).
+#   The caller can also just stop iterating.
+def solution_sets(notation_collections, solution_nodes, limit=None):
+    requires = {}
+    for c in notation_collections:
+        if len(c) > 0 and c[0] not in requires:
+            requires[c[0]] = set(c[1:])
+    nodes = [n for n in solution_nodes if len(n.sol_notations) > 0]
+    nodes.sort(key=lambda n: n.solveorder)
+    choices = [sorted(n.sol_notations, key=lambda nt: (len(str(nt)), str(nt))) for n in nodes]
+    if len(nodes) == 0:
+        return
+    count = 0
+    chosen = []
+    used = set()
+    stack = [iter(choices[0])]     # candidates for nodes[len(stack)-1]
+    while len(stack) > 0:
+        nt = next(stack[-1], None)
+        if nt is None:             # this branch is done
+            stack.pop()
+            if len(chosen) > 0:
+                used.discard(chosen.pop())
+            continue
+        if not requires.get(nt, set()) <= used:
+            continue
+        chosen.append(nt)
+        used.add(nt)
+        if len(chosen) == len(nodes):
+            yield tuple(chosen)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+            used.discard(chosen.pop())
+        else:
+            stack.append(iter(choices[len(chosen)]))
+
+# sort the list (by node order; notations not in any node are dropped)
+def sort_variables(one_list, solution_nodes, owner=None):
+    if owner is None:
+        owner = notation_owners(solution_nodes)
+    keyed = [[owner[ele], j, ele] for j, ele in enumerate(one_list) if ele in owner]
+    keyed.sort(key=lambda x: (x[0], x[1]))
+    return [x[2] for x in keyed]
+
+
+class TestMatching(unittest.TestCase):
+    class FakeNode:
+        def __init__(self, notations, order):
+            self.sol_notations = set(sp.symbols(notations))
+            self.solveorder = order
+
+    def test_solution_sets(self):
+        # th_1: 2 solutions, th_2: 2 per th_1 solution, th_3: 1 per th_2 solution
+        (a1, a2, b1, b2, b3, b4, c1, c2, c3, c4) = sp.symbols(
+            'th_1s1 th_1s2 th_2s1 th_2s2 th_2s3 th_2s4 th_3s1 th_3s2 th_3s3 th_3s4')
+        nodes = [self.FakeNode('th_1s1 th_1s2', 1),
+                 self.FakeNode('th_2s1 th_2s2 th_2s3 th_2s4', 2),
+                 self.FakeNode('th_3s1 th_3s2 th_3s3 th_3s4', 3)]
+        collections = [[a1], [a2], [b1, a1], [b2, a1], [b3, a2], [b4, a2],
+                       [c1, b1, a1], [c2, b2, a1], [c3, b3, a2], [c4, b4, a2]]
+        expected = [(a1, b1, c1), (a1, b2, c2), (a2, b3, c3), (a2, b4, c4)]
+        sets = list(solution_sets(collections, nodes))
+        self.assertEqual(sets, expected)
+        with_matching = matching_func(collections, nodes)   # (lists in this case)
+        self.assertEqual(set(map(frozenset, sets)), set(map(frozenset, with_matching)))
+        self.assertEqual(list(solution_sets(collections, nodes, limit=3)), expected[:3])
+        g = solution_sets(collections, nodes)
+        self.assertEqual(next(g), expected[0])    # lazy
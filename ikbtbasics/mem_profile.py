@@ -0,0 +1,211 @@
+#!/usr/bin/python
+#
+#   Memory profile of a solve, stage by stage (tracemalloc)
+#
+#   start() turns on tracemalloc; checkpoint(name) at the end of each stage
+#   records
+#       current and peak traced memory (peak: since the previous checkpoint)
+#       the allocation sites that grew most since the previous checkpoint
+#       live sympy objects (gc.get_objects()), by type
+#   and report() prints them.  checkpoint() does nothing unless start() was
+#   called, so the calls can stay in the solver.  Stages used now:
+#       FK, mequations, SOA               (ik_classes.kinematics_pickle, no pickle)
+#       setup                             (ikSolver: robot ready to solve)
+#       BT loop N                         (comp_det, end of each outer BT loop)
+#       latex, python, numba, cpp         (ikSolver.write_outputs, with matching)
+#
+#   With nframes=1 an allocation site is the line that allocated, mostly
+#   inside sympy.  With more frames it is the innermost IKBT line on the
+#   stack, which says more but is much slower (each frame of each allocation
+#   is recorded).  Even with nframes=1 a solve is several times slower
+#   (Puma, warm: 15 sec -> 2 min); turn it on with ikSolver.MEMPROFILE = True.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import unittest
+
+NFRAMES = 1     # traceback depth kept per allocation
+NSITES = 10     # allocation sites reported per stage
+NTYPES = 6      # sympy types reported per stage
+
+MB = 1024.0 * 1024.0
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_active = None  # the running MemProfile (or None)
+
+
+class MemProfile(object):
+    def __init__(self, nframes=NFRAMES):
+        self.nframes = nframes
+        self.stages = []      # one dict per checkpoint
+        self.counts = {}      # stage name: times seen (BT loop 1, 2, ...)
+        self.t0 = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+        self.prev = self.snapshot()
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>')])
+
+    def checkpoint(self, name):
+        [current, peak] = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):      # (3.9+; else peak since start)
+            tracemalloc.reset_peak()
+        snap = self.snapshot()
+        if self.nframes > 1:
+            sites = ikbt_sites(snap.compare_to(self.prev, 'traceback'))
+        else:
+            sites = [[str(s.traceback[0]), s.size_diff, s.count_diff]
+                     for s in snap.compare_to(self.prev, 'lineno')]
+        self.prev = snap
+        self.stages.append({'stage': name, 't': time.perf_counter() - self.t0,
+                            'current': current, 'peak': peak, 'sites': sites[:NSITES],
+                            'sympy': sympy_counts()})
+
+    def stop(self):
+        tracemalloc.stop()
+        self.prev = None
+
+
+def ikbt_sites(stats):
+    # [[site, size_diff, count_diff]], site: innermost frame in IKBT code
+    sites = {}
+    for s in stats:
+        where = str(s.traceback[-1])
+        for fr in reversed(s.traceback):    # (most recent frame last)
+            if fr.filename.startswith(PROJECT) and 'site-packages' not in fr.filename:
+                where = str(fr)
+                break
+        [size, count] = sites.get(where, [0, 0])
+        sites[where] = [size + s.size_diff, count + s.count_diff]
+    out = [[w, v[0], v[1]] for [w, v] in sites.items()]
+    out.sort(key=lambda x: -abs(x[1]))
+    return out
+
+
+def sympy_counts():
+    """{type name: number of live objects} for sympy expressions and matrices"""
+    sp = sys.modules.get('sympy')
+    if sp is None:
+        return {}
+    kinds = (sp.Basic, sp.MatrixBase)
+    counts = {}
+    for o in gc.get_objects():
+        if isinstance(o, kinds):
+            n = type(o).__name__
+            counts[n] = counts.get(n, 0) + 1
+    return counts
+
+
+def start(nframes=NFRAMES):
+    global _active
+    _active = MemProfile(nframes)
+    return _active
+
+
+def stop():
+    global _active
+    prof = _active
+    if prof is not None:
+        prof.stop()
+    _active = None
+    return prof
+
+
+def active():
+    return _active
+
+
+def checkpoint(name, numbered=False):
+    # numbered: a stage that repeats, 'BT loop' -> 'BT loop 1', 'BT loop 2', ...
+    if _active is None:
+        return
+    if numbered:
+        n = _active.counts.get(name, 0) + 1
+        _active.counts[name] = n
+        name = name + ' ' + str(n)
+    _active.checkpoint(name)
+
+
+def report(prof, out=sys.stdout):
+    w = out.write
+    w('\nMemory profile (tracemalloc, MB)\n')
+    w('   {:14s} {:>8s} {:>9s} {:>9s} {:>9s} {:>10s}\n'.format('stage', 'sec', 'current',
+      'peak', 'change', 'sympy objs'))
+    last = 0
+    for st in prof.stages:
+        w('   {:14s} {:8.1f} {:9.1f} {:9.1f} {:+9.1f} {:10d}\n'.format(st['stage'], st['t'],
+          st['current'] / MB, st['peak'] / MB, (st['current'] - last) / MB,
+          sum(st['sympy'].values())))
+        last = st['current']
+    for st in prof.stages:
+        w('\n-- {:s}:  top allocation sites (change since previous stage)\n'.format(st['stage']))
+        for [where, size, count] in st['sites']:
+            w('   {:+10.3f} MB {:+9d} blocks   {:s}\n'.format(size / MB, count, where))
+        top = sorted(st['sympy'].items(), key=lambda kv: -kv[1])[:NTYPES]
+        w('   live sympy: ' + ', '.join(['{:s} {:d}'.format(k, v) for [k, v] in top]) + '\n')
+
+
+class TestMemProfile(unittest.TestCase):
+    def test_profile(self):
+        import io
+        import sympy as sp
+        checkpoint('ignored')       # not running: no-op
+        prof = start()
+        x = sp.Symbol('x')
+        keep = [sp.cos(x + i) * sp.sin(x - i) for i in range(200)]
+        checkpoint('exprs')
+        M = sp.Matrix(4, 4, keep[:16])
+        checkpoint('loop', numbered=True)
+        checkpoint('loop', numbered=True)
+        self.assertTrue(stop() is prof)
+        self.assertTrue(active() is None)
+        names = [st['stage'] for st in prof.stages]
+        self.assertEqual(names, ['exprs', 'loop 1', 'loop 2'])
+        st = prof.stages[0]
+        self.assertTrue(st['current'] > 0 and st['peak'] >= st['current'])
+        self.assertTrue(st['sympy'].get('cos', 0) >= 200)
+        self.assertTrue(prof.stages[1]['sympy'].get('MutableDenseMatrix', 0) >= 1)
+        self.assertTrue(len(st['sites']) > 0)
+        buf = io.StringIO()
+        report(prof, buf)
+        self.assertTrue('loop 2' in buf.getvalue())
+        del keep, M
+
+    def test_ikbt_sites(self):
+        import sympy as sp
+        import ikbtbasics.kin_cl as kc
+        prof = start(nframes=30)
+        x = sp.Symbol('x')
+        keep = [kc.kequation(sp.cos(x), sp.sin(x + i)) for i in range(20)]
+        checkpoint('eqns')
+        stop()
+        sites = [s[0] for s in prof.stages[0]['sites']]
+        self.assertTrue(any(['mem_profile.py' in s or 'kin_cl.py' in s for s in sites]))
+        del keep
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+#
+#   Pose / solution datasets for bulk IK evaluation (memory-mapped .npy)
+#
+#   A dataset is a directory:
+#       dataset.json    metadata (the sidecar): version, robot, npose, ...
+#                       and, once solved, solutions: joints, nsolutions, solver
+#       poses.npy       float64 (N,4,4)
+#       solutions.npy   float64 (N,S,J)   joint values, S solutions of J joints
+#       valid.npy       uint8 (N,ceil(S/8))   validity bitmap, bit s of row i
+#                       (little bit order) set if solution s of pose i is valid
+#
+#   The arrays are opened memory-mapped and worked on in chunks of CHUNK
+#   poses; poses[a:b] and solutions[a:b] are views of the files (no copy),
+#   which the generated batch solvers read and fill in place:
+#
+#       ds = PoseDataset.create('solution_num/Puma', N, robot='Puma')
+#       ... fill ds.poses[a:b] ...
+#       ds.solve(solver)        # solver: IK_equationsPuma_nb (or the C++ _lib)
+#       for [a, b] in ds.chunks():
+#           ds.poses[a:b], ds.solutions[a:b], ds.valid(a, b)
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import json
+import time
+import unittest
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+VERSION = 1
+CHUNK = 65536   # poses per chunk
+SIDECAR = 'dataset.json'
+POSES = 'poses.npy'
+SOLUTIONS = 'solutions.npy'
+VALID = 'valid.npy'
+
+
+class PoseDataset(object):
+    def __init__(self, path, mode='r'):
+        # open an existing dataset, mode 'r' or 'r+'
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, SIDECAR)) as f:
+            self.meta = json.load(f)
+        assert self.meta.get('version') == VERSION, 'unknown dataset version: ' + path
+        self.poses = np.load(os.path.join(path, POSES), mmap_mode=mode)
+        assert self.poses.shape == (self.meta['npose'], 4, 4), 'poses.npy does not match ' + SIDECAR
+        self.solutions = None
+        self.bits = None
+        if 'solutions' in self.meta:
+            self.solutions = np.load(os.path.join(path, SOLUTIONS), mmap_mode=mode)
+            self.bits = np.load(os.path.join(path, VALID), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, path, npose, robot='', **meta):
+        """new dataset of npose (zero) poses, open 'r+'.  meta: more sidecar items"""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for f in [SOLUTIONS, VALID]:  # (from an older dataset here)
+            if os.path.isfile(os.path.join(path, f)):
+                os.remove(os.path.join(path, f))
+        poses = open_memmap(os.path.join(path, POSES), mode='w+', dtype=np.float64,
+                            shape=(npose, 4, 4))
+        del poses
+        info = {'version': VERSION, 'robot': robot, 'npose': npose,
+                'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+        info.update(meta)
+        write_sidecar(path, info)
+        return cls(path, 'r+')
+
+    def __len__(self):
+        return self.meta['npose']
+
+    def chunks(self, size=CHUNK):
+        for a in range(0, len(self), size):
+            yield [a, min(a + size, len(self))]
+
+    def add_solutions(self, joints, nsolutions, solver=''):
+        # (new, empty) solution arrays for S=nsolutions, J=len(joints)
+        n = len(self)
+        self.solutions = None
+        self.bits = None
+        s = open_memmap(os.path.join(self.path, SOLUTIONS), mode='w+', dtype=np.float64,
+                        shape=(n, nsolutions, len(joints)))
+        v = open_memmap(os.path.join(self.path, VALID), mode='w+', dtype=np.uint8,
+                        shape=(n, (nsolutions + 7) // 8))
+        v[:] = 0
+        del s, v
+        self.meta['solutions'] = {'joints': [str(j) for j in joints], 'nsolutions': nsolutions,
+                                  'solver': solver, 'bitorder': 'little'}
+        write_sidecar(self.path, self.meta)
+        self.solutions = np.load(os.path.join(self.path, SOLUTIONS), mmap_mode='r+')
+        self.bits = np.load(os.path.join(self.path, VALID), mmap_mode='r+')
+
+    def valid(self, a, b):
+        """(b-a, S) bool: which solutions of poses a..b-1 are valid"""
+        S = self.meta['solutions']['nsolutions']
+        return np.unpackbits(self.bits[a:b], axis=1, count=S, bitorder='little').astype(bool)
+
+    def set_valid(self, a, valid):
+        self.bits[a:a + valid.shape[0]] = np.packbits(valid, axis=1, bitorder='little')
+
+    def solve(self, solver, size=CHUNK):
+        """solve every pose with a generated batch solver (JOINTS, NSOLUTIONS,
+        ikin_batch(T, out=, valid=)), written straight into solutions.npy"""
+        name = getattr(solver, '__name__', str(solver))
+        sol = self.meta.get('solutions')
+        if sol is None or sol['joints'] != list(solver.JOINTS) or \
+                sol['nsolutions'] != solver.NSOLUTIONS or sol['solver'] != name:
+            self.add_solutions(solver.JOINTS, solver.NSOLUTIONS, name)
+        vbuf = np.empty((min(size, len(self)), solver.NSOLUTIONS), dtype=np.bool_)
+        for [a, b] in self.chunks(size):
+            solver.ikin_batch(self.poses[a:b], out=self.solutions[a:b], valid=vbuf[:b - a])
+            self.set_valid(a, vbuf[:b - a])
+        self.flush()
+
+    def flush(self):
+        for arr in [self.poses, self.solutions, self.bits]:
+            if isinstance(arr, np.memmap) and arr.mode != 'r':
+                arr.flush()
+
+
+def write_sidecar(path, meta):
+    tmp = os.path.join(path, SIDECAR + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(path, SIDECAR))
+
+
+class TestPoseDataset(unittest.TestCase):
+    def test_dataset(self):
+        import tempfile
+        import shutil
+        import types
+
+        def ikin_batch(T, out=None, valid=None):  # th_1 = atan2(r_21, r_11), twice
+            th = np.arctan2(T[:, 1, 0], T[:, 0, 0])
+            out[:, 0, 0] = th
+            out[:, 1, 0] = th + np.pi
+            valid[:, 0] = True
+            valid[:, 1] = th > 0
+            return out, valid
+        solver = types.SimpleNamespace(__name__='test', JOINTS=['th_1'], NSOLUTIONS=2,
+                                       ikin_batch=ikin_batch)
+        d = tempfile.mkdtemp()
+        try:
+            ds = PoseDataset.create(d, 10, robot='Test', source='unittest')
+            th = np.linspace(-3, 3, 10)
+            for [a, b] in ds.chunks(4):
+                ds.poses[a:b, 0, 0] = np.cos(th[a:b])
+                ds.poses[a:b, 1, 0] = np.sin(th[a:b])
+            ds.solve(solver, size=4)
+            del ds
+            ds = PoseDataset(d)
+            self.assertEqual(ds.meta['robot'], 'Test')
+            self.assertEqual(ds.meta['solutions']['joints'], ['th_1'])
+            self.assertTrue(isinstance(ds.poses, np.memmap))
+            self.assertTrue(np.shares_memory(ds.poses[2:6], ds.poses))  # views
+            self.assertTrue(np.allclose(ds.solutions[:, 0, 0], th))
+            v = ds.valid(0, 10)
+            self.assertEqual(v.shape, (10, 2))
+            self.assertTrue(v[:, 0].all())
+            self.assertEqual(list(v[:, 1]), list(th > 0))
+            self.assertEqual(ds.bits.shape, (10, 1))
+            del ds
+        finally:
+            shutil.rmtree(d)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -130,40 +130,55 @@ sp.var('th_:7')  #\theta_N
 ## symbols for sum-of-angles identities  
 sp.var('c_12 s_12 c_23 s_23 c_34 s_34 c_45 s_45 c_56 s_56 c_13 s_13 ')
 
-def notation_squeeze(T):
+# the pairs always squeezed (13: might happen with prismatic in between??)
+_PAIRS = [[1,2],[2,3],[3,4],[4,5],[5,6],[1,3]]
+
+_squeeze_maps = {}   # (joints, sums): map
+
+def _suffix(j):
+  # th_3, th_23, A -> '3', '23', 'A'
+  n = str(j)
+  if n.startswith('th_'):
+    n = n[3:]
+  return n
+
+def _squeeze_add(m, arg, n):
+  # sin(arg) -> s_n, cos(arg) -> c_n (unless sympy rewrites them, e.g. sin(-x))
+  f = sp.sin(arg)
+  if f.func == sp.sin:
+    m[f] = sp.Symbol('s_'+n)
+  f = sp.cos(arg)
+  if f.func == sp.cos:
+    m[f] = sp.Symbol('c_'+n)
+
+def squeeze_map(joints=range(1,7), sums={}):
+  """the compact names for notation_squeeze() in one dict (applied in a
+  single xreplace pass):  sin(th_i) -> s_i, cos(th_i) -> c_i for the joints
+  (numbers or th_ symbols, any number of them), the fixed pairs
+  cos(th_1+th_2) -> c_12 etc, and the sums of angles sums = {th_23: th_2+th_3}
+  (sin(th_23) and sin(th_2+th_3) both -> s_23).  Built once per argument set."""
+  names = [('th_'+str(j) if isinstance(j, int) else str(j)) for j in joints]
+  key = (tuple(names), tuple(sorted([(str(k), str(v)) for [k, v] in sums.items()])))
+  m = _squeeze_maps.get(key)
+  if m is not None:
+    return m
+  m = {}
+  for name in names:
+    _squeeze_add(m, sp.Symbol(name), _suffix(name))
+  for [i,j] in _PAIRS:
+    _squeeze_add(m, sp.Symbol('th_'+str(i)) + sp.Symbol('th_'+str(j)), str(i)+str(j))
+  for [th, arg] in sums.items():
+    _squeeze_add(m, th, _suffix(th))
+    _squeeze_add(m, arg, _suffix(th))
+  _squeeze_maps[key] = m
+  return m
+
+def notation_squeeze(T, smap=None):
   # substitute compact names for cos(theta) etc.
-  T = T.subs(sp.sin(th_1), s_1)
-  T = T.subs(sp.sin(th_2), s_2)
-  T = T.subs(sp.sin(th_3), s_3)
-  T = T.subs(sp.sin(th_4), s_4)
-  T = T.subs(sp.sin(th_5), s_5)
-  T = T.subs(sp.sin(th_6), s_6)
-
-  T = T.subs(sp.cos(th_1), c_1)
-  T = T.subs(sp.cos(th_2), c_2)
-  T = T.subs(sp.cos(th_3), c_3)
-  T = T.subs(sp.cos(th_4), c_4)
-  T = T.subs(sp.cos(th_5), c_5)
-  T = T.subs(sp.cos(th_6), c_6)
-  
-  # Substitute terms of form cos(th_i + th_j) (for the major cases)
-  
-  pairs = [(sp.cos(th_1+th_2), c_12) ,
-	   (sp.sin(th_1+th_2), s_12) , 
-	   (sp.cos(th_2+th_3), c_23) ,
-	   (sp.sin(th_2+th_3), s_23) ,
-	   (sp.cos(th_3+th_4), c_34) ,
-	   (sp.sin(th_3+th_4), s_34) ,
-	   (sp.cos(th_4+th_5), c_45) ,
-	   (sp.sin(th_4+th_5), s_45) ,
-	   (sp.cos(th_5+th_6), c_56) ,
-	   (sp.sin(th_5+th_6), s_56) ,
-	   (sp.cos(th_1+th_3), c_13) ,  #might happen with prismatic in between??
-	   (sp.sin(th_1+th_3), s_13) 
-	   ]
-  T = T.subs(pairs)
-
-  return T
+  #   smap: squeeze_map() to use (e.g. Robot.squeeze_map()), default th_1..th_6
+  if smap is None:
+    smap = squeeze_map()
+  return T.xreplace(smap)
 
 
 
@@ -23,6 +23,10 @@ from ikbtbasics.ik_classes import *
 import ikbtbasics.kin_cl as kc
 from ikbtbasics.matching import *
 import itertools as itt
+from collections import deque
+import pickle
+from ikbtbasics.solution_record import *
+import ikbtbasics.symtab as symtab
 
 ((th_1, th_2, th_3, th_4, th_5, th_6)) = sp.symbols(
     ("th_1", "th_2", "th_3", "th_4", "th_5", "th_6")
@@ -40,35 +44,171 @@ global notation_graph
 
 
 def find_node(nodes, symbol):  # equivlent function -> find_obj in helper
+    #  (R.find_node(symbol) is the indexed version)
     for node in nodes:
         if node.symbol == symbol:
             return node
 
 
 def goal_search(start, parent_notations, graph):
-    """modified BFS"""
-    q = []
-    q.append(start)
-
-    while len(q) > 0:
-        curr = q[0]
-        del q[0]
+    """modified BFS: first notation reachable from start (start included,
+    following child->parent edges) which is in parent_notations"""
+    graph = notation_index(graph)
+    for curr in graph.ancestors(start):
         if curr in parent_notations:
             return curr
-        else:
-            next_steps = find_edge(curr, graph)
-            q.extend(next_steps)
-
     return None
 
 
 def find_edge(child, graph):
-    next_level = []
-    for edge in graph:
-        if edge.child == child:
-            next_level.append(edge.parent)
-
-    return next_level
+    return list(notation_index(graph).parents_of(child))
+
+
+def xreplace_shared(exprs, rule):
+    """xreplace(rule) on a list of expressions; subtrees common to several
+    of them (e.g. the +/- sqrt solutions) are only rebuilt once"""
+    memo = {}
+
+    def rep(e):
+        if e in memo:
+            return memo[e]
+        if e in rule:
+            r = rule[e]
+        elif len(e.args) > 0:
+            args = [rep(a) for a in e.args]
+            if any(x is not y for x, y in zip(args, e.args)):
+                r = e.func(*args)
+            else:
+                r = e
+        else:
+            r = e
+        memo[e] = r
+        return r
+
+    return [rep(e) for e in exprs]
+
+
+def notation_index(graph):
+    #  R.notation_graph from an old pickle is a plain set of Edges
+    if isinstance(graph, NotationGraph):
+        return graph
+    return NotationGraph(graph)
+
+
+class NotationGraph(set):
+    """set of Edge(child, parent) with child->parents and
+    parent->children indices and memoized ancestor (BFS) lists"""
+
+    def __init__(self, edges=()):
+        super(NotationGraph, self).__init__()
+        self.parents = {}   # child notation: [parent notations]
+        self.children = {}  # parent notation: [child notations]
+        self._ancestors = {}
+        for e in edges:
+            self.add(e)
+
+    def add(self, edge):
+        if edge in self:
+            return
+        super(NotationGraph, self).add(edge)
+        self.parents.setdefault(edge.child, []).append(edge.parent)
+        self.children.setdefault(edge.parent, []).append(edge.child)
+        self._ancestors = {}
+
+    def update(self, *edgesets):
+        for edges in edgesets:
+            for e in edges:
+                self.add(e)
+
+    def discard(self, edge):
+        if edge not in self:
+            return
+        super(NotationGraph, self).discard(edge)
+        self.parents[edge.child].remove(edge.parent)
+        self.children[edge.parent].remove(edge.child)
+        self._ancestors = {}
+
+    def remove(self, edge):
+        if edge not in self:
+            raise KeyError(edge)
+        self.discard(edge)
+
+    def clear(self):
+        super(NotationGraph, self).clear()
+        self.parents = {}
+        self.children = {}
+        self._ancestors = {}
+
+    #  every other mutating set method goes through add()/discard() so the
+    #    indices stay right (set's own versions would bypass them)
+    def difference_update(self, *edgesets):
+        for edges in edgesets:
+            for e in list(edges):
+                self.discard(e)
+
+    def intersection_update(self, *edgesets):
+        keep = set(self)
+        for edges in edgesets:
+            keep &= set(edges)
+        for e in list(self):
+            if e not in keep:
+                self.discard(e)
+
+    def symmetric_difference_update(self, edges):
+        for e in set(edges):
+            if e in self:
+                self.discard(e)
+            else:
+                self.add(e)
+
+    def pop(self):
+        if len(self) == 0:
+            raise KeyError('pop from an empty NotationGraph')
+        e = next(iter(self))
+        self.discard(e)
+        return e
+
+    def __ior__(self, edges):
+        self.update(edges)
+        return self
+
+    def __isub__(self, edges):
+        self.difference_update(edges)
+        return self
+
+    def __iand__(self, edges):
+        self.intersection_update(edges)
+        return self
+
+    def __ixor__(self, edges):
+        self.symmetric_difference_update(edges)
+        return self
+
+    def parents_of(self, child):
+        return self.parents.get(child, [])
+
+    def children_of(self, parent):
+        return self.children.get(parent, [])
+
+    def ancestors(self, start):
+        # start and all its ancestors, in BFS order
+        if start not in self._ancestors:
+            seen = set([start])
+            order = [start]
+            q = deque([start])
+            while len(q) > 0:
+                curr = q.popleft()
+                for p in self.parents_of(curr):
+                    if p not in seen:
+                        seen.add(p)
+                        order.append(p)
+                        q.append(p)
+            self._ancestors[start] = order
+        return self._ancestors[start]
+
+    def __reduce__(self):
+        # pickle as the edges (the indices are rebuilt on load)
+        return (NotationGraph, (list(self),))
 
 
 def related(start_node, end_node):
@@ -93,14 +233,16 @@ def related(start_node, end_node):
 class Node:
     """Node is a temp class, will be integrate into unknown/variable, or inhirit from it"""
 
+    solutions = record_field("solutions")
+    nsolutions = record_field("nsolutions")
+    argument = record_field("argument")
+    assumption = record_field("assumption")
+    solvemethod = record_field("solvemethod")
+
     def __init__(self, unk):
         self.symbol = unk.symbol
-        self.argument = unk.argument
-        self.solvemethod = unk.solvemethod
-        self.eqnlist = []
-        self.nsolutions = 0
-        self.solutions = []
-        self.assumption = []
+        self.rec = unk.rec  # solutions, argument, solvemethod etc. (shared with unk)
+        self.eqnlist = []  # equations used to solve
         self.sol_notations = set()
         self.parents = []
         self.solution_with_notations = {}  # self.notation : kequation
@@ -123,6 +265,9 @@ class Node:
     def __repr__(self):  # string representation
         return self.symbol.__repr__()
 
+    def __setstate__(self, state):
+        record_setstate(self, state)
+
     def detect_parent(self, R):
         if not len(self.solutions) == 0:
             eqn = self.solutions[0]  # solutions is a list of keqn
@@ -131,9 +276,9 @@ class Node:
             for elem in elements:
                 print("parent running 1")
                 if (
-                    elem in R.variables_symbols
-                ):  # swap possible_unkns to unknows symbols
-                    parent = find_node(R.solution_nodes, elem)
+                    elem in R.variables_symbols and elem != self.symbol
+                ):  # swap possible_unkns to unknows symbols (a node is not its own parent)
+                    parent = R.find_node(elem)
                     self.parents.append(parent)
 
             # detect redundancy and eliminate higher order parent
@@ -162,6 +307,7 @@ class Node:
 
         # TODO: debug the situation where parents are not related
         # but at different levels
+        R.notation_graph = notation_index(R.notation_graph)  # (old pickles)
         print("running 0")
         if len(self.parents) == 0:  # root node special case
             print("running 1")
@@ -177,10 +323,7 @@ class Node:
                 self.arguments[self.symbol] = self.argument
             else:
                 for i in range(1, self.nsolutions + 1):
-                    curr = (
-                        str(self.symbol) + "s" + str(i)
-                    )  # convert to str, then to symbol?
-                    curr = sp.var(curr)
+                    curr = symtab.notation(self.symbol, i)  # e.g. th_1s2
                     self.sol_notations.add(curr)
                     R.notation_graph.add(Edge(curr, -1))
                     R.notation_collections.append([curr])  # add into subgroup
@@ -199,98 +342,57 @@ class Node:
             # getting the product is safe here because we already
             # trimmed the infeasible pairs from last step (redundency detection)
             print("running 2")
-            parents_notation_list = []
-
-            if len(self.parents) == 1:
-                # convert to single symbol to list
-                for one_sym in self.parents[0].sol_notations:
-                    parents_notation_list.append([one_sym])
-            elif len(self.parents) == 2:
-                parents_notation_list = itt.product(
-                    self.parents[0].sol_notations, self.parents[1].sol_notations
-                )
-            elif len(self.parents) == 3:
-                parents_notation_list = itt.product(
-                    self.parents[0].sol_notations,
-                    self.parents[1].sol_notations,
-                    self.parents[2].sol_notations,
-                )
-            elif len(self.parents) == 4:
-                parents_notation_list = itt.product(
-                    self.parents[0].sol_notations,
-                    self.parents[1].sol_notations,
-                    self.parents[2].sol_notations,
-                    self.parents[3].sol_notations,
-                )
-            elif len(self.parents) == 5:
-                parents_notation_list = itt.product(
-                    self.parents[0].sol_notations,
-                    self.parents[1].sol_notations,
-                    self.parents[2].sol_notations,
-                    self.parents[3].sol_notations,
-                    self.parents[4].sol_notations,
-                )
-
             isub = 1
-
-            for parents_tuple in parents_notation_list:
-                print("running 6")
-                # find all parents notations, this is done outside of
-                # the solution loop because multiple solutions share the same parents
-                parents_notations = []
-                # look for higher level parent notation connected to this parent
-                for parent_sym in parents_tuple:
-                    parents_notations.append(parent_sym)
-                    for higher_parent in self.upper_level_parents:
-                        goal_notation = goal_search(
-                            parent_sym, higher_parent.sol_notations, R.notation_graph
-                        )
-                        if goal_notation is not None:
-                            parents_notations.append(goal_notation)
-
-                for curr_solution in self.solutions:
+            for [parents_tuple, parent_notations, rule] in self.parent_branches(R):
+                # substitute all the parents at once, shared by all the
+                #  solutions of this branch
+                subbed = xreplace_shared(self.solutions + [self.argument], rule)
+                for rhs in subbed[:-1]:
                     print("running 5")
                     # creat new symbols and link to graph
-                    curr = str(self.symbol) + "s" + str(isub)
-                    curr = sp.var(curr)
+                    curr = symtab.notation(self.symbol, isub)
                     self.sol_notations.add(curr)
-
-                    # R.notation_collections.append(curr)
                     isub = isub + 1
                     # link to graph
                     for parent_sym in parents_tuple:
                         R.notation_graph.add(Edge(curr, parent_sym))
-                    # substitute for solutions
-                    rhs = curr_solution
-
-                    expr_notation_list = [curr]
-                    for parent in self.parents + self.upper_level_parents:
-                        curr_parent = None
-
-                        for parent_sym in parents_notations:
-                            if parent_sym in parent.sol_notations:
-                                curr_parent = parent_sym
-                                expr_notation_list.append(curr_parent)
-                        try:
-                            rhs = rhs.subs(parent.symbol, curr_parent)
-                            tmp_arg = self.argument.subs(
-                                parent.symbol, curr_parent
-                            )  # also sub the arg
-                        except:
-                            print("problmematic step: ", parent.symbol)
-                            print("solution: ", rhs)
-                            print("parents notations")
-                            print(parents_notation_list)
-
-                    R.notation_collections.append(expr_notation_list)
-                    # parents_notations.remove(curr_parent)
-                    # can't remove here, or won't be able to generate solution for
-                    # multiple solution case
 
+                    R.notation_collections.append([curr] + parent_notations)
                     self.solution_with_notations[curr] = kc.kequation(curr, rhs)
-                    self.arguments[curr] = tmp_arg
+                    self.arguments[curr] = subbed[-1]
         print("running done")
 
+    def parent_branches(self, R):
+        """generator over the product of the parents' solutions:
+        [parents_tuple, parent notations, {parent symbol: notation}]"""
+        everyone = self.parents + self.upper_level_parents
+        for parents_tuple in itt.product(*[p.sol_notations for p in self.parents]):
+            print("running 6")
+            # find all parents notations, this is done outside of
+            # the solution loop because multiple solutions share the same parents
+            parents_notations = []
+            # look for higher level parent notation connected to this parent
+            for parent_sym in parents_tuple:
+                parents_notations.append(parent_sym)
+                for higher_parent in self.upper_level_parents:
+                    goal_notation = goal_search(
+                        parent_sym, higher_parent.sol_notations, R.notation_graph
+                    )
+                    if goal_notation is not None:
+                        parents_notations.append(goal_notation)
+            notations = []
+            rule = {}
+            for parent in everyone:
+                found = [ps for ps in parents_notations if ps in parent.sol_notations]
+                notations.extend(found)
+                if len(found) > 0:
+                    rule[parent.symbol] = found[-1]
+                else:
+                    print("problmematic step: ", parent.symbol)
+                    print("parents notations")
+                    print(parents_notations)
+            yield [parents_tuple, notations, rule]
+
     def generate_solutions(self, R):
         """generate solutions with notation(subscript)"""
         pass
@@ -317,6 +419,74 @@ class SolutionGraphV2Tests(unittest.TestCase):
     def test_mock(self):
         print("place holder for real test: solution_graph_v2")
 
+    def test_notation_graph(self):
+        """indexed graph gives the same answers as the plain edge set"""
+        import pickle
+        (a1, a2, b1, b2, c1, c2) = sp.symbols("th_1s1 th_1s2 th_2s1 th_2s2 th_3s1 th_3s2")
+        edges = [Edge(a1, -1), Edge(a2, -1), Edge(b1, a1), Edge(b2, a2),
+                 Edge(c1, b1), Edge(c2, b2), Edge(c2, a2)]
+        plain = set(edges)
+        g = NotationGraph(edges)
+        self.assertEqual(g, plain)
+        g.add(Edge(b1, a1))   # duplicate
+        self.assertEqual(len(g), len(plain))
+        self.assertEqual(sorted(map(str, find_edge(c2, g))), sorted(map(str, find_edge(c2, plain))))
+        self.assertEqual(g.children_of(a2), [b2, c2])
+        for start in [c1, c2, b1]:
+            for goal in [[a1, a2], [b1, b2], [c1]]:
+                self.assertEqual(goal_search(start, goal, g), goal_search(start, goal, plain))
+        self.assertEqual(goal_search(c1, [a2], g), None)
+        g2 = pickle.loads(pickle.dumps(g))
+        self.assertEqual(g2, g)
+        self.assertEqual(set(g2.ancestors(c2)), set(g.ancestors(c2)))
+        g.discard(Edge(c2, a2))
+        self.assertEqual(g.parents_of(c2), [b2])
+        # in-place operators and the other mutators keep the indices too
+        g -= {Edge(c2, b2)}
+        self.assertEqual(g.parents_of(c2), [])
+        g |= {Edge(c2, a2)}
+        self.assertEqual(g.parents_of(c2), [a2])
+        g ^= {Edge(c2, a2), Edge(c1, a1)}
+        self.assertEqual([g.parents_of(c2), g.parents_of(c1)], [[], [b1, a1]])
+        g &= {Edge(c1, a1), Edge(b1, a1)}
+        self.assertEqual(g, set([Edge(c1, a1), Edge(b1, a1)]))
+        self.assertEqual([g.parents_of(c1), g.children_of(a2)], [[a1], []])
+        e = g.pop()
+        self.assertEqual(g.parents_of(e.child), [])
+        g.intersection_update([])
+        self.assertEqual([len(g), g.children_of(a1)], [0, []])
+
+    def test_xreplace_shared(self):
+        """same result as subs() one parent at a time"""
+        (a1, b2) = sp.symbols("th_1s1 th_2s2")
+        t = sp.sqrt(a_2**2 - (d_1 - sp.cos(th_1)*sp.sin(th_2))**2)
+        sols = [sp.atan2(t, th_2 + a_3), sp.atan2(-t, th_2 + a_3), th_1 * th_2]
+        rule = {th_1: a1, th_2: b2}
+        expected = [e.subs(th_1, a1).subs(th_2, b2) for e in sols]
+        self.assertEqual(xreplace_shared(sols, rule), expected)
+
+    def test_solution_record(self):
+        """unknown and its Node share one record, find_node/find_obj indexed"""
+        import ikbtfunctions.helperfunctions as hf  # (circular at module level)
+        import ikbtbasics.ik_classes as ikc
+        R = ikc.Robot()
+        unks = kc.UnknownList([kc.unknown(th_1), kc.unknown(th_2)])
+        unks[0].solutions.append(sp.atan2(a_2, a_3))
+        unks[0].nsolutions = 1
+        unks[0].set_solved(R, unks)
+        nd = R.find_node(th_1)
+        self.assertTrue(nd.rec is unks[0].rec)
+        unks[0].solvemethod = 'atan2(y,x)'    # later changes show in the node
+        self.assertEqual(nd.solvemethod, 'atan2(y,x)')
+        self.assertEqual(nd.nsolutions, 1)
+        self.assertTrue(R.find_node(th_2) is None)
+        self.assertTrue(hf.find_obj(th_2, unks) is unks[1])
+        unks.remove(unks[1])
+        self.assertTrue(hf.find_obj(th_2, unks) is None)
+        [R2, unks2] = pickle.loads(pickle.dumps([R, unks]))
+        self.assertTrue(R2.find_node(th_1).rec is unks2[0].rec)
+        self.assertTrue(hf.find_obj(th_1, unks2) is unks2[0])
+
     # def test_find_parent(self):
     # '''test detect_parent: th_2 depends on th_1'''
     # R = Robot()
@@ -0,0 +1,56 @@
+# Solution of one unknown, shared by kin_cl.unknown and solution_graph_v2.Node
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sympy as sp
+
+
+#  unknown.argument before a solver sets it (shared, not a new a*b per unknown)
+NO_ARGUMENT = sp.Symbol("a") * sp.Symbol("b")
+
+
+class SolutionRecord(object):
+    """the solution of one unknown.  The unknown (kin_cl.unknown) and its
+    solution graph Node hold the same record, so set_solved() doesn't copy
+    field by field and a pickle stores it once."""
+
+    __slots__ = ("solutions", "nsolutions", "argument", "assumption", "solvemethod")
+    FIELDS = __slots__
+
+    def __init__(self):
+        self.solutions = []  # list of solutions
+        self.nsolutions = 0  # == len(self.solutions)
+        self.argument = NO_ARGUMENT  # argument needing domain testing (eg asin())
+        self.assumption = []  # assumptions about the solutions
+        self.solvemethod = ""
+
+
+def record_field(name):
+    # attribute stored in self.rec (a SolutionRecord)
+    return property(
+        lambda self: getattr(self.rec, name),
+        lambda self, value: setattr(self.rec, name, value),
+    )
+
+
+def record_setstate(obj, state):
+    # objects pickled before SolutionRecord have the fields in their __dict__
+    if "rec" not in state:
+        rec = SolutionRecord()
+        for f in SolutionRecord.FIELDS:
+            if f in state:
+                setattr(rec, f, state.pop(f))
+        state["rec"] = rec
+    obj.__dict__.update(state)
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+#
+#   Machine readable trace of a solve (JSON lines)
+#
+#   One JSON object per line:
+#       {"t": 12.345678, "event": "tick", "node": "Tan Solver", "unknown": "th_1",
+#        "eqns": ["3a5c01f2"], "nsolutions": null, "elapsed": 0.0123, "pid": 4242, ...}
+#
+#     t        seconds since the trace started (time.monotonic(), so events
+#              from forked workers are on the same clock)
+#     event    start, end, tick (any BT node), assign, solved, complete, overrun
+#     eqns     equation ids: crc32 of the equation text.  The first time an id
+#              appears an  {"event": "eqn", "id": ..., "text": ...}  line is
+#              written before it.
+#
+#   The solver only puts a tuple on a queue (emit()); a background thread
+#   turns the tuples into JSON and writes them in batches.  Events from a
+#   forked process (b3.Budget, parallel_assigner) don't have that thread, so
+#   they are written straight to the file (O_APPEND, one write per line).
+#   Lines are not in time order, sort by "t" (scripts/trace_report.py does).
+#
+#   Usage:
+#       trace = solve_trace.start('logs/Puma_trace.jsonl')
+#       ikbt.trace = trace          # BT node ticks (b3/core/basenode.py)
+#       ...
+#       solve_trace.stop()
+#
+#   Anywhere else:  solve_trace.emit('solved', unknown=..., ...)  (no-op
+#   when no trace is running)
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import json
+import time
+import zlib
+import queue
+import atexit
+import threading
+import unittest
+
+BATCH = 512     # max lines per write() in the writer thread
+
+_active = None  # the running SolveTrace (or None)
+
+
+def eqn_id(e):
+    return '{:08x}'.format(zlib.crc32(str(e).encode('utf-8')))
+
+
+class SolveTrace(object):
+    def __init__(self, fname):
+        self.fname = fname
+        self.pid = os.getpid()
+        self.t0 = time.monotonic()
+        self.fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self.seen = set()   # equation ids already written
+        self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._writer, name='solve_trace', daemon=True)
+        self.thread.start()
+
+    def emit(self, event, node=None, unknown=None, eqns=None, nsolutions=None,
+             elapsed=None, **extra):
+        # cheap: the formatting is done by the writer thread
+        ev = (time.monotonic(), os.getpid(), event, node, unknown, eqns, nsolutions,
+              elapsed, extra)
+        if ev[1] == self.pid:
+            self.q.put(ev)
+        else:                   # forked worker: no writer thread here
+            os.write(self.fd, ''.join(self.lines(ev)).encode('utf-8'))
+
+    def lines(self, ev):
+        [t, pid, event, node, unknown, eqns, nsolutions, elapsed, extra] = ev
+        out = []
+        ids = None
+        if eqns is not None:
+            ids = []
+            for e in eqns:
+                if e is None:
+                    continue
+                i = eqn_id(e)
+                if i not in self.seen:
+                    self.seen.add(i)
+                    out.append(json.dumps({'t': round(t - self.t0, 6), 'event': 'eqn',
+                                           'id': i, 'text': str(e)}) + '\n')
+                ids.append(i)
+        rec = {'t': round(t - self.t0, 6), 'event': event,
+               'node': node, 'unknown': None if unknown is None else str(unknown),
+               'eqns': ids, 'nsolutions': nsolutions, 'elapsed': elapsed, 'pid': pid}
+        rec.update(extra)
+        out.append(json.dumps(rec, default=str) + '\n')
+        return out
+
+    def _writer(self):
+        done = False
+        while not done:
+            batch = [self.q.get()]
+            while len(batch) < BATCH:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            out = []
+            for ev in batch:
+                if ev is None:
+                    done = True
+                    break
+                out.extend(self.lines(ev))
+            if len(out) > 0:
+                os.write(self.fd, ''.join(out).encode('utf-8'))
+
+    def close(self):
+        if self.thread is None or os.getpid() != self.pid:
+            return
+        self.q.put(None)
+        self.thread.join()
+        self.thread = None
+        os.close(self.fd)
+
+
+def start(fname):
+    global _active
+    stop()
+    _active = SolveTrace(fname)
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
+
+
+def active():
+    return _active
+
+
+def emit(event, **kw):
+    if _active is not None:
+        _active.emit(event, **kw)
+
+
+atexit.register(stop)
+
+
+def read(fname):
+    """the events of a trace file in time order"""
+    evs = []
+    with open(fname) as f:
+        for line in f:
+            if line.strip() != '':
+                evs.append(json.loads(line))
+    evs.sort(key=lambda ev: ev['t'])
+    return evs
+
+
+class TestSolveTrace(unittest.TestCase):
+    def test_trace(self):
+        import tempfile
+        import sympy as sp
+        import ikbtbasics.kin_cl as kc
+        th_1 = sp.Symbol('th_1')
+        e = kc.kequation(sp.Symbol('r_11'), sp.cos(th_1))
+        fd, fname = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            tr = start(fname)
+            tr.emit('tick', node='Tan ID', unknown=th_1, elapsed=0.5, status=1)
+            emit('solved', unknown=th_1, eqns=[e, None], nsolutions=2, method='atan2')
+            emit('solved', unknown=th_1, eqns=[e], nsolutions=1)
+            pid = os.fork() if hasattr(os, 'fork') else 0
+            if pid == 0 and hasattr(os, 'fork'):    # child: written directly
+                emit('tick', node='worker')
+                os._exit(0)
+            if pid != 0:
+                os.waitpid(pid, 0)
+            stop()
+            self.assertTrue(active() is None)
+            emit('ignored')
+            evs = read(fname)
+        finally:
+            os.remove(fname)
+        names = [ev['event'] for ev in evs]
+        self.assertEqual(names.count('eqn'), 1)
+        self.assertEqual(names.count('solved'), 2)
+        self.assertTrue('ignored' not in names)
+        tick = evs[names.index('tick')]
+        self.assertEqual(tick['unknown'], 'th_1')
+        self.assertEqual(tick['elapsed'], 0.5)
+        self.assertEqual(tick['status'], 1)
+        solved = evs[names.index('solved')]
+        self.assertEqual(solved['eqns'], [eqn_id(e)])
+        self.assertEqual(solved['method'], 'atan2')
+        self.assertEqual(evs[names.index('eqn')]['text'], str(e))
+        if hasattr(os, 'fork'):
+            self.assertTrue('worker' in [ev.get('node') for ev in evs])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# Symbol table: one interned sympy Symbol per name
+#
+#   sp.var() parses its string, builds the Symbol and writes the names into
+#   the caller's globals every time it is called.  Code that needs a symbol
+#   over and over (leaf ticks, solution notations, placeholders) looks it up
+#   here instead.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import unittest
+import sympy as sp
+
+ZERO = sp.S.Zero  # symbolic (algebraic) zero: instead of x-x
+
+_table = {}  # name: Symbol
+
+
+def sym(name):
+    """the Symbol called name (the same instance every time)"""
+    s = _table.get(name)
+    if s is None:
+        s = sp.Symbol(name)
+        _table[name] = s
+    return s
+
+
+def syms(names):
+    """list of Symbols from 'a b c' or 'a, b, c'"""
+    return [sym(n) for n in names.replace(",", " ").split()]
+
+
+def joint(i):  # th_1 ... th_6
+    return sym("th_" + str(i))
+
+
+def soa(ni):  # sum of angles variable, e.g. soa(23) = th_23 (= th_2 + th_3)
+    return sym("th_" + str(ni))
+
+
+_notations = {}  # (symbol, i): notation symbol
+
+
+def notation(symbol, i):
+    """i'th solution of symbol, e.g. notation(th_1, 2) = th_1s2"""
+    key = (symbol, i)
+    s = _notations.get(key)
+    if s is None:
+        s = sym(str(symbol) + "s" + str(i))
+        _notations[key] = s
+    return s
+
+
+PLACEHOLDER = sym("x")  # super generic place holder (kin_cl, ik_classes)
+
+
+class TestSymtab(unittest.TestCase):
+    def test_symtab(self):
+        th_1 = sp.Symbol("th_1")
+        self.assertTrue(sym("th_1") is sym("th_1"))
+        self.assertEqual(sym("th_1"), th_1)
+        self.assertEqual(syms("a_2, a_3 d_4"), list(sp.symbols("a_2 a_3 d_4")))
+        self.assertEqual(soa(23), sp.Symbol("th_23"))
+        self.assertEqual(joint(1), th_1)
+        self.assertTrue(notation(th_1, 2) is sym("th_1s2"))
+        self.assertEqual(ZERO, th_1 - th_1)
+        self.assertFalse("th_1s2" in globals())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+#
+#   Helpers shared by the code generators (output_cpp.py, output_python.py)
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import re
+import sympy as sp
+from ikbtbasics.solution_record import NO_ARGUMENT  # unknown.argument before it is set
+
+# the pose inputs of every generated solver, in T[row, col] order
+pose_symbols = [['r_11', 'r_12', 'r_13', 'Px'],
+                ['r_21', 'r_22', 'r_23', 'Py'],
+                ['r_31', 'r_32', 'r_33', 'Pz']]
+
+
+def code_name(Robot):
+    # robot name usable as a C / python identifier
+    orig_name = Robot.name.replace('test: ', '')
+    return re.sub(r'\W', '_', orig_name)
+
+
+def joint_symbols(Robot):
+    # joint variables in mechanism order (th_1 ... or d_i for prismatic)
+    M = Robot.Mech
+    joints = []
+    for i in range(M.DH.shape[0]):
+        if M.vv[i] == 1:
+            jexpr = M.DH[i, 3]
+        else:
+            jexpr = M.DH[i, 2]
+        for s in sorted(jexpr.free_symbols, key=str):
+            if s in Robot.variables_symbols or str(s).startswith(('th_', 'd_')):
+                joints.append(s)
+                break
+    return joints
+
+
+def param_values(Robot):
+    # [[param symbol, numerical value or None], ...]
+    pv = []
+    for p in Robot.params:
+        val = None
+        if Robot.Mech is not None and p in Robot.Mech.pvals:
+            val = float(Robot.Mech.pvals[p])
+        pv.append([p, val])
+    return pv
+
+
+def solved_nodes(Robot):
+    # solution nodes in solve order (sorts Robot.solution_nodes in place as before)
+    nlist = Robot.solution_nodes
+    nlist.sort()
+    return [n for n in nlist if len(n.solution_with_notations) > 0]
+
+
+def solution_table(Robot, groups):
+    #  convert the matched solution groups into rows of notations, one
+    #   column per joint (None where a joint has no solution in that group).
+    #   Groups entries which are not joints (e.g. th_23) are dropped.
+    #   groups is read once, so it can be a generator (matching.solution_sets)
+    joints = joint_symbols(Robot)
+    owner = {}
+    for node in Robot.solution_nodes:
+        for nt in node.solution_with_notations.keys():
+            owner[nt] = node.symbol
+    table = []
+    for g in groups:
+        row = [None]*len(joints)
+        for nt in g:
+            s = owner.get(nt)
+            if s in joints:
+                row[joints.index(s)] = nt
+        table.append(row)
+    return joints, table
+
+
+def domain_checks(node, nt, known):
+    #  conditions under which solution nt of node can be computed:
+    #     [['range', x], ...]    abs(x) <= 1    (asin / acos)
+    #     [['nonneg', x], ...]   x >= 0         (sqrt)
+    #     [['nonzero', x], ...]  x != 0         (atan2(0,0), simultaneous eqn)
+    #   The asin/acos and atan2 arguments come from node.arguments; the
+    #   expressions themselves are scanned for sqrt() and for asin/acos
+    #   when no argument was stored.   known: symbols allowed in a check
+    #   (pose, params, notations);  checks using anything else are dropped.
+    rhs = node.solution_with_notations[nt].RHS
+    arg = node.arguments.get(nt, NO_ARGUMENT)
+    if arg is None or arg == NO_ARGUMENT or not arg.free_symbols <= known:
+        arg = None
+    checks = []
+    if arg is not None and 'simultaneous eqn' in node.solvemethod:
+        checks.append(['nonzero', arg])
+    for f in rhs.atoms(sp.asin, sp.acos):
+        if arg is not None and 'arc' in node.solvemethod:
+            x = arg
+        else:
+            x = f.args[0]
+        if ['range', x] not in checks:
+            checks.append(['range', x])
+    for p in rhs.atoms(sp.Pow):
+        if p.exp.is_Rational and p.exp.q == 2 and ['nonneg', p.base] not in checks:
+            checks.append(['nonneg', p.base])
+    return checks
+
+
+def feasibility(Robot):
+    #  Domain guards for every solution (notation) in solve order:
+    #     [[node, nt, deps, checks], ...]
+    #   deps: notations of parent solutions used by nt.  A solution is
+    #   feasible if all its deps are and all its checks pass, so a branch
+    #   below an infeasible parent solution is never computed.
+    nlist = solved_nodes(Robot)
+    notations = set()
+    for node in nlist:
+        notations |= set(node.solution_with_notations.keys())
+    known = set(Robot.params) | notations
+    for row in pose_symbols:
+        known |= set(sp.symbols(row))
+    plan = []
+    for node in nlist:
+        for nt in sorted(node.solution_with_notations.keys(), key=str):
+            rhs = node.solution_with_notations[nt].RHS
+            deps = sorted((rhs.free_symbols & notations) - set([nt]), key=str)
+            plan.append([node, nt, deps, domain_checks(node, nt, known)])
+    return plan
+
+
+def domain_condition(kind, x, absfn='abs'):
+    # one check as source code (x is the argument already printed)
+    if kind == 'range':
+        return absfn + '(' + x + ') <= 1.0'
+    if kind == 'nonneg':
+        return '(' + x + ') >= 0.0'
+    return '(' + x + ') != 0.0'
@@ -23,6 +23,7 @@
 import unittest
 import sys as sys
 import sympy as sp
+import ikbtbasics.symtab as symtab
 
 #######################################################################3
 #
@@ -36,6 +37,12 @@ def print_status(bb, label):
 def print_debug(label):
     print(label)
 
+# sympy pretty printing: only worth setting up in an interactive session
+#   (python -i, IPython).  Scripts print with str() anyway.
+def init_printing():
+    if hasattr(sys, 'ps1') or sys.flags.interactive:
+        sp.init_printing()
+
 ## how many unknowns are in expr?
 def count_unknowns(unknowns, expr): 
     n = 0
@@ -66,6 +73,8 @@ def get_variables(variables, expr):
 
 # get the varible(unknown) object by its symbol
 def find_obj(th_sym, unknowns):
+    if hasattr(unknowns, 'find'):      # kin_cl.UnknownList: indexed
+        return unknowns.find(th_sym)
     for unk in unknowns:
         if unk.symbol == th_sym:
             return unk
@@ -94,7 +103,7 @@ def ik_lhs():  # generate a simple Left Hand side matrix
     for i in [1,2,3]:
         for j in [1,2,3]:
             v = 'r_'+'{:1}{:1}'.format(i,j)
-            m[i-1,j-1] = sp.var(v)
+            m[i-1,j-1] = symtab.sym(v)
 
     m[0,3] = 'Px'
     m[1,3] = 'Py'
@@ -0,0 +1,224 @@
+#!/usr/bin/python
+#
+#   Numeric IK in the running session: the solutions of a Robot compiled
+#   with sp.lambdify (NumPy), no CodeGen/ file written or imported
+#
+#       ik = ik_function(R)            # R: a solved Robot
+#       out, valid = ik.ikin_batch(T)  # same API as IK_equations<name>_nb.py
+#       ik.ikin(T)                     # one pose: list of valid solutions
+#
+#   The solutions (node.solution_with_notations, params substituted) go in
+#   solve order, each one defined in terms of its parents (th_23s1 = ...
+#   th_1s2 ...), and the common subexpressions (sp.cse) of all of them are
+#   shared; the assignments are sorted so every symbol is defined before it
+#   is used.  Validity is computed like the generated code: the domain
+#   guards of codegen_common.feasibility() plus finite values.
+#
+#   The compiled function is cached by a hash of the solution set (the
+#   solutions, the solution table from matching and the parameter values),
+#   so asking again for an unchanged robot costs just the hash.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import hashlib
+import unittest
+
+import numpy as np
+import sympy as sp
+
+import ikbtbasics.matching as mtch
+import ikbtfunctions.codegen_common as cg
+
+POSE = [sp.Symbol(s) for row in cg.pose_symbols for s in row]   # T[i, j], row major
+
+_cache = {}     # solution hash: IKFunction
+
+
+def ik_function(Robot, groups=None, params=None):
+    """compiled numeric IK for a solved Robot (cached).
+    groups: matched solution sets (default: matching_func());
+    params: {param symbol: value}, overriding Robot.Mech.pvals"""
+    if groups is None:
+        groups = mtch.matching_func(Robot.notation_collections, Robot.solution_nodes)
+    [joints, table] = cg.solution_table(Robot, groups)
+    plan = cg.feasibility(Robot)
+    pvals = {}
+    for [p, val] in cg.param_values(Robot):
+        pvals[p] = val
+    if params is not None:
+        pvals.update(params)
+    key = solution_hash(plan, joints, table, pvals)
+    if key not in _cache:
+        _cache[key] = IKFunction(cg.code_name(Robot), joints, table, plan, pvals)
+    return _cache[key]
+
+
+def solution_hash(plan, joints, table, pvals):
+    h = hashlib.sha1()
+    for [node, nt, deps, checks] in plan:
+        h.update((str(nt) + '=' + sp.srepr(node.solution_with_notations[nt].RHS) + ';').encode())
+        h.update(repr([[k, sp.srepr(x)] for [k, x] in checks]).encode())
+    h.update(repr([joints, table]).encode())
+    h.update(repr(sorted([[str(p), v] for [p, v] in pvals.items()])).encode())
+    return h.hexdigest()
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def define_before_use(assignments):
+    # [[symbol, expr], ...] reordered so each symbol is assigned before any
+    #   expr using it (they are in solve order already, except the cse ones)
+    defined = set([a[0] for a in assignments])
+    done = set()
+    out = []
+    todo = list(assignments)
+    while len(todo) > 0:
+        rest = []
+        for [s, e] in todo:
+            if (e.free_symbols & defined) <= done:
+                out.append([s, e])
+                done.add(s)
+            else:
+                rest.append([s, e])
+        assert len(rest) < len(todo), 'ik_lambdify: circular solution dependency'
+        todo = rest
+    return out
+
+
+class IKFunction(object):
+    def __init__(self, name, joints, table, plan, pvals):
+        self.__name__ = 'ik_lambdify(' + name + ')'
+        self.JOINTS = [str(j) for j in joints]
+        self.NJOINTS = len(joints)
+        self.NSOLUTIONS = max(len(table), 1)
+        self.table = table
+        psubs = {}
+        for [p, val] in pvals.items():
+            psubs[p] = sp.nan if val is None else val
+        self.nts = [nt for [node, nt, deps, checks] in plan]
+        self.deps = [deps for [node, nt, deps, checks] in plan]
+        self.checks = []    # [plan index, kind] of each check output
+        exprs = []
+        for [node, nt, deps, checks] in plan:
+            exprs.append(node.solution_with_notations[nt].RHS.subs(psubs))
+        for [i, [node, nt, deps, checks]] in enumerate(plan):
+            for [kind, x] in checks:
+                self.checks.append([i, kind])
+                exprs.append(sp.sympify(x).subs(psubs))
+        [repl, reduced] = sp.cse(exprs, symbols=sp.numbered_symbols('x_cse'))
+        n = len(self.nts)
+        steps = define_before_use([list(r) for r in repl] +
+                                  [[self.nts[i], reduced[i]] for i in range(n)])
+        outputs = self.nts + reduced[n:]
+        self.f = sp.lambdify(POSE, outputs, 'numpy',
+                             cse=lambda exprs: ([tuple(s) for s in steps], outputs))
+
+    def ikin_batch(self, T, out=None, valid=None):
+        T = np.ascontiguousarray(T, dtype=np.float64).reshape(-1, 4, 4)
+        n = T.shape[0]
+        if out is None:
+            out = np.empty((n, self.NSOLUTIONS, self.NJOINTS))
+        if valid is None:
+            valid = np.empty((n, self.NSOLUTIONS), dtype=np.bool_)
+        with np.errstate(all='ignore'):
+            vals = self.f(*[T[:, i, j] for i in range(3) for j in range(4)])
+            vals = [np.broadcast_to(np.asarray(v, dtype=np.float64), (n,)) for v in vals]
+            ok = [np.isfinite(vals[i]) for i in range(len(self.nts))]
+            for [k, [i, kind]] in enumerate(self.checks):
+                x = vals[len(self.nts) + k]
+                if kind == 'range':
+                    ok[i] = ok[i] & (np.abs(x) <= 1.0)
+                elif kind == 'nonneg':
+                    ok[i] = ok[i] & (x >= 0.0)
+                else:
+                    ok[i] = ok[i] & (x != 0.0)
+            okd = {}
+            for [i, nt] in enumerate(self.nts):     # (solve order: parents first)
+                for d in self.deps[i]:
+                    ok[i] = ok[i] & okd[d]
+                okd[nt] = ok[i]
+        index = dict([[nt, i] for [i, nt] in enumerate(self.nts)])
+        for [r, row] in enumerate(self.table):
+            v = np.zeros(n, dtype=np.bool_) if all([nt is None for nt in row]) else np.ones(n, dtype=np.bool_)
+            for [j, nt] in enumerate(row):
+                if nt is None:
+                    out[:, r, j] = np.nan
+                else:
+                    out[:, r, j] = vals[index[nt]]
+                    v = v & okd[nt]
+            valid[:, r] = v
+        for r in range(len(self.table), self.NSOLUTIONS):
+            out[:, r, :] = np.nan
+            valid[:, r] = False
+        return out, valid
+
+    __call__ = ikin_batch
+
+    def ikin(self, T):
+        # one 4x4 pose: returns the list of valid solutions
+        [out, valid] = self.ikin_batch(T)
+        return [list(s) for s in out[0][valid[0]]]
+
+
+class TestIKLambdify(unittest.TestCase):
+    FIXTURE = 'Test_pickles/Pumatest_pickle.p'
+
+    @unittest.skipUnless(os.path.isfile(FIXTURE), FIXTURE + ' not found (made by ikSolver.py Puma)')
+    def test_puma(self):
+        import io
+        import pickle
+        import shutil
+        import tempfile
+        import contextlib
+        import importlib.util
+        import ikbtfunctions.output_python as op
+        with open(self.FIXTURE, 'rb') as pick:
+            [R, unks] = pickle.load(pick)
+        clear_cache()
+        d = tempfile.mkdtemp()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ik = ik_function(R)
+                self.assertTrue(ik_function(R) is ik)                       # cached
+                self.assertFalse(ik_function(R, params={sp.Symbol('a_2'): 0.5}) is ik)
+                groups = mtch.matching_func(R.notation_collections, R.solution_nodes)
+                op.output_python_numba_code(R, groups, DirName=d)   # (the reference)
+            spec = importlib.util.spec_from_file_location('IK_equationsPuma_nb',
+                                                          os.path.join(d, 'IK_equationsPuma_nb.py'))
+            nb = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(nb)
+        finally:
+            shutil.rmtree(d)
+        nb.HAVE_NUMBA = False
+        self.assertEqual(ik.JOINTS, nb.JOINTS)
+        rng = np.random.default_rng(0)
+        q = rng.uniform(-np.pi, np.pi, (200, 6))
+        fk = sp.lambdify(cg.joint_symbols(R), R.Mech.T_06.subs(R.Mech.pvals), 'numpy')
+        T = np.array([np.array(fk(*qq), dtype=float) for qq in q])
+        T[:20, 0, 3] += 5.0    # unreachable
+        [out, valid] = ik.ikin_batch(T)
+        [out2, valid2] = nb.ikin_batch(T)
+        self.assertTrue((valid == valid2).all())
+        self.assertFalse(valid[:20].any())
+        self.assertTrue(valid[20:].all())
+        self.assertTrue(np.allclose(out[valid], out2[valid2], atol=1e-9))
+        self.assertTrue(len(ik.ikin(T[30])) == ik.NSOLUTIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
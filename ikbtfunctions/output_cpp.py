@@ -24,6 +24,11 @@ from sympy.printing.tree import  pprint_nodes, print_tree
 from ikbtbasics.kin_cl import *
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+import ikbtfunctions.codegen_common as cg
+import ikbtbasics.matching as mtch
+import os
+import shutil
+import tempfile
 #
 import pickle     # for storing pre-computed FK eqns
 
@@ -36,14 +41,6 @@ class cpp_output:
     def line(self,str):
         lines = str.split('\n')
         for l in lines:
-            # correct exponential operators for squaring:   x**2 --> x*x
-            #     (** is not valid C++)
-            if re.search(r'\*\*', l):
-                print('fixing exponential ** notation')
-                r = re.compile(r'(\w+)\*\*2')
-                s2 = r.sub(r'\1*\1',l)
-                r = re.compile(r'([a-z]{3}\([^\)]+?\))\*\*2')  #  sin(x)**2 or cos(x)**2
-                l = r.sub(r'\1*\1', s2)  # substitute --> x*x
             print(self.indent*self.level + l, file=self.f)
         
     def push(self):
@@ -53,207 +50,153 @@ class cpp_output:
         print(self.indent*self.level + '}', file=self.f)
         self.level -= 1
 
-def output_cpp_code(Robot, solution_groups):
+def cexpr(expr):
+    # C expression for a sympy expression (pow(), fabs(), M_PI etc.)
+    return sp.ccode(expr, standard='C99')
 
+
+def output_cpp_code(Robot, solution_groups, DirName='CodeGen/Cpp/'):
+    #
+    #   Writes to CodeGen/Cpp/ (or DirName):
+    #      IK_equations<name>.h       API: params struct, ikin_<name>(), ikin_batch_<name>()
+    #      IK_equations<name>.cpp     the solver
+    #      IK_equations<name>_lib.py  ctypes wrapper (numpy in/out)
+    #      build_<name>.sh            builds libIK_equations<name>.so
+    #
     fixed_name = Robot.name.replace(r'_', r'\_')  # this is for LaTex output
     fixed_name = fixed_name.replace('test: ','')
     orig_name  = Robot.name.replace('test: ', '')
-    
+    name = cg.code_name(Robot)
+    NAME = name.upper()
+
+    base = 'IK_equations'+orig_name
+    libname = 'lib' + base + '.so'
+
+    joints, table = cg.solution_table(Robot, solution_groups)
+    pvals = cg.param_values(Robot)
+    nj = len(joints)
+    ns = max(len(table), 1)
+
+    ###################
+    #   Header
     c = cpp_output()
-    
-    DirName = 'CodeGen/Cpp/'
-    fname = DirName + 'IK_equations'+orig_name+'.cpp'
-    f = open(fname, 'w')
-    c.f = f
+    c.f = open(os.path.join(DirName, base + '.h'), 'w')
     c.level = 0
     c.indent = '    '
-    
     c.line('''//
 //  C++ inverse kinematic equations for ''' + fixed_name + '''
-    
+//      (generated by IKBT)
+//
+#ifndef IK_EQUATIONS_''' + NAME + '''_H
+#define IK_EQUATIONS_''' + NAME + '''_H
 
-#include <math.h>
-#include <stdio.h>
-#include <iostream>
+#include <stddef.h>
+#include <stdint.h>
 
-double pi = 3.1415926;
+#define ''' + NAME + '''_NJOINTS    ''' + str(nj) + '''   // joints: ''' + ' '.join([str(j) for j in joints]) + '''
+#define ''' + NAME + '''_NSOLUTIONS ''' + str(ns) + '''
 
-// ikin_Wrists modifies solution_list in-place and 
-// returns 1 for valid solutions and 0 for no solutions
-int ikin(double T[4][4], double solution_list[64][6]);
+// constant DH parameters
+typedef struct
+{''')
+    c.level = 1
+    if len(pvals) == 0:
+        c.line('double unused_;')
+    for [p, val] in pvals:
+        c.line('double ' + str(p) + ';')
+    c.level = 0
+    c.line('''} ''' + name + '''_params;
 
-''')
-    
-    ###################
-    #   Variable and parameter declarations
-    
-    sol_vars = set() #all variables used in solutions
-    # now handled outside, in ikSolver
-    #solution_groups = mtch.matching_func(Robot.notation_collections, Robot.solution_nodes)
-    for s in solution_groups:
-        sol_vars.update(s)
-        
-    #  Variable Declarations 
-    tmp = 'double'
-    for v in sol_vars:
-        tmp += ' ' + str(v) + ','
-        
-    var_decl_str = tmp[:-1] + ';'   # drop trailing comma and end the line
-     
-    # parameter Declarations
-    tmp = '\n'
-    for p in Robot.params:   # other DH dimensional params (l_3 etc)
-        tmp += 'double '+str(p) + ' = XXXXX ; \\ deliberate undeclared error!  USER needs to give numerical value\n'
-    par_decl_str = tmp
-    
-       #  FROM Latex Output
-        #nsolns = len(node.solution_with_notations.values())
-        #for eqn in node.solution_with_notations.values():
-    
-    nlist = Robot.solution_nodes
+#ifdef __cplusplus
+extern "C" {
+#endif
 
-    nlist.sort( ) # sort by solution order
-    
-    
-    indent = '    ' # 4 spaces
-    
-    funcname = 'ikin'
-    c.line('int main()')
-    c.push()
-    c.line('double T[4][4] = { {1,0,0,0},{0,1,0,0},{0,0,1,0},{0,0,0,1}, };' )
-    c.line('double sol_list[64][6] = {0};  // list of solutions')
-    c.line('if('+funcname+'(T, sol_list))')
-    c.push()
-    c.line('std::cout << sol_list;')
-    c.pop()
-    c.line('else')
-    c.push()
-    c.line('std::cout <<  "No valid solution" ;')
-    c.pop()
-    c.pop()
-    # end of main 
-    
-    # ik function
-    c.line('\n// Code to solve the unknowns ')
-    c.line('\n\n// Declarations')
-    c.line('int ' + funcname + '(double T[4][4], double solution_list[64][6] )')  # no indent
-    c.push() 
-    c.line('''\n//define the input vars
-double r_11 = T[0][0];
-double r_12 = T[0][1];
-double r_13 = T[0][2];
-double r_21 = T[1][0];
-double r_22 = T[1][1];
-double r_23 = T[1][2];
-double r_31 = T[2][0];
-double r_32 = T[2][1];
-double r_33 = T[2][2];
-double Px = T[0][3];
-double Py = T[1][3];
-double Pz = T[2][3];
-
-double argument;
+// parameter values from the robot description (zeros if none were given)
+extern const ''' + name + '''_params ''' + name + '''_default_params;
+
+// One pose.  T is the 4x4 pose, row major (16 doubles).
+//   out:   NSOLUTIONS x NJOINTS joint values (row major)
+//   valid: NSOLUTIONS flags, 1 if that solution is finite/reachable
+//   returns the number of valid solutions
+int ikin_''' + name + '''(const ''' + name + '''_params* p, const double* T, double* out, uint8_t* valid);
+
+// n poses: T is n x 16, out is n x NSOLUTIONS x NJOINTS, valid is n x NSOLUTIONS
+void ikin_batch_''' + name + '''(const ''' + name + '''_params* p, const double* T, size_t n, double* out, uint8_t* valid);
 
+#ifdef __cplusplus
+}
+#endif
+
+#endif
+''')
+    c.f.close()
+
+    ###################
+    #   Source
+    c = cpp_output()
+    c.f = open(os.path.join(DirName, base + '.cpp'), 'w')
+    c.level = 0
+    c.indent = '    '
+    c.line('''//
+//  C++ inverse kinematic equations for ''' + fixed_name + '''
+//      (generated by IKBT)
 //
-// Caution:    Generated code is not yet validated
+//  Caution:    Generated code is not yet validated
 //
 
-int True = 1;
-int False = 0;
+#include <cmath>
+#include <cstdio>
+#include "''' + base + '''.h"
+
+#ifndef M_PI
+#define M_PI 3.14159265358979323846
+#endif
+
+using std::atan2; using std::sqrt; using std::sin; using std::cos;
+using std::asin; using std::acos; using std::pow; using std::fabs;
 ''')
-    c.line('int solvable_pose = True;')
-    c.line('// declare variables in solutions')
-    c.line(var_decl_str)
+    tmp = []
+    for [p, val] in pvals:
+        if val is None:
+            tmp.append('0.0 /* ' + str(p) + ': no value given */')
+        else:
+            tmp.append(repr(val))
+    if len(tmp) == 0:
+        tmp = ['0.0']
+    c.line('const ' + name + '_params ' + name + '_default_params = { ' + ', '.join(tmp) + ' };')
     c.line('')
-    c.line('// declare constant parameters (note they will need values!)')
-    c.line(par_decl_str)
-    for node in nlist:  # for each solved var
-        c.line('\n\n') 
-
-        c.line('//Variable: '+str(node.symbol))
-        solno = 0
-        for sol in node.solution_with_notations.values(): 
-            c.line('\n// solution '+str(solno))
-            solno += 1
-            solrhs = str(sol.RHS)
-            # detect arcsin() or arccos()
-            #
-            #  BH   21-Sept
-            #  This code needs a serious refactor.  When solution is for example: 
-            #    th5_ijk = arcsin(x) + atan2(y1,x1)
-            #       (here 'x' is a complicated expression)
-            #  then it is important that the generated code will test  -1 < x < +1 
-            #  if this test fails the pose is unreachable and arcsin fails. 
-            #
-            #  Suggested solution: 
-            #     in each solver, generate test expressions in the R object
-            #     Code generator can then just generate:
-            #        if (fabs(x) > 1) {    // etc. etc.
-            #            * 'x' is hard to isolate from the complete solution *
-            #
-            #     ideally, solver can define an intermediate argument variable:
-            #        trigarg = x
-            #        if(fabs(x) < 1 ) {
-            #            th_ijk = asin(trigarg)
-            #            }
-            #        else {
-            #            set "no-solution" flag
-            #
-            trig = False
-            
-            print('\n\nStudying node: ', node.symbol, ' solution ', solno)
-            print('solvemethod: ', node.solvemethod)
-            print(' LHS: ', str(sol.LHS))
-            print(' RHS: ', solrhs)
-            print()
-            print('argument: ', node.argument)
-            print('solarg:   ', node.arguments[sol.LHS])
-            print('\n\n')
-            
-            c.line('// solvemethod: ' + node.solvemethod )
-            c.line('//    argument: ' + str(node.argument )  )
-            
-            if(node.solvemethod == 'arcsin' or node.solvemethod == 'arccos'):
-               trig = True
-            
-            if(trig):
-               print('  Found asin/acos solution ...', sol.LHS , ' "=" ',sol.RHS)
-               c.line('// Arcsin() or Arccos() based solution:')
-               c.line('argument = '+str(node.arguments[sol.LHS])+';')
-               c.line('if (solvable_pose && fabs(argument) > 1)')
-               c.push()
-               c.line('solvable_pose = False; ')
-               c.pop()
-               c.line('else if (solvable_pose)')
-               c.push()        #  bugus    (here) 
-               c.line(str(sol.LHS) + ' = '+node.solvemethod+'(argument);' )
-               c.pop()
-                
-            if ((not trig) and node.solvemethod == 'atan2(y,x)' ):
-               c.line('// Atan2(y,x) based solution:')
-               c.line(str(sol.LHS) + ' = ' + solrhs + ';')
-                
-            if node.solvemethod == 'algebra':
-               c.line('// Algebra based solution:')
-               c.line(str(sol.LHS) + ' = ' + solrhs + ';')
-            
-            if node.solvemethod == 'x2z2':
-                print('x2z2 output: ', node.argument)
-                c.line('// "x2z2" based solution:')
-                #c.line('argument = '+str(node.arguments[str(sol.LHS)])+';')
-                c.line('argument = '+str(node.arguments[(sol.LHS)])+';')
-                
-            
-            
-            if node.solvemethod == 'simultaneous eqn':
-                print('x2z2 output: ', node.argument)
-                c.line('// simultaneous equations - based solution:')
-                #c.line('argument = '+str(node.arguments[str(sol.LHS)])+';')
-                c.line('argument = '+str(node.arguments[(sol.LHS)])+';')
-                
-            
-                    
-                
+
+    # the solver for one pose: straight line code (no branches, no exits)
+    #   so the batch loop below can be vectorized.
+    c.line('static inline void ik_core(const ' + name + '_params* p, const double* T, double* out, uint8_t* valid)')
+    c.push()
+    c.line('// pose')
+    for i in range(3):
+        for j in range(4):
+            c.line('const double ' + cg.pose_symbols[i][j] + ' = T[' + str(4*i+j) + '];')
+    c.line('// parameters')
+    for [p, val] in pvals:
+        c.line('const double ' + str(p) + ' = p->' + str(p) + ';')
+    c.line('(void) p;')
+
+    # ok_<solution>: domain checks (asin/acos range, sqrt, atan2(0,0)) and
+    #  all parent solutions ok.  Not ok -> NAN without evaluating the
+    #  expression (a select, so the batch loop still vectorizes).
+    last = None
+    for [node, nt, deps, checks] in cg.feasibility(Robot):  # in solve order
+        if node is not last:
+            c.line('')
+            c.line('// Variable: ' + str(node.symbol) + '     solvemethod: ' + node.solvemethod)
+            last = node
+        sol = node.solution_with_notations[nt]
+        conds = ['ok_' + str(d) for d in deps]
+        for [kind, x] in checks:
+            conds.append('(' + cg.domain_condition(kind, cexpr(x), 'fabs') + ')')
+        if len(conds) == 0:
+            conds = ['true']
+        c.line('const bool ok_' + str(nt) + ' = ' + ' && '.join(conds) + ';')
+        c.line('const double ' + str(sol.LHS) + ' = ok_' + str(nt) + ' ? ' + cexpr(sol.RHS) + ' : NAN;')
+
     c.line('''
 //##################################
 //#
@@ -261,45 +204,157 @@ int False = 0;
 //#
 //###################################
 ''')
-    
-    
-    ###########################################################
-    #
-    #   Output of solution sets
-    #
-    ###########################################################
-    
-    
-    grp_lists = []
-    for g in solution_groups:
-        gs = []
-        for t in g:
-            print('g: ', g, 't: ', t)
-            gs.append(str(t))
-            
-        #print(gs.sort, file=f) # in place
-        grp_lists.append(gs)
-        
-    c.line('//(note trailing commas allowed in C++\n')
-
     i = 0
-    j = 0
-    for g in grp_lists:
-        g.sort()
-        for v in g:
-            c.line('solution_list['+ str(i) + '][' + str(j) + '] = ' + v + ';') 
-            j += 1
-        j=0 
-        i+= 1
-        
-    # we are done.   Return 
-    c.line('\n\n')
-    c.line('// return 1 for solved, 0 for no solution')
-    c.line('return(solvable_pose);') 
+    for row in table:
+        ok = []
+        for j in range(nj):
+            if row[j] is None:
+                v = 'NAN'
+            else:
+                v = str(row[j])
+                ok.append('ok_' + v + ' & std::isfinite(' + v + ')')
+            c.line('out[' + str(i*nj + j) + '] = ' + v + ';')
+        if len(ok) == 0:
+            ok = ['0']
+        c.line('valid[' + str(i) + '] = (uint8_t)(' + ' & '.join(ok) + ');')
+        i += 1
+    for i in range(len(table), ns):   # no solution sets at all
+        for j in range(nj):
+            c.line('out[' + str(i*nj + j) + '] = NAN;')
+        c.line('valid[' + str(i) + '] = 0;')
     c.pop()
-    
+
+    c.line('')
+    c.line('int ikin_' + name + '(const ' + name + '_params* p, const double* T, double* out, uint8_t* valid)')
+    c.push()
+    c.line('ik_core(p, T, out, valid);')
+    c.line('int nvalid = 0;')
+    c.line('for (int i = 0; i < ' + NAME + '_NSOLUTIONS; i++) nvalid += valid[i];')
+    c.line('return nvalid;')
+    c.pop()
+    c.line('')
+    c.line('void ikin_batch_' + name + '(const ' + name + '_params* p, const double* T, size_t n, double* out, uint8_t* valid)')
+    c.push()
+    c.line('const ' + name + '_params P = *p;     // local copy: no aliasing with out[]')
+    c.line('#pragma omp simd')
+    c.line('for (size_t i = 0; i < n; i++)')
+    c.level += 1
+    c.line('ik_core(&P, T + 16*i, out + i*' + NAME + '_NSOLUTIONS*' + NAME + '_NJOINTS, valid + i*' + NAME + '_NSOLUTIONS);')
+    c.level -= 1
+    c.pop()
+
+    # small test program:  g++ -DIKBT_MAIN IK_equations<name>.cpp
+    c.line('''
+#ifdef IKBT_MAIN
+int main()
+    {
+    double T[16] = { 1,0,0,0,  0,1,0,0,  0,0,1,0,  0,0,0,1 };
+    double sol_list[''' + NAME + '''_NSOLUTIONS*''' + NAME + '''_NJOINTS];
+    uint8_t valid[''' + NAME + '''_NSOLUTIONS];
+    if (ikin_''' + name + '''(&''' + name + '''_default_params, T, sol_list, valid) == 0)
+        printf("No valid solution\\n");
+    for (int i = 0; i < ''' + NAME + '''_NSOLUTIONS; i++)
+        {
+        if (!valid[i]) continue;
+        for (int j = 0; j < ''' + NAME + '''_NJOINTS; j++)
+            printf("%10.5f ", sol_list[i*''' + NAME + '''_NJOINTS + j]);
+        printf("\\n");
+        }
+    return 0;
+    }
+#endif''')
+    c.f.close()
+
+    ###################
+    #   Build script
+    build = os.path.join(DirName, 'build_' + orig_name + '.sh')
+    f = open(build, 'w')
+    print('''#!/bin/sh
+#  build the ''' + orig_name + ''' IK library used by ''' + base + '''_lib.py
+cd "$(dirname "$0")"
+${CXX:-g++} -O3 -march=native -fno-math-errno -fopenmp-simd -fPIC -shared ''' + base + '''.cpp -o ''' + libname, file=f)
     f.close()
-    
+    os.chmod(build, 0o755)
+
+    ###################
+    #   ctypes wrapper
+    f = open(os.path.join(DirName, base + '_lib.py'), 'w')
+    tmp = []
+    for [p, val] in pvals:
+        tmp.append("('" + str(p) + "', ctypes.c_double)")
+    if len(tmp) == 0:
+        tmp = ["('unused_', ctypes.c_double)"]
+    defaults = []
+    for [p, val] in pvals:
+        if val is not None:
+            defaults.append("'" + str(p) + "': " + repr(val))
+    print('''#
+#  ctypes wrapper for the ''' + orig_name + ''' IK library (generated by IKBT)
+#       build the library first:  sh build_''' + orig_name + '''.sh
+#
+import os
+import ctypes
+import numpy as np
+from numpy.ctypeslib import ndpointer
+
+JOINTS = ''' + str([str(j) for j in joints]) + '''
+NJOINTS = ''' + str(nj) + '''
+NSOLUTIONS = ''' + str(ns) + '''
+
+
+class Params(ctypes.Structure):
+    _fields_ = [''' + ', '.join(tmp) + ''']
+
+DEFAULTS = {''' + ', '.join(defaults) + '''}
+
+_lib = ctypes.CDLL(os.path.join(os.path.dirname(os.path.abspath(__file__)), ''' + repr(libname) + '''))
+_lib.ikin_batch_''' + name + '''.argtypes = [ctypes.POINTER(Params),
+                                ndpointer(np.float64, flags='C_CONTIGUOUS'), ctypes.c_size_t,
+                                ndpointer(np.float64, flags='C_CONTIGUOUS'),
+                                ndpointer(np.uint8, flags='C_CONTIGUOUS')]
+_lib.ikin_batch_''' + name + '''.restype = None
+
+
+def params(**kw):
+    # parameter struct: defaults overridden by keyword args (e.g. d_1=0.5)
+    vals = dict(DEFAULTS)
+    vals.update(kw)
+    return Params(**vals)
+
+
+def _check(out, valid, n):
+    # out, valid from the caller are written with no bounds checks (in C): check them first
+    if out.shape != (n, NSOLUTIONS, NJOINTS) or out.dtype != np.float64 or not out.flags.c_contiguous:
+        raise ValueError('ikin_batch: out must be a C contiguous float64 array of shape ' +
+                         str((n, NSOLUTIONS, NJOINTS)))
+    if valid.shape != (n, NSOLUTIONS) or valid.dtype != np.bool_ or not valid.flags.c_contiguous:
+        raise ValueError('ikin_batch: valid must be a C contiguous bool array of shape ' +
+                         str((n, NSOLUTIONS)))
+
+
+def ikin_batch(T, p=None, out=None, valid=None):
+    # T: (n,4,4) poses.  Returns out (n, NSOLUTIONS, NJOINTS) and valid (n, NSOLUTIONS)
+    #   out, valid (float64, bool; C contiguous) can be given: filled in place
+    if p is None:
+        p = params()
+    T = np.ascontiguousarray(T, dtype=np.float64).reshape(-1, 16)
+    n = T.shape[0]
+    if out is None:
+        out = np.empty((n, NSOLUTIONS, NJOINTS))
+    if valid is None:
+        valid = np.empty((n, NSOLUTIONS), dtype=np.bool_)
+    _check(out, valid, n)
+    _lib.ikin_batch_''' + name + '''(ctypes.byref(p), T, n, out, valid.view(np.uint8))
+    return out, valid
+
+
+def ikin(T, p=None):
+    # one 4x4 pose: returns the list of valid solutions
+    out, valid = ikin_batch(T, p)
+    return [list(s) for s in out[0][valid[0]]]
+''', file=f)
+    f.close()
+
 ###################################################################
 #
 #    Test Code
@@ -315,9 +370,12 @@ class TestSolver010(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         #print '===============  Test updateL.py  ====================='
         # return
     
+    FIXTURE = 'Test_pickles/Pumatest_pickle.p'
+
     def runTest(self):
         self.test_output_cpp()
             
+    @unittest.skipUnless(os.path.isfile(FIXTURE), FIXTURE + ' not found (made by ikSolver.py Puma)')
     def test_output_cpp(self):
         #
         #     Set up robot equations for further solution by BT
@@ -330,33 +388,32 @@ class TestSolver010(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         #
         
         # 1)   Read the test pickle for PUMA equations
-        test_pickle_dir = 'Test_pickles/'       
-        name = test_pickle_dir + 'Puma' + 'test_pickle.p'
+        #   (if it is missing: set TEST_DATA_GENERATION = True in ikSolver.py
+        #    and run  > python ikSolver.py Puma)
+        with open(self.FIXTURE, 'rb') as pick:
+            print('\nReading pre-computed forward kinematics TEST info\n')
+            [R, unks]  = pickle.load(pick)
+        # 2)   call the function output_cpp_code(R)  (into a temp. directory)
+        groups = mtch.matching_func(R.notation_collections, R.solution_nodes)
+        d = tempfile.mkdtemp()
         try:
-            with open(name, 'r') as pick:
-                print('\nReading pre-computed forward kinematics TEST info\n')
-                [R, unks]  = pickle.load(pick)
-        except:  
-            print('\n\n\n        Testing:  Failed to find data pickle file ... quitting()    \n\n\n')
-            # if the test pickle is missing: edit ikSolver.py
-            #    line 32: TEST_DATA_GENERATION = True
-            #    > python ikSolver.py Puma
-            #    (change line 32 back to False)
-
-            quit()
-        # 2)   call the function output_cpp_code(R)
-
-        #output_latex_solution(R,unks)
-
-        output_cpp_code(R)
-        
-        # 3)   assertions
-        
-        print('cpp output file completed')
-        
-        #    3.1)   Open CPP output file
-        #    3.2)   use assertions to check some lines. 
-         
+            output_cpp_code(R, groups, DirName=d)
+
+            # 3)   assertions
+            print('cpp output file completed')
+            fs = 'output_cpp_code FAIL'
+            base = os.path.join(d, 'IK_equationsPuma')
+            for fn in [base+'.h', base+'.cpp', base+'_lib.py', os.path.join(d, 'build_Puma.sh')]:
+                self.assertTrue(os.path.isfile(fn), fs + ': missing ' + fn)
+            hdr = open(base+'.h').read()
+            src = open(base+'.cpp').read()
+        finally:
+            shutil.rmtree(d)
+        self.assertTrue('PUMA_NJOINTS    6' in hdr, fs)
+        self.assertTrue('PUMA_NSOLUTIONS ' + str(len(groups)) in hdr, fs)
+        self.assertTrue('void ikin_batch_Puma(const Puma_params* p, const double* T, size_t n, double* out, uint8_t* valid);' in hdr, fs)
+        self.assertFalse('**' in src, fs)   # no python powers
+        self.assertFalse('XXXXX' in src, fs)
         
 #
 #    Can run your test from command line by invoking this file
@@ -25,7 +25,10 @@ import shutil as sh
 import os as os
 import sys as sys
 import pickle
-import re 
+import re
+import unittest
+import multiprocessing as mp
+import concurrent.futures as cf
 import ikbtbasics.pykinsym as pks
 import ikbtbasics.kin_cl as kc
 from   ikbtbasics.solution_graph_v2 import *
@@ -37,6 +40,76 @@ from   ikbtfunctions.helperfunctions import *
 import ikbtfunctions.graph2latex as gl
 #from kin_cl import *
 
+_latex_cache = {}    # expression: sp.latex() string
+_worker_exprs = None
+
+
+def _cache_key(x):
+    if isinstance(x, sp.MatrixBase):
+        return sp.ImmutableMatrix(x)   # (Matrix is not hashable)
+    return x
+
+
+def latex(x):
+    # sp.latex(), memoized: the same expressions (DH, T_06, J66, the
+    #   solutions) come up in several sections and in both reports
+    key = _cache_key(x)
+    if key not in _latex_cache:
+        _latex_cache[key] = sp.latex(x)
+    return _latex_cache[key]
+
+
+def clear_cache():
+    _latex_cache.clear()
+
+
+def _worker_init(exprs):
+    global _worker_exprs
+    _worker_exprs = exprs
+
+
+def _worker_latex(index):
+    return sp.latex(_worker_exprs[index])
+
+
+def prerender(exprs, nworkers=None):
+    #  fill the latex() cache for a list of expressions, in a process pool
+    #  (forked, like parallel_assigner) when there is more than one CPU.
+    #  The report sections are then put together from the cached strings.
+    todo = []
+    keys = set()
+    for x in exprs:
+        k = _cache_key(x)
+        if k not in _latex_cache and k not in keys:
+            keys.add(k)
+            todo.append(x)
+    nw = nworkers
+    if nw is None:
+        nw = mp.cpu_count()
+    nw = min(nw, len(todo))
+    if nw > 1 and 'fork' in mp.get_all_start_methods():
+        ctx = mp.get_context('fork')
+        with cf.ProcessPoolExecutor(max_workers=nw, mp_context=ctx,
+                                    initializer=_worker_init, initargs=(todo,)) as ex:
+            strings = list(ex.map(_worker_latex, range(len(todo)), chunksize=4))
+    else:
+        strings = [sp.latex(x) for x in todo]
+    for [x, s] in zip(todo, strings):
+        _latex_cache[_cache_key(x)] = s
+
+
+def report_exprs(Robot, T, J, nodes=[]):
+    # every expression a report prints with latex()
+    #   T, J: the squeezed T_06 and J66
+    exprs = [Robot.Mech.DH, ik_lhs()]
+    exprs += [T[:, c] for c in range(T.shape[1])]
+    exprs += [J[:, c] for c in range(J.shape[1])]
+    for node in nodes:
+        exprs.append(node.symbol)
+        for eqn in list(node.solution_with_notations.values()) + list(node.eqnlist):
+            exprs += [eqn.LHS, eqn.RHS]
+    return exprs
+
 
 class LatexFile():
     def __init__(self,fname):
@@ -65,35 +138,39 @@ class LatexFile():
         self.preamble = str;
         
         
-    #  output the final latex file
+    #  output the final latex file (in one write)
     def output(self):
-        f = open(self.filename,'w') 
-        plines(self.preamble,f)
+        parts = list(self.preamble)
         for s in self.sections:
-            print('\n\n',file=f)
-            plines(s,f)
-        plines(self.close,f)
+            parts.append('\n\n\n')
+            parts += list(s)
+        parts += list(self.close)
+        f = open(self.filename,'w')
+        f.write(''.join(parts))
         f.close()
         
 
-def plines(sl,f):
-    for s in sl:
-        print(s,end='',file=f)
-     
-
 #
 #      Generate a complete report in latex
 #
-def output_latex_solution(Robot,variables, groups):
+def output_latex_solution(Robot,variables, groups, DirName='LaTex/'):
     GRAPH = True
-    ''' Print out a latex document of the solution equations. '''
+    ''' Print out a latex document of the solution equations (into DirName). '''
     eol = '\n'
     orig_name =  Robot.name.replace('test: ','')
     fixed_name = orig_name.replace(r'_', r'\_')
 
-    DirName = 'LaTex/' 
-    fname = DirName + 'ik_solution_'+orig_name+'.tex'
+    fname = os.path.join(DirName, 'ik_solution_'+orig_name+'.tex')
     LF = LatexFile(fname)
+
+    LHS = ik_lhs()
+    RHS = kc.notation_squeeze(Robot.Mech.T_06, Robot.squeeze_map())   # see kin_cl.mechanism.T_06
+    j66result = kc.notation_squeeze(Robot.Mech.J66, Robot.squeeze_map())
+
+    # sort the nodes into solution order
+    sorted_node_list = sorted(Robot.solution_nodes)
+
+    prerender(report_exprs(Robot, RHS, j66result, sorted_node_list))
     
     ####################   Intro Section
     
@@ -119,7 +196,7 @@ def output_latex_solution(Robot,variables, groups):
     paramsection = r'''\section{Kinematic Parameters}
     The kinematic parameters for this robot are
     \[ \left [ \alpha_{i-1}, \quad a_{i-1}, \quad d_i, \quad \theta_i \right  ] \]
-    \begin{dmath}''' + sp.latex(Robot.Mech.DH) +  r'\end{dmath}'
+    \begin{dmath}''' + latex(Robot.Mech.DH) +  r'\end{dmath}'
     
     LF.sections.append(paramsection.splitlines())
     
@@ -132,18 +209,15 @@ def output_latex_solution(Robot,variables, groups):
     The forward kinematic equations for this robot are:'''+eol
 
     fksection += r'\begin{dmath} '+eol
-
-    LHS = ik_lhs()
-    RHS = kc.notation_squeeze(Robot.Mech.T_06)   # see kin_cl.mechanism.T_06
     
-    fksection += sp.latex(LHS) + r' \\'+eol 
+    fksection += latex(LHS) + r' \\'+eol 
     
     COLUMNS = True
     if COLUMNS:
         for c in range(4):
-            fksection +=  r'\mathrm{Column \quad'+str(c+1)+'}' +eol+sp.latex(RHS[:,c]) + r'\\'+eol 
+            fksection +=  r'\mathrm{Column \quad'+str(c+1)+'}' +eol+latex(RHS[:,c]) + r'\\'+eol 
     else:
-        fksection += sp.latex(RHS)
+        fksection += latex(RHS)
     fksection += r'\end{dmath}'+eol
 
     fksection += 'Note: column numbers use math notation rather than python indeces.'+eol
@@ -176,13 +250,10 @@ def output_latex_solution(Robot,variables, groups):
     solsection = r'\section{Solutions} '+eol
     solsection += ''' The following equations comprise the full solution set for this robot.''' + eol
 
-    # sort the nodes into solution order
-    sorted_node_list = sorted(Robot.solution_nodes)
-
     for node in sorted_node_list: 
         if node.solvemethod != '':   # skip variables (typically extra SOA's) that are not used.
             ALIGN = True
-            tmp = '$' + sp.latex(node.symbol) + '$'
+            tmp = '$' + latex(node.symbol) + '$'
             tmp = tmp.replace(r'th_', r'\theta_')
             tmp = re.sub(r'_(\d+)',  r'_{\1}', tmp)   # get all digits of subscript into {} for latex
             solsection += r'\subsection{'+tmp+r' } '+eol + 'Solution Method: ' + node.solvemethod + eol
@@ -199,7 +270,7 @@ def output_latex_solution(Robot,variables, groups):
                     tmp2 = r'\\'   # line continuation for align environment
                 else:
                     tmp2 = ''
-                tmp = str(eqn.LaTexOutput(ALIGN))
+                tmp = str(eqn.LaTexOutput(ALIGN, latex))
                 # convert division ('/') to \frac{}{} for nicer output
                 if re.search(r'/',tmp):
                     tmp = tmp.replace(r'(.+)=(.+)/(.+)', r'\1 = \frac{\2}{\3}')
@@ -250,12 +321,15 @@ The following are the sets of joint solutions (poses) for this manipulator:
     '''
     
     # groups = mtch.matching_func(Robot.notation_collections, Robot.solution_nodes)
+    #   (or a generator, matching.solution_sets(): read once)
 
     i=0
     for g in groups:
         solsection += str(g)+eol
 
     solsection += '\end{verbatim}'+eol+eol
+
+    LF.sections.append(solsection)    # (string, like edgesection: keep the newlines)
     
     ####################  Solution methods
      # Equations evaluated (for result verification or debugging)
@@ -266,7 +340,7 @@ The following are the sets of joint solutions (poses) for this manipulator:
             continue
                 #print out the equations evaluated
         # print  'Equation(s):
-        tmp = '$' + sp.latex(node.symbol) + '$'
+        tmp = '$' + latex(node.symbol) + '$'
         tmp = tmp.replace(r'th_', r'\theta_')
         tmp = re.sub(r'_(\d+)',  r'_{\1}', tmp)   # get all digits of subscript into {} for latex
         metsection += r'\subsection{'+tmp+' }'+eol
@@ -274,7 +348,7 @@ The following are the sets of joint solutions (poses) for this manipulator:
 
         for eqn in node.eqnlist:
             metsection += r'\begin{dmath}'+eol
-            metsection += eqn.LaTexOutput()+eol
+            metsection += eqn.LaTexOutput(latex=latex)+eol
             metsection += r'\end{dmath}'+eol
 
     LF.sections.append(metsection.splitlines())
@@ -287,7 +361,6 @@ The following are the sets of joint solutions (poses) for this manipulator:
 
 '''
     
-    j66result = kc.notation_squeeze(Robot.Mech.J66)
     cols = j66result.shape[1]
     
     jsection += r'\begin{dmath}'+eol
@@ -297,10 +370,10 @@ The following are the sets of joint solutions (poses) for this manipulator:
     if COLUMNS:
         for c in range(cols):
             jsection += r'\mathrm{'+ r' Column \quad'+str(c+1)+ r'}\\'+eol
-            jsection += sp.latex(j66result[:,c])+eol
+            jsection += latex(j66result[:,c])+eol
             jsection += r'\\ '+eol
     else:
-        jsection += sp.latex(j66result)+eol
+        jsection += latex(j66result)+eol
     jsection += r'\end{dmath}'+eol
     
     LF.sections.append(jsection.splitlines())
@@ -326,6 +399,12 @@ def output_FK_equations(Robot):
     DirName = 'LaTex/' 
     fname = DirName + 'fk_equations_'+orig_name+'.tex'
     LF = LatexFile(fname)
+
+    LHS = ik_lhs()
+    RHS = kc.notation_squeeze(Robot.Mech.T_06, Robot.squeeze_map())   # see kin_cl.mechanism.T_06
+    j66result = kc.notation_squeeze(Robot.Mech.J66, Robot.squeeze_map())
+
+    prerender(report_exprs(Robot, RHS, j66result))
     
     ####################   Intro Section
     
@@ -351,7 +430,7 @@ def output_FK_equations(Robot):
     paramsection = r'''\section{Kinematic Parameters}
     The kinematic parameters for this robot are
     \[ \left [ \alpha_{i-1}, \quad a_{i-1}, \quad d_i, \quad \theta_i \right  ] \]
-    \begin{dmath}''' + sp.latex(Robot.Mech.DH) +  r'\end{dmath}'
+    \begin{dmath}''' + latex(Robot.Mech.DH) +  r'\end{dmath}'
     
     LF.sections.append(paramsection.splitlines())  
     
@@ -361,18 +440,15 @@ def output_FK_equations(Robot):
     The forward kinematic equations for this robot are:'''+eol
 
     fksection += r'\begin{dmath} '+eol
-
-    LHS = ik_lhs()
-    RHS = kc.notation_squeeze(Robot.Mech.T_06)   # see kin_cl.mechanism.T_06
     
-    fksection += sp.latex(LHS) + r'= \\'+eol 
+    fksection += latex(LHS) + r'= \\'+eol 
     
     COLUMNS = True
     if COLUMNS:
         for c in range(4):
-            fksection += r'\mathrm{Column \quad'+str(c+1)+r'}\\'+eol+sp.latex(RHS[:,c]) + r'\\'+eol 
+            fksection += r'\mathrm{Column \quad'+str(c+1)+r'}\\'+eol+latex(RHS[:,c]) + r'\\'+eol 
     else:
-        fksection += sp.latex(RHS)
+        fksection += latex(RHS)
     fksection += r'\end{dmath}'+eol
 
     fksection += 'Note: column numbers use math notation rather than python indeces.'+eol
@@ -388,7 +464,6 @@ def output_FK_equations(Robot):
 
 '''
     
-    j66result = kc.notation_squeeze(Robot.Mech.J66)
     cols = j66result.shape[1]
     
     jsection += r'\begin{dmath}'+eol
@@ -398,13 +473,33 @@ def output_FK_equations(Robot):
     if COLUMNS:
         for c in range(cols):
             jsection += r'\mathrm{Column \quad '+str(c+1)+r'}\\'+eol
-            jsection += sp.latex(j66result[:,c])+eol
+            jsection += latex(j66result[:,c])+eol
             jsection += r'\\ '+eol
     else:
-        jsection += sp.latex(j66result)+eol
+        jsection += latex(j66result)+eol
     jsection += r'\end{dmath}'+eol
     
     LF.sections.append(jsection.splitlines())
     
     # Write out the file!!
     LF.output()
+
+
+class TestLatexCache(unittest.TestCase):
+    def test_prerender(self):
+        th_1, th_2, d_3 = sp.symbols('th_1 th_2 d_3')
+        T = sp.Matrix([[sp.cos(th_1+th_2), -sp.sin(th_1)*d_3],
+                       [sp.sin(th_1+th_2)/d_3, sp.atan2(sp.cos(th_2), d_3)]])
+        exprs = [T, T[:, 0], T[:, 1], th_1, sp.sqrt(d_3**2 + 1)]
+        clear_cache()
+        prerender(exprs + [th_1], nworkers=2)       # (pool, if it can fork)
+        self.assertEqual(len(_latex_cache), len(exprs))
+        for x in exprs:
+            self.assertEqual(latex(x), sp.latex(x))
+        self.assertEqual(len(_latex_cache), len(exprs))
+        self.assertEqual(latex(kc.notation_squeeze(T)[:, 0]), r'\left[\begin{matrix}c_{12}\\\frac{s_{12}}{d_{3}}\end{matrix}\right]')
+        clear_cache()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,21 +18,24 @@
 # 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
 
 # THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
 import sympy as sp
 #import numpy as np
 from ikbtbasics.kin_cl import *
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+import ikbtfunctions.codegen_common as cg
+from sympy.printing.numpy import NumPyPrinter
 #
 
-def output_python_code(Robot, groups):
+def output_python_code(Robot, groups, DirName='CodeGen/Python/'):
+    #  writes CodeGen/Python/IK_equations<name>.py  (or in DirName)
 
     fixed_name = Robot.name.replace(r'_', r'\_')  # this is for LaTex output
     fixed_name = fixed_name.replace('test: ','')
     orig_name  = Robot.name.replace('test: ', '')
 
-    DirName = 'CodeGen/Python/'
-    fname = DirName + 'IK_equations'+orig_name+'.py'
+    fname = os.path.join(DirName, 'IK_equations'+orig_name+'.py')
     f = open(fname, 'w')
     print('''#!/usr/bin/python
 #  Python inverse kinematic equations for ''' + fixed_name + '''
@@ -55,10 +58,10 @@ pi = np.pi
     if(Robot.Mech.pvals != {}):  # if we have numerical values stored
         for p in Robot.params:
             val = str(Robot.Mech.pvals[p])
-            tmp += str(p) + ' = ' + val + '\n'
+            tmp += '    ' + str(p) + ' = ' + val + '\n'
     else:                        # no stored numerical values
         for p in Robot.params:
-            tmp += str(p) + ' = XXXXX    # deliberate undeclared error!  USER needs to give numerical value \n'
+            tmp += '    ' + str(p) + ' = XXXXX    # deliberate undeclared error!  USER needs to give numerical value \n'
     par_decl_str = tmp
 
 
@@ -73,7 +76,7 @@ pi = np.pi
 # Code to solve the unknowns ''', file=f)
     print('def', funcname +'(T):', file=f) # no indent
     print(indent+'if(T.shape != (4,4)):', file=f)
-    print(indent*2 + 'print ( "bad input to "+funcname'+')', file=f)
+    print(indent*2 + 'print ( "bad input to ' + funcname + '")', file=f)
     print(indent*2 + 'quit()', file=f)
     print('''#define the input vars 
     r_11 = T[0,0]
@@ -99,44 +102,32 @@ pi = np.pi
     print(par_decl_str, file=f)
 
 
-    print(indent + 'print ( " Caution - this code has no solution checking.")', file=f)
-    print(indent + 'print ("in case of domain errors, change the test position / orientation ")', file=f)
-    print(indent + 'print ( " to a pose reachable by your specific robot")', file=f)
-    print(indent + '', file=f)
-    print(indent + 'solvable_pose = True', file=f)
+    print(indent + 'nan = float("nan")', file=f)
     print(indent + '''
- 
+
 #############################################################
 #
-# Future reachable pose checking code (autogenerated) will go here
-#
-#    This code will check asin / acos args etc to determine
-#
-#        solvable_pose = True/False
+#   Reachable pose checking:  ok_<solution> is False when an asin/acos
+#   argument is out of range, a sqrt argument is negative, atan2(0,0)
+#   etc., or when a parent solution is not ok.   Those branches are
+#   not computed.
 #
 #############################################################
- ''', file=f) 
- 
-    for node in nlist:  # for each solved var
-        print('\n', file=f)
-        print(indent + '#Variable: ', str(node.symbol), file=f)
-        for sol in node.solution_with_notations.values():
-            if re.search('asin', str(sol.RHS)) or re.search('acos', str(sol.RHS)):
-                #print '  Found asin/acos solution ...', sol.LHS , ' "=" ',sol.RHS
-                tmp = re.search('\((.*)\)',str(sol.RHS))
-                print(indent + 'if (solvable_pose and abs', tmp.group(0), ' > 1):', file=f)
-                print(indent*2 + 'solvable_pose = False', file=f)
-                print(indent + 'else:', file=f)
-                tmp = str(sol.LHS) + ' = ' + str(sol.RHS)
-                print(indent*2 + tmp, file=f)
-            if re.search('atan', str(sol.RHS)):
-                print('  Found atan2 solution ...', sol.LHS , ' "=" ',sol.RHS)
-                tmp = re.search('\((.*)\)',str(sol.RHS))
-                tmp = str(sol.LHS) + ' = ' + str(sol.RHS)
-                print(indent + tmp, file=f)
-            if node.solvemethod == 'algebra':
-                print('  Found algebra solution ... ' , sol.LHS , ' = ', sol.RHS)
-                print(indent + str(sol.LHS) + ' = ' + str(sol.RHS), file=f)
+ ''', file=f)
+
+    for [node, nt, deps, checks] in cg.feasibility(Robot):  # in solve order
+        sol = node.solution_with_notations[nt]
+        conds = ['ok_' + str(d) for d in deps]
+        for [kind, x] in checks:
+            conds.append(cg.domain_condition(kind, sp.pycode(x, fully_qualified_modules=False)))
+        if len(conds) == 0:
+            conds = ['True']
+        print(indent + '#Variable: ', str(node.symbol), '  (', node.solvemethod, ')', file=f)
+        print(indent + 'ok_' + str(nt) + ' = ' + ' and '.join(conds), file=f)
+        print(indent + 'if ok_' + str(nt) + ':', file=f)
+        print(indent*2 + str(sol.LHS) + ' = ' + str(sol.RHS), file=f)
+        print(indent + 'else:', file=f)
+        print(indent*2 + str(sol.LHS) + ' = nan', file=f)
 
     print('''
 ##################################
@@ -156,27 +147,21 @@ pi = np.pi
 
     #groups = mtch.matching_func(Robot.notation_collections, Robot.solution_nodes)
 
-    grp_lists = []
-    for g in groups:
-        gs = []
-        for t in g:
-            print('g: ', g, 't: ', t)
-            gs.append(str(t))
-
-        #print(gs.sort, file=f) # in place
-        grp_lists.append(gs)
-
+    #  groups can be a generator (matching.solution_sets): one pass, each
+    #  set written out as it arrives
     print(indent +  'solution_list = []', file=f)
-    for g in grp_lists:
-        g.sort()
-        print(indent + '#(note trailing commas allowed in python', file=f)
-        print(indent +  'solution_list.append( [ ', file=f)
+    for g in groups:
+        g = sorted([str(t) for t in g])
+        print(indent + 'if ' + ' and '.join(['ok_' + v for v in g]) + ':', file=f)
+        print(indent*2 + '#(note trailing commas allowed in python', file=f)
+        print(indent*2 +  'solution_list.append( [ ', file=f)
         for v in g:
-            print( v + ', ', file=f),
-        print('] )', file=f)
+            print(indent*2 + v + ', ', file=f),
+        print(indent*2 + '] )', file=f)
 
 
     # we are done.   Return
+    print(indent + 'solvable_pose = len(solution_list) > 0', file=f)
     print(indent + 'if(solvable_pose):', file=f)
     print(indent*2 + 'return(solution_list)', file=f)
     print(indent + 'else: ', file=f)
@@ -234,13 +219,184 @@ if __name__ == "__main__":
 
     i = 0
     for sol in list:
-        print ''
-        print 'Solution ', i
+        print('')
+        print('Solution ', i)
         i+=1
-        print sol
+        print(sol)
 
 
     ''', file=f)
 
 
     f.close()
+
+
+def output_python_numba_code(Robot, groups, DirName='CodeGen/Python/'):
+    #
+    #  Alternate backend: CodeGen/Python/IK_equations<name>_nb.py
+    #     (or in DirName)
+    #
+    #   Pure numeric functions following Numba @njit rules: no printing, no
+    #   exits, no lists; fixed shape output arrays + validity mask.  Numba is
+    #   optional when the generated code runs: without it the same equations
+    #   are evaluated with NumPy, vectorized over the batch of poses.
+    #
+    fixed_name = Robot.name.replace('test: ','')
+    orig_name  = Robot.name.replace('test: ', '')
+
+    fname = os.path.join(DirName, 'IK_equations'+orig_name+'_nb.py')
+
+    nlist = cg.solved_nodes(Robot)   # by solution order
+    joints, table = cg.solution_table(Robot, groups)
+    pvals = cg.param_values(Robot)
+    nj = len(joints)
+    ns = max(len(table), 1)
+    pr = NumPyPrinter({'inline': True})     # numpy.sin(...) etc.
+    indent = '    '
+
+    plan = cg.feasibility(Robot)     # domain guards, in solve order
+
+    def equations(batch):
+        #  per-pose (numba): branches below an infeasible solution are skipped
+        #  batch (numpy):    a branch is skipped if infeasible for all poses
+        lines = []
+        for [node, nt, deps, checks] in plan:
+            sol = node.solution_with_notations[nt]
+            ok = 'ok_' + str(nt)
+            conds = ['ok_' + str(d) for d in deps]
+            for [kind, x] in checks:
+                conds.append('(' + cg.domain_condition(kind, pr.doprint(x), 'numpy.abs') + ')')
+            lines.append('# Variable: ' + str(node.symbol) + '  (' + node.solvemethod + ')')
+            if batch:
+                lines.append(ok + ' = ' + ' & '.join(['np.ones(n, dtype=np.bool_)'] + conds))
+                lines.append('if ' + ok + '.any():')
+                lines.append(indent + str(sol.LHS) + ' = np.where(' + ok + ', ' + pr.doprint(sol.RHS) + ', np.nan)')
+                lines.append('else:')
+                lines.append(indent + str(sol.LHS) + ' = np.full(n, np.nan)')
+            else:
+                lines.append(ok + ' = ' + (' and '.join(conds) if len(conds) > 0 else 'True'))
+                lines.append('if ' + ok + ':')
+                lines.append(indent + str(sol.LHS) + ' = ' + pr.doprint(sol.RHS))
+                lines.append('else:')
+                lines.append(indent + str(sol.LHS) + ' = np.nan')
+        return lines
+
+    def packing(ix):
+        lines = []
+        i = 0
+        for row in table:
+            ok = []
+            for j in range(nj):
+                if row[j] is None:
+                    v = 'np.nan'
+                else:
+                    v = str(row[j])
+                    ok.append('ok_' + v + ' & np.isfinite(' + v + ')')
+                lines.append('out[' + ix + str(i) + ', ' + str(j) + '] = ' + v)
+            if len(ok) == 0:
+                ok = ['False']
+            lines.append('valid[' + ix + str(i) + '] = ' + ' & '.join(ok))
+            i += 1
+        for i in range(len(table), ns):
+            lines.append('out[' + ix + str(i) + ', :] = np.nan')
+            lines.append('valid[' + ix + str(i) + '] = False')
+        return lines
+
+    f = open(fname, 'w')
+    print('''#
+#  Python (Numba/NumPy) inverse kinematic equations for ''' + fixed_name + '''
+#      (generated by IKBT)
+#
+#   ikin_batch(T, out=None, valid=None) -> out, valid
+#        T:     (n,4,4) poses
+#        out:   (n, NSOLUTIONS, NJOINTS) joint values
+#        valid: (n, NSOLUTIONS) True if that solution is finite (reachable)
+#        out and valid can be given (C contiguous, e.g. views of a
+#        memory-mapped dataset, ikbtbasics/pose_dataset.py): filled in place
+#
+import numpy
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    def njit(*args, **kw):     # plain python/numpy fallback
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fcn: fcn
+
+JOINTS = ''' + str([str(j) for j in joints]) + '''
+NJOINTS = ''' + str(nj) + '''
+NSOLUTIONS = ''' + str(ns) + '''
+
+# parameters (numba treats these as compile time constants)''', file=f)
+    for [p, val] in pvals:
+        if val is None:
+            print(str(p) + ' = np.nan   # USER needs to give numerical value', file=f)
+        else:
+            print(str(p) + ' = ' + repr(val), file=f)
+
+    print('''
+
+@njit(cache=True, error_model='numpy')
+def ikin_pose(T, out, valid):
+    # one pose: T (4,4), out (NSOLUTIONS, NJOINTS), valid (NSOLUTIONS,)''', file=f)
+    for i in range(3):
+        for j in range(4):
+            print(indent + cg.pose_symbols[i][j] + ' = T[' + str(i) + ', ' + str(j) + ']', file=f)
+    for l in equations(False) + packing(''):
+        print(indent + l, file=f)
+
+    print('''
+
+@njit(cache=True, error_model='numpy')
+def _ikin_batch_numba(T, out, valid):
+    for i in range(T.shape[0]):
+        ikin_pose(T[i], out[i], valid[i])
+
+
+def _ikin_batch_numpy(T, out, valid):
+    # same equations, vectorized over all the poses
+    n = T.shape[0]''', file=f)
+    for i in range(3):
+        for j in range(4):
+            print(indent + cg.pose_symbols[i][j] + ' = T[:, ' + str(i) + ', ' + str(j) + ']', file=f)
+    for l in equations(True) + packing(':, '):
+        print(indent + l, file=f)
+
+    print('''
+
+def _check(out, valid, n):
+    # out, valid from the caller are written with no bounds checks (numba): check them first
+    if out.shape != (n, NSOLUTIONS, NJOINTS) or out.dtype != np.float64 or not out.flags.c_contiguous:
+        raise ValueError('ikin_batch: out must be a C contiguous float64 array of shape ' +
+                         str((n, NSOLUTIONS, NJOINTS)))
+    if valid.shape != (n, NSOLUTIONS) or valid.dtype != np.bool_ or not valid.flags.c_contiguous:
+        raise ValueError('ikin_batch: valid must be a C contiguous bool array of shape ' +
+                         str((n, NSOLUTIONS)))
+
+
+def ikin_batch(T, out=None, valid=None):
+    T = np.ascontiguousarray(T, dtype=np.float64).reshape(-1, 4, 4)   # (no copy if it is)
+    n = T.shape[0]
+    if out is None:
+        out = np.empty((n, NSOLUTIONS, NJOINTS))
+    if valid is None:
+        valid = np.empty((n, NSOLUTIONS), dtype=np.bool_)
+    _check(out, valid, n)
+    if HAVE_NUMBA:
+        _ikin_batch_numba(T, out, valid)
+    else:
+        with np.errstate(all='ignore'):
+            _ikin_batch_numpy(T, out, valid)
+    return out, valid
+
+
+def ikin(T):
+    # one 4x4 pose: returns the list of valid solutions
+    out, valid = ikin_batch(T)
+    return [list(s) for s in out[0][valid[0]]]
+''', file=f)
+    f.close()
@@ -27,6 +27,7 @@ from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
 
 import b3 as b3          # behavior trees
+import ikbtbasics.solve_trace as solve_trace
 
 
 class assigner(b3.Action):
@@ -43,6 +44,7 @@ class assigner(b3.Action):
             counter = counter + 1
             if not curr.solved:
                 print("\n\nAssigner: variable on blackboard: %s"%curr.symbol)
+                solve_trace.emit('assign', node=self.Name, unknown=curr.symbol)
                 #print '\n\n'
                 tick.blackboard.set("counter", counter)
                 tick.blackboard.set("curr_unk", curr)
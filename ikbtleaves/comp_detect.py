@@ -25,6 +25,8 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 
 import b3 as b3          # behavior trees
 import time       
+import ikbtbasics.solve_trace as solve_trace
+import ikbtbasics.mem_profile as mem_profile
 
        
 #   Detect when all unknowns are solved
@@ -36,6 +38,7 @@ class comp_det(b3.Action):
         super(b3.Action, self).__init__()
         self.FailAllDone = False   # we can set up to succeed when all are done or succeed when more to do. 
         self.Name = '*completion_detect*'
+        self.pause = 2   # sec. after the report, for easier reading/ stopping (0: none)
         
     def tick(self,tick):
         unks = tick.blackboard.get('unknowns')
@@ -66,7 +69,10 @@ class comp_det(b3.Action):
                 str = '{} ({});  '.format(u.symbol, u.solvemethod)
                 print(str,                )
         print('\n\n\n')
-        time.sleep(2)  # for easier reading/ stopping
+        solve_trace.emit('complete', node=self.Name, nunknowns=n, nsolved=ns)
+        mem_profile.checkpoint('BT loop', numbered=True)
+        if self.pause > 0:
+            time.sleep(self.pause)  # for easier reading/ stopping
             
             
         #
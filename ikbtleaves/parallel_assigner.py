@@ -0,0 +1,296 @@
+# Speculative parallel version of assigner + worktools
+#
+# Instead of feeding one unsolved unknown at a time through the worktools
+# subtree (assigner_leaf.py), this node runs the worktools subtree for ALL
+# unsolved unknowns at once in a process pool.  Each worker gets its own
+# copy of the blackboard state.  Only the first solution in assigner
+# order is committed (set_solved() etc.), the one the serial tree would
+# have found: every other worker saw the equations without it.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import sympy as sp
+import copy
+import multiprocessing as mp
+import concurrent.futures as cf
+import unittest
+
+from ikbtfunctions.helperfunctions import *
+from ikbtbasics.kin_cl import *
+from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+
+import b3 as b3          # behavior trees
+from ikbtleaves.assigner_leaf import *
+from ikbtleaves.algebra_solver import *
+
+# blackboard state copied into each worker
+BB_KEYS = ['Robot', 'unknowns', 'eqns_1u', 'eqns_2u', 'eqns_3pu', 'Tm']
+
+#  state shared with forked worker processes (set by _worker_init)
+_worker_state = None
+
+
+def _worker_init(state):
+    global _worker_state
+    _worker_state = state
+
+
+def _run_one(worktools, state, index):
+    #  tick worktools for unknowns[index] against a private copy of the
+    #  blackboard state.  Returns what is needed to commit the result
+    #  in the main process.
+    bb = b3.Blackboard()
+    for k in state.keys():
+        bb.set(k, state[k])
+    R = bb.get('Robot')
+    unknowns = bb.get('unknowns')
+    naux = len(R.kequation_aux_list)
+    u = unknowns[index]
+    bb.set('curr_unk', u)
+    tree = b3.BehaviorTree()
+    tree.root = worktools
+    tree.tick('speculative solve: '+str(u.symbol), bb)
+    u = bb.get('curr_unk')
+    R = bb.get('Robot')
+    return [index, u, R.kequation_aux_list[naux:]]
+
+
+def _worker_solve(index):
+    worktools, state = _worker_state
+    # fork gives us the parent's state; still copy it so that
+    #  several unknowns handled by one worker don't see each other.
+    return _run_one(worktools, copy.deepcopy(state), index)
+
+
+class parallel_assigner(b3.Decorator):
+    #   child: the worktools subtree (normally a Priority of ID+solvers)
+    #   nworkers: process pool size (None = number of CPUs, 1 = serial)
+    def __init__(self, child, nworkers=None):
+        super(parallel_assigner, self).__init__(child)
+        self.nworkers = nworkers
+
+    def pool_size(self):
+        if self.nworkers is None:
+            return mp.cpu_count()
+        return max(self.nworkers, 1)
+
+    def evaluate(self, todo, state):
+        # returns [index, unknown, new aux eqns] for each index in todo
+        nw = min(self.pool_size(), len(todo))
+        if nw > 1 and 'fork' in mp.get_all_start_methods():
+            ctx = mp.get_context('fork')
+            with cf.ProcessPoolExecutor(max_workers=nw, mp_context=ctx,
+                                        initializer=_worker_init,
+                                        initargs=((self.child, state),)) as ex:
+                return list(ex.map(_worker_solve, todo))
+        # serial fallback: same semantics, one copy per unknown
+        return [_run_one(self.child, copy.deepcopy(state), i) for i in todo]
+
+    def valid(self, u, unknowns):
+        #  a speculative solution can only be committed if it depends on
+        #  already solved unknowns (and not on itself)
+        for sol in u.solutions:
+            for v in unknowns:
+                if sol.has(v.symbol) and (v.symbol == u.symbol or not v.solved):
+                    return False
+        return True
+
+    def live_eqn(self, e, eqns):
+        # the live kequation (from eqns) equal to e, a copy made in the
+        #   worker; e itself if the worker derived it
+        if e is None:
+            return None
+        for k in eqns:
+            if k.LHS == e.LHS and k.RHS == e.RHS:
+                return k
+        return e
+
+    def commit(self, tick, u, ur):
+        #  take just the solution from the worker's copy (ur): the live
+        #  unknown u keeps its eqnlist view of R.eqn_index
+        R = tick.blackboard.get('Robot')
+        unknowns = tick.blackboard.get('unknowns')
+        eqns = list(u.eqnlist) + R.kequation_aux_list
+        for k in ['eqns_1u', 'eqns_2u', 'eqns_3pu']:
+            eqns += tick.blackboard.get(k) or []
+        u.rec = ur.rec   # solutions, nsolutions, argument, solvemethod ...
+        u.eqntosolve = self.live_eqn(ur.eqntosolve, eqns)
+        u.secondeqn = self.live_eqn(ur.secondeqn, eqns)
+        u.set_solved(R, unknowns)   # (against the real Robot)
+        tick.blackboard.set('curr_unk', u)
+        if self.BHdebug:
+            print('Parallel assigner: committed ', u.symbol, ' by ', u.solvemethod)
+
+    def tick(self, tick):
+        if not self.child:
+            return b3.ERROR
+        unknowns = tick.blackboard.get('unknowns')
+        R = tick.blackboard.get('Robot')
+
+        #  same round robin as assigner: from "counter" on, then wrap around
+        counter = tick.blackboard.get('counter')
+        if counter is None or counter >= len(unknowns):
+            counter = 0
+        order = list(range(counter, len(unknowns))) + list(range(counter))
+        todo = [i for i in order if not unknowns[i].solved]
+        if len(todo) == 0:
+            return b3.FAILURE
+
+        state = {}
+        for k in BB_KEYS:
+            state[k] = tick.blackboard.get(k)
+
+        #  commit ONE result per round, the first one the serial assigner
+        #  would have reached.  Later ones were solved against a snapshot
+        #  without it (e.g. th_5 by acos alone, not atan2 with th_4) and
+        #  updateL has to re-sort the equations before they are tried again.
+        #  So speculate only one pool's worth of unknowns at a time.
+        progress = False
+        committed = False
+        nw = self.pool_size()
+        for start in range(0, len(todo), nw):
+            if committed:
+                break
+            batch = todo[start:start+nw]
+            print('\n\nParallel assigner: evaluating ', [unknowns[i].symbol for i in batch])
+            results = self.evaluate(batch, state)
+            results.sort(key=lambda r: batch.index(r[0]))
+            for [i, ur, newaux] in results:
+                for e in newaux:     # e.g. x2z2_transform adds new equations
+                    if e not in R.kequation_aux_list:
+                        R.kequation_aux_list.append(e)
+                        progress = True
+                if ur.solved and not self.valid(ur, unknowns):
+                    print('Parallel assigner: rejected speculative solution for ', ur.symbol)
+                elif ur.solved:
+                    self.commit(tick, unknowns[i], ur)
+                    tick.blackboard.set('counter', i + 1)
+                    committed = progress = True
+                    break
+
+        tick.blackboard.set('unknowns', unknowns)
+        tick.blackboard.set('Robot', R)
+        if progress:
+            return b3.SUCCESS
+        return b3.FAILURE
+
+
+class TestSolver011(unittest.TestCase):
+    def setUp(self):
+        self.DB = False  # debug flag
+        print('\n\n===============  Test parallel assigner  =====================')
+        return
+
+    def runTest(self):
+        self.test_parallel_assigner()
+
+    def run_tree(self, root):
+        bb = b3.Blackboard()
+        bb.set('Robot', Robot())
+        tester = b3.BehaviorTree()
+        tester.root = b3.Sequence([test_algebra_id(), root])
+        tester.tick("Test the parallel assigner", bb)
+        return bb
+
+    def test_parallel_assigner(self):
+        # serial reference: assigner + algebra solver
+        asgn = assigner()
+        serial = b3.Repeater(b3.Sequence([asgn, algebra_id(), algebra_solve()]), max_loop=7)
+        bb1 = self.run_tree(serial)
+
+        for nw in [1, 2]:
+            algSol = b3.Sequence([algebra_id(), algebra_solve()])
+            par = parallel_assigner(b3.Priority([algSol]), nworkers=nw)
+            par.BHdebug = self.DB
+            bb2 = self.run_tree(b3.Repeater(par, max_loop=7))   # (one commit per tick)
+
+            fs = ' parallel assigner FAIL (nworkers=' + str(nw) + ')'
+            u1 = bb1.get('unknowns')
+            u2 = bb2.get('unknowns')
+            self.assertEqual(len(u1), len(u2), fs)
+            for a, b in zip(u1, u2):
+                self.assertEqual(a.symbol, b.symbol, fs)
+                # (th_123 = th_1+th_2+B is only accepted by the serial tree)
+                if a.symbol in [d_1, th_2, th_3]:
+                    self.assertEqual(a.solved, b.solved, fs)
+                    self.assertEqual(a.solutions, b.solutions, fs)
+                if b.solved:
+                    self.assertTrue(par.valid(b, u2), fs)
+            # committed in assigner order
+            solved = [u for u in u2 if u.solved]
+            self.assertTrue(len(solved) > 0, fs)
+            self.assertEqual([u.solveorder for u in solved], list(range(1, len(solved)+1)), fs)
+            R2 = bb2.get('Robot')
+            self.assertEqual([n.symbol for n in R2.solution_nodes], [u.symbol for u in solved], fs)
+
+        # a worker's copy of an equation maps back to the live one
+        import pickle
+        eqns = [kequation(th_2, l_1 + l_2), kequation(d_1, th_2*l_1)]
+        par = parallel_assigner(None)
+        self.assertTrue(par.live_eqn(pickle.loads(pickle.dumps(eqns[1])), eqns) is eqns[1])
+        derived = kequation(0, th_2 - l_1)
+        self.assertTrue(par.live_eqn(derived, eqns) is derived)
+        self.assertTrue(par.live_eqn(None, eqns) is None)
+
+
+class TestParallelPuma(unittest.TestCase):
+    FIXTURE = 'Test_pickles/Pumatest_pickle.p'   # (the serial solve)
+
+    @unittest.skipUnless(os.path.isfile(FIXTURE), FIXTURE + ' not found (made by ikSolver.py Puma)')
+    def test_puma(self):
+        import io
+        import pickle
+        import contextlib
+        import numpy as np
+        import ikSolver
+        import ikbtbasics.matching as mtch
+        import ikbtfunctions.ik_lambdify as il
+        import ikbtfunctions.codegen_common as cg
+        with open(self.FIXTURE, 'rb') as pick:
+            [R1, unks1] = pickle.load(pick)
+        saved = [ikSolver.PARALLEL_UNKNOWNS, ikSolver.COMPLETION_PAUSE]
+        ikSolver.PARALLEL_UNKNOWNS = True
+        ikSolver.COMPLETION_PAUSE = 0
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                [R2, unks2] = ikSolver.solve('Puma')
+                g1 = mtch.matching_func(R1.notation_collections, R1.solution_nodes)
+                g2 = mtch.matching_func(R2.notation_collections, R2.solution_nodes)
+                ik1 = il.ik_function(R1)
+                ik2 = il.ik_function(R2)
+        finally:
+            [ikSolver.PARALLEL_UNKNOWNS, ikSolver.COMPLETION_PAUSE] = saved
+        self.assertEqual(len(g2), len(g1))
+        self.assertEqual(ik2.NSOLUTIONS, ik1.NSOLUTIONS)
+        # every parallel solution goes back to its pose through the FK
+        rng = np.random.default_rng(0)
+        q = rng.uniform(-np.pi, np.pi, (100, 6))
+        fk = sp.lambdify(cg.joint_symbols(R1), R1.Mech.T_06.subs(R1.Mech.pvals), 'numpy')
+        T = np.array([np.array(fk(*qq), dtype=float) for qq in q])
+        [out1, valid1] = ik1.ikin_batch(T)
+        [out2, valid2] = ik2.ikin_batch(T)
+        self.assertTrue((valid2.sum(axis=1) == valid1.sum(axis=1)).all())
+        self.assertTrue(valid2.any(axis=1).all())
+        for i in range(T.shape[0]):
+            for s in out2[i][valid2[i]]:
+                self.assertTrue(np.allclose(np.array(fk(*s), dtype=float), T[i], atol=1e-6))
+
+
+if __name__ == "__main__":
+
+    print('\n\n===============  Test parallel assigner =====================')
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver011)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
@@ -31,6 +31,7 @@ from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
 
 import b3 as b3          # behavior trees
+import ikbtbasics.symtab as symtab
 
  
 class test_sub_transform(b3.Action):    # tester for your ID    
@@ -108,8 +109,7 @@ class sub_transform(b3.Action):    # action leaf for
         #    
         found = False 
         
-        sp.var('a z')
-        z = a-a    #  (define symbolic zero!)
+        z = symtab.ZERO    #  (symbolic zero!)
         
         cols = [0,1,2,3]
         rows = [0,1,2]     # we don't care about row 4 ([0,0,0,1])!
@@ -26,6 +26,31 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 import b3 as b3          # behavior trees     
  
 
+def soa_replace(M, soas):
+    """M with each [thx + sgn*thy, th_xy] of soas substituted in the
+    sin()/cos() arguments.  Only entries having both angles of a sum are
+    touched; M itself is returned if nothing changed."""
+    elems = list(M)
+    changed = False
+    for k in range(len(elems)):
+        e = elems[k]
+        fs = e.free_symbols
+        pairs = [p for p in soas if p[0].free_symbols <= fs]
+        if len(pairs) == 0:
+            continue
+        rep = {}
+        for f in angle_sums(e):
+            arg = f.args[0].subs(pairs)
+            if arg != f.args[0]:
+                rep[f] = f.func(arg)
+        if len(rep) > 0:
+            elems[k] = e.xreplace(rep)
+            changed = True
+    if not changed:
+        return M
+    return type(M)(M.rows, M.cols, elems)
+
+
 class sum_id(b3.Action):   ##  we should change this name since its a transform
     def tick(self, tick):
         R = tick.blackboard.get('Robot')  
@@ -37,82 +62,71 @@ class sum_id(b3.Action):   ##  we should change this name since its a transform
         unknowns = tick.blackboard.get("unknowns")
                 
                 
+        thx = sp.Wild('thx')   # sympy wildcards for template matching
+        thy = sp.Wild('thy')
+        sgn = sp.Wild('sgn')
+
+        #  1) find the sums of angles in all the matrix equations
+        #  2) substitute all of them at once, one pass per matrix equation
+        #     (only the entries that have sums of angles are rebuilt)
+        soas = []   # [thx + sgn*thy, th_xy]
+        unkn_sums_sym = set()  # keep track of joint variable symbols
         for matr_equ in R.mequation_list:
-            
-            Tmatrix = matr_equ
-            
-            #print 'sum_transform.py: working on ', Tmatrix
-            #Tmatrix_squeeze = sp.simplify(notation_squeeze(Tmatrix))
-            
-            #if(self.BHdebug):
-                ##print 'sum of angles transform: input: '
-                ##sp.pprint(matr_equ.Ts)
-                ###print out the squeezed form
-                #print 'sum of angles transform: squeezed test input:'
-                #sp.pprint(Tmatrix_squeeze)
-                
-            unkn_sums_sym = set() #keep track of joint variable symbols
-            
-            thx = sp.Wild('thx')   # sympy wildcards for template matching
-            thy = sp.Wild('thy')
-            sgn = sp.Wild('sgn')
-            
-            success_flag = False
-            
-            Tmlist = Tmatrix.get_kequation_list() # convert to list of equns
-            for Teqn in Tmlist:   
-                for expr in [Teqn.LHS, Teqn.RHS]:
-                        # need new ways to identify thx +/- thy
-                        # notation_squeeze does not pick up - cases
-                        #eLHS = expr.LHS
-                        #eRHS = expr.RHS
-    
-                        
-                        #print 'sum_of_angles_ID: ', expr 
-                    
-                        sub_sin = expr.find(sp.sin(thx + sgn * thy)) #returns a subset of expressions with the query pattern, this finds sin(thx) too
-                        sub_cos = expr.find(sp.cos(thx + sgn * thy))
-                            
-                        found = False
-                        while len(sub_sin) > 0 and not found:
-                            sin_expr = sub_sin.pop()
-                            d = sin_expr.match(sp.sin(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0: #has to be joint variable
-                                found = True
-
-                            
-                        while len(sub_cos) > 0 and not found:
-                            cos_expr = sub_cos.pop()
-                            d = cos_expr.match(sp.cos(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
-                                found = True
-                            
-                        if found:
-                            print('test: found:', expr)
-                            success_flag = True
-                            th_xy = find_xy(d[thx], d[thy])
-                            #if not exists in the unknown list (this requires proper hashing), create variable
-                            if th_xy not in unkn_sums_sym:
-                                print("found NEW 'joint' (updated) (sumofangle) variable: ")
-                                print(th_xy)
-                                #  try moving soa equation to Tm.auxeqns
-                                unkn_sums_sym.add(th_xy) #add into the joint variable set
-                                newjoint = unknown(th_xy)
-                                # extract subscripts from SOA variables to get combined variable
-                                #   ([3:] eliminates 'th_' from string name)
-                                #print('test: .n ',str(d[thx])[3:], str(d[thy])[3:])
-                                newjoint.n = int(str(d[thx])[3:]+str(d[thy])[3:]) # store new subscript
-                                #newjoint.joint_eq = d[thx] + d[sgn] * d[thy]
-                                unknowns.append(newjoint) #add it to unknowns list 
-                                tmpeqn = kequation(th_xy, d[thx] + d[sgn] * d[thy])
-                                print('sumofanglesT: appending ', tmpeqn)
-                                # store the SOA aux equation 
-                                R.kequation_aux_list.append(tmpeqn)
-                                print(d[thx] + d[sgn]*d[thy])
-                                #substitute all thx +/- thy expression with th_xy
-                                matr_equ.Ts = matr_equ.Ts.subs(d[thx] + d[sgn] * d[thy], th_xy)
-                                matr_equ.Td = matr_equ.Td.subs(d[thx] + d[sgn] * d[thy], th_xy) 
-        
+            exprs = []
+            for i in range(0, 3):  # (same elements as get_kequation_list())
+                for j in range(0, 4):
+                    exprs += [matr_equ.Td[i, j], matr_equ.Ts[i, j]]
+            for e in matr_equ.auxeqns:
+                exprs += [e.LHS, e.RHS]
+            for expr in exprs:
+                # need new ways to identify thx +/- thy
+                # notation_squeeze does not pick up - cases
+                if len(angle_sums(expr)) == 0:
+                    continue  # no sin()/cos() of a sum: no need for find()/match()
+
+                sub_sin = expr.find(sp.sin(thx + sgn * thy)) #returns a subset of expressions with the query pattern, this finds sin(thx) too
+                sub_cos = expr.find(sp.cos(thx + sgn * thy))
+
+                found = False
+                while len(sub_sin) > 0 and not found:
+                    sin_expr = sub_sin.pop()
+                    d = sin_expr.match(sp.sin(thx + sgn * thy))
+                    if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0: #has to be joint variable
+                        found = True
+
+                while len(sub_cos) > 0 and not found:
+                    cos_expr = sub_cos.pop()
+                    d = cos_expr.match(sp.cos(thx + sgn * thy))
+                    if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
+                        found = True
+
+                if found:
+                    print('test: found:', expr)
+                    th_xy = find_xy(d[thx], d[thy])
+                    #if not exists in the unknown list (this requires proper hashing), create variable
+                    if th_xy not in unkn_sums_sym:
+                        print("found NEW 'joint' (updated) (sumofangle) variable: ")
+                        print(th_xy)
+                        unkn_sums_sym.add(th_xy) #add into the joint variable set
+                        soas.append([d[thx] + d[sgn] * d[thy], th_xy])
+                        if find_obj(th_xy, unknowns) is not None:
+                            continue   # (e.g. from the FK sum of angles transform)
+                        newjoint = unknown(th_xy)
+                        # extract subscripts from SOA variables to get combined variable
+                        #   ([3:] eliminates 'th_' from string name)
+                        newjoint.n = int(str(d[thx])[3:]+str(d[thy])[3:]) # store new subscript
+                        unknowns.append(newjoint) #add it to unknowns list
+                        tmpeqn = kequation(th_xy, d[thx] + d[sgn] * d[thy])
+                        print('sumofanglesT: appending ', tmpeqn)
+                        # store the SOA aux equation
+                        R.kequation_aux_list.append(tmpeqn)
+
+        #substitute all thx +/- thy expressions with th_xy
+        if len(soas) > 0:
+            for matr_equ in R.mequation_list:
+                matr_equ.Ts = soa_replace(matr_equ.Ts, soas)
+                matr_equ.Td = soa_replace(matr_equ.Td, soas)
+
         tick.blackboard.set('Robot', R)
         tick.blackboard.set("unknowns", unknowns)# we've got to keep the blackboard tags standard
         
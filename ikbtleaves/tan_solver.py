@@ -80,8 +80,6 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
 
                 # fix the eqn, but not changing the original equation - DZ
                 tmp = e.RHS-e.LHS
-                sp.var('dummy')
-                lhs =  dummy-dummy  # x-x is not same thing as 0 (!)
                 if(not (tmp).has(u.symbol)):
                     continue        # only look at equations having the current unknown in them
                 if(self.BHdebug):
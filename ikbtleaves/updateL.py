@@ -29,6 +29,7 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 from ikbtfunctions.ik_robots import *
 
 import b3 as b3          # behavior trees
+import ikbtbasics.symtab as symtab
 import pickle     # for storing pre-computed FK eqns
 
 class updateL(b3.Action):    # Set up (update) the equation lists
@@ -41,8 +42,7 @@ class updateL(b3.Action):    # Set up (update) the equation lists
         [L1, L2, L3p] = R.scan_for_equations(variables)   # get the equation lists
         # aux equation (e.g. th_45 = th_4+th+5
         for e in R.kequation_aux_list:
-            sp.var('x')
-            e1 = kequation(x-x, e.LHS-e.RHS)  # simplified form
+            e1 = kequation(symtab.ZERO, e.LHS-e.RHS)  # simplified form
             cu = count_unknowns(variables, e1.RHS)
             if cu == 1:
                 L1.append(e1)
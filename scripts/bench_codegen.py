@@ -0,0 +1,139 @@
+#!/usr/bin/python
+#
+#    Benchmark the generated IK solvers against each other
+#
+#   > python scripts/bench_codegen.py Puma [npose]
+#
+#   Needs Test_pickles/<robot>test_pickle.p  (ikSolver.py with
+#   TEST_DATA_GENERATION = True).  Regenerates the code from the pickle (in a
+#   temp. directory, CodeGen/ is not touched), then times on the same random
+#   (reachable) poses:
+#       python:  IK_equations<robot>.py      one pose per call (math module)
+#       numpy:   IK_equations<robot>_nb.py   batch, Numba not used
+#       numba:   IK_equations<robot>_nb.py   batch, @njit  (if numba installed)
+#       cpp:     libIK_equations<robot>.so   batch, via ctypes (if g++ works)
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import io
+import time
+import shutil
+import pickle
+import tempfile
+import importlib
+import subprocess
+import contextlib
+import warnings
+
+import numpy as np
+import sympy as sp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # project dir.
+
+import ikbtbasics.matching as mtch
+import ikbtfunctions.codegen_common as cg
+import ikbtfunctions.output_python as op
+import ikbtfunctions.output_cpp as oc
+
+
+def load_robot(name):
+    with open('Test_pickles/' + name + 'test_pickle.p', 'rb') as pf:
+        [R, unks] = pickle.load(pf)
+    return R
+
+
+def random_poses(R, n, seed=0):
+    # FK of random joint values (so every pose is reachable)
+    joints = cg.joint_symbols(R)
+    fk = sp.lambdify(joints, R.Mech.T_06.subs(R.Mech.pvals), 'numpy')
+    rng = np.random.default_rng(seed)
+    q = rng.uniform(-np.pi, np.pi, (n, len(joints)))
+    return np.array([np.array(fk(*qq), dtype=float) for qq in q])
+
+
+def timeit(fcn, reps=3):
+    best = 1.0e9
+    for i in range(reps):
+        t0 = time.perf_counter()
+        fcn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(name, npose):
+    d = tempfile.mkdtemp(prefix='bench_codegen_')
+    try:
+        run_bench(name, npose, d)
+    finally:
+        shutil.rmtree(d)
+
+
+def run_bench(name, npose, d):
+    # d: where the code is generated (and built)
+    R = load_robot(name)
+    groups = mtch.matching_func(R.notation_collections, R.solution_nodes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        op.output_python_code(R, groups, DirName=d)
+        op.output_python_numba_code(R, groups, DirName=d)
+        oc.output_cpp_code(R, groups, DirName=d)
+    T = random_poses(R, npose)
+    results = []    # [variant, seconds]
+
+    sys.path.insert(0, d)
+    warnings.simplefilter('ignore')
+    plain = importlib.import_module('IK_equations' + name)
+    fcn = getattr(plain, 'ikin_' + name)
+    nscalar = min(npose, 2000)    # one pose at a time is slow
+
+    def run_plain():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(nscalar):
+                try:
+                    fcn(T[i])
+                except ValueError:   # math domain error
+                    pass
+    results.append(['python (per pose)', timeit(run_plain, 1) * npose / nscalar])
+
+    nb = importlib.import_module('IK_equations' + name + '_nb')
+    have_numba = nb.HAVE_NUMBA
+    nb.HAVE_NUMBA = False
+    results.append(['numpy (batch)', timeit(lambda: nb.ikin_batch(T))])
+    if have_numba:
+        nb.HAVE_NUMBA = True
+        nb.ikin_batch(T[:2])      # compile
+        results.append(['numba (batch)', timeit(lambda: nb.ikin_batch(T))])
+
+    build = os.path.join(d, 'build_' + name + '.sh')
+    if subprocess.call(['sh', build]) == 0:
+        cpp = importlib.import_module('IK_equations' + name + '_lib')
+        results.append(['C++ (batch, ctypes)', timeit(lambda: cpp.ikin_batch(T))])
+
+    print('\n' + name + ':  ' + str(npose) + ' poses')
+    print('{:24s} {:>12s} {:>14s}'.format('variant', 'usec/pose', 'poses/sec'))
+    for [v, t] in results:
+        print('{:24s} {:12.3f} {:14.0f}'.format(v, 1.0e6 * t / npose, npose / t))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python scripts/bench_codegen.py <robot> [npose]')
+        quit()
+    npose = 100000
+    if len(sys.argv) > 2:
+        npose = int(sys.argv[2])
+    bench(sys.argv[1], npose)
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+#
+#    Micro-benchmark of the solver leaves on real equation sets
+#
+#   > python scripts/bench_leaves.py [robot ...] [-r reps] [-l leaf,leaf] [-v]
+#
+#   Needs Test_pickles/<robot>test_pickle.p  (ikSolver.py with
+#   TEST_DATA_GENERATION = True).  Those hold the solved [R, unks]; the
+#   state at solve step k is rebuilt from them: unknowns solved before step k
+#   stay solved, the others are reset, curr_unk is the k'th unknown solved and
+#   the equation lists come from updateL.
+#
+#   Each leaf is ticked on its own (leaf.tick(), no BT) on every step, reps
+#   times, each time on a fresh copy of the step's state (unpickled outside
+#   the timed region: leaves change R and the unknowns).  Reported per leaf,
+#   in ms per tick over all steps and reps:  median, 25%/75%, min/max, and
+#   "noise", the median over steps of (75% - 25%)/median of that step's reps.
+#   The sympy cache is cleared before each tick (a repeated tick would
+#   otherwise just hit the cache); --warm-cache keeps it.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import io
+import time
+import pickle
+import argparse
+import contextlib
+from sympy.core.cache import clear_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # project dir.
+
+import b3 as b3
+from ikbtbasics.solution_record import SolutionRecord
+from ikbtleaves.tan_solver import tan_id
+from ikbtleaves.sincos_solver import sincos_id
+from ikbtleaves.sinANDcos_solver import sinandcos_id
+from ikbtleaves.algebra_solver import algebra_id
+from ikbtleaves.two_eqn_m7 import simu_id
+from ikbtleaves.x2y2_transform import x2z2_transform
+from ikbtleaves.sub_transform import sub_transform
+from ikbtleaves.sum_id import sum_id
+from ikbtleaves.updateL import updateL
+
+LEAVES = [['tan_id', tan_id], ['sincos_id', sincos_id], ['sinandcos_id', sinandcos_id],
+          ['algebra_id', algebra_id], ['simu_id', simu_id],
+          ['x2z2_transform', x2z2_transform], ['sub_transform', sub_transform],
+          ['sum_id', sum_id]]
+ROBOTS = ['Wrist', 'Puma', 'UR5', 'KawasakiRS007L']
+REPS = 7
+
+
+def unsolve(u):
+    # back to the state of an unknown before the solve got to it
+    u.solved = False
+    u.readytosolve = False
+    u.solveorder = 0
+    u.usedfortransform = False
+    u.eqntosolve = None
+    u.secondeqn = None
+    u.rec = SolutionRecord()
+    u.sincos_solutions = []
+    u.sincos_eqnlist = []
+    u.solvable_sincos = False
+    u.tan_solutions = []
+    u.tan_eqnlist = []
+    u.solvable_tan = False
+
+
+def snapshots(name):
+    """[[curr_unk symbol, pickled state]] for each solve step of the robot"""
+    with open('Test_pickles/' + name + 'test_pickle.p', 'rb') as pf:
+        data = pf.read()
+    [R, unks] = pickle.loads(data)
+    order = sorted([u for u in unks if u.solveorder > 0], key=lambda u: u.solveorder)
+    steps = []
+    for k in range(len(order)):
+        [R, unks] = pickle.loads(data)
+        done = set([u.symbol for u in order[:k]])
+        for u in unks:
+            if u.symbol not in done:
+                unsolve(u)
+        R.solveN = k
+        curr = [u for u in unks if u.symbol == order[k].symbol][0]
+        bb = b3.Blackboard()
+        bb.set('Robot', R)
+        bb.set('unknowns', unks)
+        tick = b3.Tick(tree=b3.BehaviorTree(), blackboard=bb)
+        with contextlib.redirect_stdout(io.StringIO()):
+            updateL().tick(tick)
+        state = [bb.get('Robot'), unks, curr, bb.get('eqns_1u'), bb.get('eqns_2u'),
+                 bb.get('eqns_3pu')]
+        steps.append([curr.symbol, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)])
+    return steps
+
+
+def time_leaf(cls, state, warm):
+    [R, unks, curr, L1, L2, L3p] = pickle.loads(state)
+    if not warm:
+        clear_cache()
+    bb = b3.Blackboard()
+    bb.set('Robot', R)
+    bb.set('unknowns', unks)
+    bb.set('curr_unk', curr)
+    bb.set('eqns_1u', L1)
+    bb.set('eqns_2u', L2)
+    bb.set('eqns_3pu', L3p)
+    tick = b3.Tick(tree=b3.BehaviorTree(), blackboard=bb)
+    leaf = cls()
+    with contextlib.redirect_stdout(io.StringIO()):   # leaves are chatty
+        t0 = time.perf_counter()
+        status = leaf.tick(tick)
+        dt = time.perf_counter() - t0
+    return [dt, status]
+
+
+def quantile(xs, q):
+    # xs sorted
+    i = q * (len(xs) - 1)
+    lo = int(i)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (i - lo)
+
+
+def bench(name, leaves, reps, verbose, warm=False):
+    fname = 'Test_pickles/' + name + 'test_pickle.p'
+    if not os.path.isfile(fname):
+        print('{:16s} no test pickle ({:s})'.format(name, fname))
+        return
+    steps = snapshots(name)
+    print('\n{:s}: {:d} solve steps, {:d} reps'.format(name, len(steps), reps))
+    print('   {:16s} {:>5s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>6s}  {:s}'.format(
+          'leaf', 'succ', 'median', '25%', '75%', 'min', 'max', 'noise', '(ms per tick)'))
+    for [lname, cls] in leaves:
+        alltimes = []
+        noise = []
+        nsucc = 0
+        for [sym, state] in steps:
+            ts = []
+            for i in range(reps):
+                [dt, status] = time_leaf(cls, state, warm)
+                ts.append(dt)
+            if status == b3.SUCCESS:
+                nsucc += 1
+            ts.sort()
+            m = quantile(ts, 0.5)
+            if m > 0:
+                noise.append((quantile(ts, 0.75) - quantile(ts, 0.25)) / m)
+            alltimes += ts
+            if verbose:
+                print('      {:14s} {:10s} {:9.3f}'.format('', str(sym), 1000 * m))
+        alltimes.sort()
+        noise.sort()
+        print('   {:16s} {:5d} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:5.0f}%'.format(
+              lname, nsucc, 1000 * quantile(alltimes, 0.5), 1000 * quantile(alltimes, 0.25),
+              1000 * quantile(alltimes, 0.75), 1000 * alltimes[0], 1000 * alltimes[-1],
+              100 * quantile(noise, 0.5) if len(noise) > 0 else 0.0))
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='IKBT leaf micro-benchmarks')
+    ap.add_argument('robots', nargs='*', default=ROBOTS)
+    ap.add_argument('-r', '--reps', type=int, default=REPS)
+    ap.add_argument('-l', '--leaves', default=None, help='comma separated, e.g. tan_id,sum_id')
+    ap.add_argument('-v', '--verbose', action='store_true', help='median per solve step')
+    ap.add_argument('--warm-cache', action='store_true', help="don't clear the sympy cache")
+    args = ap.parse_args()
+    leaves = LEAVES
+    if args.leaves is not None:
+        names = args.leaves.split(',')
+        leaves = [l for l in LEAVES if l[0] in names]
+    for name in args.robots:
+        bench(name, leaves, args.reps, args.verbose, args.warm_cache)
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+#
+#    Benchmark matching.matching_func (grouping the solutions into sets)
+#
+#   > python scripts/bench_matching.py [robot ...]      (default: Puma UR5 KawasakiRS007L)
+#
+#   Needs Test_pickles/<robot>test_pickle.p  (ikSolver.py with
+#   TEST_DATA_GENERATION = True).
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import io
+import time
+import pickle
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # project dir.
+
+import ikbtbasics.matching as mtch
+
+
+def bench(name, reps=20):
+    fname = 'Test_pickles/' + name + 'test_pickle.p'
+    if not os.path.isfile(fname):
+        print('{:16s} no test pickle ({:s})'.format(name, fname))
+        return
+    with open(fname, 'rb') as pf:
+        [R, unks] = pickle.load(pf)
+    times = []
+    for i in range(reps):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):   # matching_func is chatty
+            groups = mtch.matching_func(R.notation_collections, R.solution_nodes)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    print('{:16s} {:6d} {:6d} {:6d} {:10.2f} {:10.2f}'.format(name,
+          len(R.solution_nodes), len(R.notation_collections), len(groups),
+          1000*times[len(times)//2], 1000*times[0]))
+
+
+if __name__ == '__main__':
+    robots = sys.argv[1:]
+    if len(robots) == 0:
+        robots = ['Puma', 'UR5', 'KawasakiRS007L']
+    print('{:16s} {:>6s} {:>6s} {:>6s} {:>10s} {:>10s}'.format('robot', 'nodes',
+          'groups', 'sets', 'median ms', 'best ms'))
+    for name in robots:
+        bench(name)
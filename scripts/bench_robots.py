@@ -0,0 +1,309 @@
+#!/usr/bin/python
+#
+#    End to end benchmark: robots from ik_robots.py through every stage
+#
+#   > python scripts/bench_robots.py [robot ...]                compare with baseline
+#   > python scripts/bench_robots.py --save [robot ...]         (re)write the baseline
+#   > python scripts/bench_robots.py --modes warm --tolerance 50 Puma
+#
+#   Each robot and mode runs in a fresh interpreter:
+#     cold:  no fk_eqns/ pickle.  forward kinematics, Robot (get_mequation_set),
+#            scan_for_equations, sum-of-angles transform, solution nodes,
+#            fk_store save + load (to a temp. file; fk_eqns/ is not touched)
+#     warm:  fk_eqns/<robot>_pickle.p  (skipped if it isn't there; run
+#            ikSolver.py <robot> once to make it)
+#   then both:  BT solve, matching (all solution sets), and the LaTeX,
+#   Python, Python/Numba and C++ writers (into a temp. directory; LaTex/ and
+#   CodeGen/ are not touched).  Seconds per stage and the peak RSS of the
+#   process are recorded.
+#
+#   Results are compared with the baseline (default logs/bench_baseline.json,
+#   per machine, not in git).  Exit status 1 if the total of a robot/mode, or
+#   any stage taking at least MIN_SEC, is more than --tolerance percent
+#   slower than its baseline.
+#
+#   Cold runs of the bigger robots take a long time (sum-of-angles
+#   simplification): KawasakiRS007L is many minutes.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import io
+import json
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+import contextlib
+import subprocess
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORMAT = 'IKBT benchmark'
+VERSION = 1
+
+# robots the BT can solve (ik_robots.py), roughly fastest first
+ROBOTS = ['Wrist', 'Puma', 'UR5', 'KawasakiRS007L']
+MODES = ['cold', 'warm']
+BASELINE = 'logs/bench_baseline.json'
+TOLERANCE = 25.0    # percent
+MIN_SEC = 0.25      # stages faster than this are too noisy to compare
+
+COLD_STAGES = ['fk', 'mequations', 'scan', 'soa', 'nodes', 'pickle_save', 'pickle_load']
+WARM_STAGES = ['pickle_load']
+STAGES = ['solve', 'matching', 'latex', 'python', 'numba', 'cpp']
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':    # bytes there
+        kb = kb / 1024.0
+    return kb / 1024.0
+
+
+class Stopwatch(object):
+    def __init__(self):
+        self.times = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        yield
+        self.times[name] = time.perf_counter() - t0
+
+
+def setup_cold(robot, sw):
+    import ikbtbasics.kin_cl as kc
+    import ikbtbasics.fk_store as fk_store
+    from ikbtbasics.ik_classes import Robot
+    from ikbtfunctions.ik_robots import robot_params
+
+    [dh, vv, params, pvals, unknowns] = robot_params(robot)
+    m = kc.mechanism(dh, params, vv)
+    m.pvals = pvals
+    with sw.stage('fk'):
+        m.forward_kinematics()
+    with sw.stage('mequations'):
+        R = Robot(m, robot)
+    with sw.stage('scan'):
+        R.scan_for_equations(unknowns)
+    with sw.stage('soa'):
+        R.sum_of_angles_transform(unknowns)
+    with sw.stage('nodes'):
+        R.generate_solution_nodes(unknowns)
+
+    fd, fname = tempfile.mkstemp(suffix='_pickle.p')
+    os.close(fd)
+    try:
+        with sw.stage('pickle_save'):
+            fk_store.save(fname, m, R, unknowns)
+        with sw.stage('pickle_load'):
+            [m, R, unknowns] = fk_store.load(fname)
+    finally:
+        os.remove(fname)
+    R.name = robot
+    R.params = params
+    return [R, kc.UnknownList(unknowns)]
+
+
+def setup_warm(robot, sw):
+    import ikSolver
+    if not os.path.isfile('fk_eqns/' + robot + '_pickle.p'):
+        return None
+    with sw.stage('pickle_load'):
+        return ikSolver.setup_robot(robot)
+
+
+def run_one(robot, mode):
+    # in the child interpreter: returns {'stages': {...}, 'total': .., 'peak_rss_mb': ..}
+    os.chdir(PROJECT)
+    sys.path.insert(0, PROJECT)
+    import ikSolver
+    import ikbtbasics.matching as matching
+    import ikbtfunctions.output_latex as ol
+    import ikbtfunctions.output_python as op
+    import ikbtfunctions.output_cpp as oc
+
+    ikSolver.COMPLETION_PAUSE = 0
+    sw = Stopwatch()
+    with contextlib.redirect_stdout(io.StringIO()):     # the solver is chatty
+        if mode == 'cold':
+            setup = setup_cold(robot, sw)
+        else:
+            setup = setup_warm(robot, sw)
+        if setup is None:
+            return None
+        [R, unknowns] = setup
+
+        with sw.stage('solve'):
+            [R, unks] = ikSolver.solve(robot, R, unknowns)
+
+        groups = lambda: matching.solution_sets(R.notation_collections, R.solution_nodes,
+                                                limit=ikSolver.MAX_SOLUTION_SETS)
+        with sw.stage('matching'):
+            nsets = len(list(groups()))
+        #  the writers go to a temp. directory, not the project's
+        #  LaTex/ and CodeGen/ (LaTex/IK_preamble.tex etc. are still read)
+        d = tempfile.mkdtemp(prefix='bench_robots_')
+        try:
+            with sw.stage('latex'):
+                ikSolver.output_solution_graph(R)
+                ol.output_latex_solution(R, unks, groups(), DirName=d)
+            with sw.stage('python'):
+                op.output_python_code(R, groups(), DirName=d)
+            with sw.stage('numba'):
+                op.output_python_numba_code(R, groups(), DirName=d)
+            with sw.stage('cpp'):
+                oc.output_cpp_code(R, groups(), DirName=d)
+        finally:
+            shutil.rmtree(d)
+
+    return {'stages': sw.times, 'total': sum(sw.times.values()),
+            'peak_rss_mb': peak_rss_mb(), 'nsets': nsets}
+
+
+def run(robot, mode, timeout):
+    try:
+        p = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', robot, mode],
+                           cwd=PROJECT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           universal_newlines=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print('bench_robots: ', robot, mode, ' over the timeout (', timeout, ' sec)')
+        return False
+    if p.returncode != 0:
+        print(p.stderr[-2000:])
+        print('bench_robots: ', robot, mode, ' FAILED')
+        return False
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+
+def load_baseline(fname):
+    if not os.path.isfile(fname):
+        return {}
+    with open(fname) as f:
+        data = json.load(f)
+    if data.get('format') != FORMAT or data.get('version') != VERSION:
+        print('bench_robots: ignoring ', fname, ' (not a version ', VERSION, ' baseline)')
+        return {}
+    return data['results']
+
+
+def save_baseline(fname, results):
+    old = load_baseline(fname)
+    for robot in results:
+        old.setdefault(robot, {}).update(results[robot])
+    import sympy as sp
+    data = {'format': FORMAT, 'version': VERSION, 'date': time.strftime('%Y-%m-%d %H:%M'),
+            'host': platform.node(), 'python': platform.python_version(),
+            'sympy': sp.__version__, 'results': old}
+    d = os.path.dirname(fname)
+    if d != '' and not os.path.isdir(d):
+        os.makedirs(d)
+    with open(fname, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+def pct(new, old):
+    if old is None or old <= 0:
+        return None
+    return 100.0 * (new - old) / old
+
+
+def compare(robot, mode, res, base, tolerance):
+    # prints the table for one run; returns a list of regressions
+    order = (COLD_STAGES if mode == 'cold' else WARM_STAGES) + STAGES + ['total']
+    times = dict(res['stages'])
+    times['total'] = res['total']
+    btimes = {}
+    if base is not None:
+        btimes = dict(base['stages'])
+        btimes['total'] = base['total']
+    bad = []
+    print('\n{:s} ({:s}):  peak RSS {:.0f} MB{:s}   {:d} solution sets'.format(robot, mode,
+          res['peak_rss_mb'] or 0.0,
+          '' if base is None or not base.get('peak_rss_mb') else
+          ' (baseline {:.0f})'.format(base['peak_rss_mb']), res['nsets']))
+    print('   {:12s} {:>10s} {:>10s} {:>8s}'.format('stage', 'sec', 'baseline', 'change'))
+    for s in order:
+        if s not in times:
+            continue
+        b = btimes.get(s)
+        d = pct(times[s], b)
+        flag = ''
+        if d is not None and d > tolerance and (s == 'total' or b >= MIN_SEC):
+            flag = '  SLOWER'
+            bad.append([robot, mode, s, d])
+        print('   {:12s} {:10.3f} {:>10s} {:>8s}{:s}'.format(s, times[s],
+              '-' if b is None else '{:.3f}'.format(b),
+              '-' if d is None else '{:+.1f}%'.format(d), flag))
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description='IKBT end to end benchmark')
+    ap.add_argument('robots', nargs='*', default=ROBOTS)
+    ap.add_argument('--modes', default=','.join(MODES), help='cold,warm')
+    ap.add_argument('--baseline', default=BASELINE)
+    ap.add_argument('--save', action='store_true', help='write results as the baseline')
+    ap.add_argument('--tolerance', type=float, default=TOLERANCE, help='percent slower allowed')
+    ap.add_argument('--timeout', type=float, default=None, help='sec. per run')
+    ap.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child is not None:
+        res = run_one(*args.child)
+        print(json.dumps(res))
+        return True
+
+    baseline = load_baseline(os.path.join(PROJECT, args.baseline))
+    results = {}
+    bad = []
+    for robot in args.robots:
+        for mode in args.modes.split(','):
+            res = run(robot, mode, args.timeout)
+            if res is False:
+                bad.append([robot, mode, 'FAILED', 0.0])
+                continue
+            if res is None:
+                print('\n{:s} ({:s}): skipped (no fk_eqns/ pickle)'.format(robot, mode))
+                continue
+            results.setdefault(robot, {})[mode] = res
+            bad += compare(robot, mode, res, baseline.get(robot, {}).get(mode), args.tolerance)
+
+    if args.save:
+        save_baseline(os.path.join(PROJECT, args.baseline), results)
+        print('\nbaseline saved: ', args.baseline)
+        return True
+    if len(bad) > 0:
+        print('\nREGRESSIONS (more than {:.0f}% slower):'.format(args.tolerance))
+        for [robot, mode, s, d] in bad:
+            print('   {:16s} {:5s} {:12s} {:+.1f}%'.format(robot, mode, s, d))
+        return False
+    print('\nno regressions over {:.0f}%'.format(args.tolerance))
+    return True
+
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+#
+#    Startup cost of ikSolver.py (imports only, no robot work)
+#
+#   > python scripts/bench_startup.py [budget_ms]
+#
+#   Runs  python -X importtime -c "import ikSolver"  a few times in fresh
+#   interpreters and reports the total import time, the slowest IKBT
+#   modules, and whether the code writers (output_*, imported only when
+#   there is a solution to write) slipped back into startup.
+#   Exit status 1 if the median is over the budget (default BUDGET_MS).
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import subprocess
+
+BUDGET_MS = 1500.0    # sympy alone is ~400 ms here
+NRUNS = 5
+DEFERRED = ['ikbtfunctions.output_latex', 'ikbtfunctions.output_python',
+            'ikbtfunctions.output_cpp']
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime():
+    # [[module, self usec, cumulative usec]] for one fresh interpreter
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ikSolver'],
+                       cwd=PROJECT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                       universal_newlines=True)
+    if p.returncode != 0:
+        print(p.stderr)
+        print('bench_startup: import ikSolver failed')
+        quit()
+    rows = []
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        [selft, cumt, name] = line[len('import time:'):].split('|')
+        rows.append([name.strip(), int(selft), int(cumt)])
+    return rows
+
+
+def main(budget):
+    runs = [importtime() for i in range(NRUNS)]
+    totals = sorted([sum([r[1] for r in rows]) / 1000.0 for rows in runs])
+    median = totals[len(totals) // 2]
+
+    rows = runs[len(runs) // 2]
+    cum = dict([[r[0], r[2] / 1000.0] for r in rows])
+    ours = sorted([r for r in rows if r[0].split('.')[0] in ('ikSolver', 'ikbtbasics',
+                   'ikbtfunctions', 'ikbtleaves', 'b3')], key=lambda r: -r[1])
+
+    print('import ikSolver: {:.0f} ms median of {:d}  (min {:.0f}, max {:.0f})'.format(
+          median, NRUNS, totals[0], totals[-1]))
+    print('   of which sympy {:.0f} ms, numpy {:.0f} ms'.format(cum.get('sympy', 0.0),
+          cum.get('numpy', 0.0)))
+    print('\nslowest IKBT modules (self time, ms):')
+    for r in ours[:10]:
+        print('   {:40s} {:8.1f}'.format(r[0], r[1] / 1000.0))
+
+    ok = True
+    late = [m for m in DEFERRED if m in cum]
+    if len(late) > 0:
+        print('\nimported at startup (should be deferred): ', late)
+        ok = False
+    if median > budget:
+        print('\nOVER BUDGET: {:.0f} ms > {:.0f} ms'.format(median, budget))
+        ok = False
+    else:
+        print('\nwithin budget ({:.0f} ms)'.format(budget))
+    return ok
+
+
+if __name__ == '__main__':
+    budget = BUDGET_MS
+    if len(sys.argv) > 1:
+        budget = float(sys.argv[1])
+    if not main(budget):
+        sys.exit(1)
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+#    Time breakdown of a solve trace (ikSolver.py with TRACE = True)
+#
+#   > python scripts/trace_report.py logs/Puma_trace.jsonl [nrows]
+#
+#   Per leaf:     ticks, successes, total/mean/max seconds, % of the solve
+#   Per unknown:  leaf ticks and seconds while it was the current unknown
+#                 (blackboard 'curr_unk'), when and how it was solved
+#   Plus budget overruns.  Only leaves (action/condition nodes) are counted
+#   so that time isn't counted again for each composite above them.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ikbtbasics.solve_trace as solve_trace
+
+LEAVES = ('action', 'condition')
+SUCCESS = 1     # b3.SUCCESS
+
+
+def breakdown(evs):
+    # returns [total seconds, {leaf: stats}, {unknown: stats}, [overruns]]
+    leaves = {}
+    unks = {}
+    overruns = []
+    t_start = evs[0]['t'] if len(evs) > 0 else 0.0
+    t_end = evs[-1]['t'] if len(evs) > 0 else 0.0
+    for ev in evs:
+        kind = ev['event']
+        if kind == 'start':
+            t_start = ev['t']
+        elif kind == 'end':
+            t_end = ev['t']
+        elif kind == 'tick' and ev.get('category') in LEAVES:
+            dt = ev['elapsed']
+            s = leaves.setdefault(ev['node'], {'ticks': 0, 'success': 0, 'time': 0.0, 'max': 0.0})
+            s['ticks'] += 1
+            s['time'] += dt
+            s['max'] = max(s['max'], dt)
+            if ev.get('status') == SUCCESS:
+                s['success'] += 1
+            u = unks.setdefault(ev['unknown'], {'ticks': 0, 'time': 0.0, 'solved': None})
+            u['ticks'] += 1
+            u['time'] += dt
+        elif kind == 'solved':
+            u = unks.setdefault(ev['unknown'], {'ticks': 0, 'time': 0.0, 'solved': None})
+            if u['solved'] is None:
+                u['solved'] = ev
+        elif kind == 'overrun':
+            overruns.append(ev)
+    return [t_end - t_start, leaves, unks, overruns]
+
+
+def report(fname, nrows=20):
+    evs = solve_trace.read(fname)
+    [total, leaves, unks, overruns] = breakdown(evs)
+    t0 = evs[0]['t'] if len(evs) > 0 else 0.0
+    pct = lambda t: 100.0 * t / total if total > 0 else 0.0
+
+    print('{:s}: {:d} events, solve {:.2f} sec'.format(fname, len(evs), total))
+
+    print('\nleaves (by total time):')
+    print('   {:32s} {:>6s} {:>6s} {:>9s} {:>9s} {:>9s} {:>6s}'.format(
+          'node', 'ticks', 'succ', 'total s', 'mean s', 'max s', '%'))
+    rows = sorted(leaves.items(), key=lambda kv: -kv[1]['time'])
+    for [name, s] in rows[:nrows]:
+        print('   {:32s} {:6d} {:6d} {:9.3f} {:9.4f} {:9.3f} {:6.1f}'.format(
+              str(name)[:32], s['ticks'], s['success'], s['time'], s['time'] / s['ticks'],
+              s['max'], pct(s['time'])))
+    leaftime = sum([s['time'] for s in leaves.values()])
+    print('   {:32s} {:6s} {:6s} {:9.3f} {:9s} {:9s} {:6.1f}'.format(
+          '(all leaves)', '', '', leaftime, '', '', pct(leaftime)))
+
+    print('\nunknowns (by leaf time while current):')
+    print('   {:12s} {:>6s} {:>9s} {:>6s}  {:>9s}  {:s}'.format(
+          'unknown', 'ticks', 'total s', '%', 'solved@s', 'method (nsolutions)'))
+    rows = sorted(unks.items(), key=lambda kv: -kv[1]['time'])
+    for [name, u] in rows[:nrows]:
+        sv = u['solved']
+        if sv is None:
+            how = '{:>9s}  {:s}'.format('-', '')
+        else:
+            how = '{:9.2f}  {} ({})'.format(sv['t'] - t0, sv.get('method'), sv['nsolutions'])
+        print('   {:12s} {:6d} {:9.3f} {:6.1f}  {:s}'.format(
+              str(name)[:12], u['ticks'], u['time'], pct(u['time']), how))
+
+    if len(overruns) > 0:
+        print('\nbudget overruns:')
+        for ev in overruns:
+            print('   {:32s} {:8s} {:9.2f} s'.format(str(ev['node'])[:32], ev['reason'],
+                  ev['elapsed']))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: trace_report.py TRACE.jsonl [nrows]')
+        quit()
+    nrows = 20
+    if len(sys.argv) > 2:
+        nrows = int(sys.argv[2])
+    report(sys.argv[1], nrows)
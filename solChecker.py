@@ -1,228 +1,263 @@
-from ikbtbasics.ik_classes import *
-from ikbtfunctions.ik_robots import * 
-from ikbtbasics.kin_cl import *
-from math import *
-import os
-
-testing = False
-
-robot = 'Puma'
-
-
-((th_1, th_2, th_3, th_4, th_5, th_6)) = sp.symbols(('th_1', 'th_2', 'th_3', 'th_4', 'th_5', 'th_6'))
-((d_1, d_2, d_3, d_4, d_5, d_6)) = sp.symbols(('d_1', 'd_2', 'd_3', 'd_4', 'd_5', 'd_6'))
-((h,l_0, l_1, l_2, l_3, l_4)) = sp.symbols(('h','l_0', 'l_1', 'l_2', 'l_3', 'l_4'))
-((a_2, a_3)) = sp.symbols(('a_2', 'a_3'))
-sp.var('Px Py Pz')
-
-#   Get the robot model 
-[dh, vv, params, pvals, unknowns] = robot_params(robot)  # see ik_robots.py 
-
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
-
-# need to type in the poses
-pose = {th_1: 30*deg, th_2: 50*deg, th_3: 40*deg, th_4: 45*deg, th_5: 120*deg, \
-        th_6: 60*deg, th_23: 90*deg}
-
-
-params_num = {a_2: 5, a_3: 1, d_3: 2, d_4:4}
-#params_num = pvals
-
-a_2 = 5
-a_3 = 1
-d_3 = 2
-d_4 = 4
-
-
-
-#T = forward_kinematics_N(M, pose, pvals)
-T = forward_kinematics_N(M, pose, params_num)
-
-def convert_to_degrees(solution_list):
-    solution_in_degree = []
-    for a_set in solution_list:
-        curr_set = []
-        for curr_rad in a_set:
-            if curr_rad > 2*pi:
-                curr_rad = curr_rad % (2*pi)
-            curr_set.append(degrees(curr_rad))
-        solution_in_degree.append(curr_set)
-    return solution_in_degree
-
-def verify_T_matrices(pose_list, variable_template, M, params_num):
-    T_mat_list = []
-
-    for one_pose in pose_list:
-        pose = {}
-        for i in range(len(one_pose)):
-            pose[variable_template[i]] = one_pose[i]*deg
-
-        T = forward_kinematics_N(M, pose, params_num)
-        T_mat_list.append(T)
-    return T_mat_list
-
-
-
-
-
-
-#define the input vars
-r_11 = T[0,0]
-r_12 = T[0,1]
-r_13 = T[0,2]
-r_21 = T[1,0]
-r_22 = T[1,1]
-r_23 = T[1,2]
-r_31 = T[2,0]
-r_32 = T[2,1]
-r_33 = T[2,2]
-Px = T[0,3]
-Py = T[1,3]
-Pz = T[2,3]
-
-    
-
+#!/usr/bin/python
 #
-# Caution:    Generated code is not yet validated
+#    Check a generated IK solver against the FK, over a set of poses
 #
-
-
+#   > python solChecker.py [robot] [poses.npy|dataset] [-n npose] [-b batch] [-o dir] [--cpp]
 #
-
-   #Variable:  th_1
-th_1s1 = atan2(Px, -Py) + atan2(sqrt(Px**2 + Py**2 - d_3**2), -d_3)
-th_1s2 = atan2(Px, -Py) + atan2(-sqrt(Px**2 + Py**2 - d_3**2), -d_3)
-
-
-#Variable:  th_3
-th_3s3 = atan2(-2*a_2*d_4, 2*a_2*a_3) + atan2(sqrt(4*a_2**2*a_3**2 + 4*a_2**2*d_4**2 - (Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s2) + Py*sin(th_1s2))**2)**2), Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s2) + Py*sin(th_1s2))**2)
-th_3s2 = atan2(-2*a_2*d_4, 2*a_2*a_3) + atan2(-sqrt(4*a_2**2*a_3**2 + 4*a_2**2*d_4**2 - (Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s1) + Py*sin(th_1s1))**2)**2), Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s1) + Py*sin(th_1s1))**2)
-th_3s1 = atan2(-2*a_2*d_4, 2*a_2*a_3) + atan2(sqrt(4*a_2**2*a_3**2 + 4*a_2**2*d_4**2 - (Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s1) + Py*sin(th_1s1))**2)**2), Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s1) + Py*sin(th_1s1))**2)
-th_3s4 = atan2(-2*a_2*d_4, 2*a_2*a_3) + atan2(-sqrt(4*a_2**2*a_3**2 + 4*a_2**2*d_4**2 - (Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s2) + Py*sin(th_1s2))**2)**2), Pz**2 - a_2**2 - a_3**2 - d_4**2 + (Px*cos(th_1s2) + Py*sin(th_1s2))**2)
-
-
-#Variable:  th_23
-th_23s2 = atan2(Pz*(-a_2*cos(th_3s2) - a_3) - (-Px*cos(th_1s1) - Py*sin(th_1s1))*(a_2*sin(th_3s2) - d_4), Pz*(a_2*sin(th_3s2) - d_4) + (-Px*cos(th_1s1) - Py*sin(th_1s1))*(-a_2*cos(th_3s2) - a_3))
-th_23s4 = atan2(Pz*(-a_2*cos(th_3s4) - a_3) - (-Px*cos(th_1s2) - Py*sin(th_1s2))*(a_2*sin(th_3s4) - d_4), Pz*(a_2*sin(th_3s4) - d_4) + (-Px*cos(th_1s2) - Py*sin(th_1s2))*(-a_2*cos(th_3s4) - a_3))
-th_23s1 = atan2(Pz*(-a_2*cos(th_3s3) - a_3) - (-Px*cos(th_1s2) - Py*sin(th_1s2))*(a_2*sin(th_3s3) - d_4), Pz*(a_2*sin(th_3s3) - d_4) + (-Px*cos(th_1s2) - Py*sin(th_1s2))*(-a_2*cos(th_3s3) - a_3))
-th_23s3 = atan2(Pz*(-a_2*cos(th_3s1) - a_3) - (-Px*cos(th_1s1) - Py*sin(th_1s1))*(a_2*sin(th_3s1) - d_4), Pz*(a_2*sin(th_3s1) - d_4) + (-Px*cos(th_1s1) - Py*sin(th_1s1))*(-a_2*cos(th_3s1) - a_3))
-
-
-#Variable:  th_2
-th_2s2 = th_23s4 - th_3s4
-th_2s4 = th_23s3 - th_3s1
-th_2s1 = th_23s2 - th_3s2
-th_2s3 = th_23s1 - th_3s3
-
-
-#Variable:  th_4
-th_4s3 = atan2(r_13*sin(th_1s2) - r_23*cos(th_1s2), r_13*cos(th_1s2)*cos(th_23s4) + r_23*sin(th_1s2)*cos(th_23s4) - r_33*sin(th_23s4))
-th_4s7 = atan2(r_13*sin(th_1s1) - r_23*cos(th_1s1), r_13*cos(th_1s1)*cos(th_23s3) + r_23*sin(th_1s1)*cos(th_23s3) - r_33*sin(th_23s3))
-th_4s2 = atan2(-r_13*sin(th_1s1) + r_23*cos(th_1s1), -r_13*cos(th_1s1)*cos(th_23s2) - r_23*sin(th_1s1)*cos(th_23s2) + r_33*sin(th_23s2))
-th_4s6 = atan2(-r_13*sin(th_1s2) + r_23*cos(th_1s2), -r_13*cos(th_1s2)*cos(th_23s1) - r_23*sin(th_1s2)*cos(th_23s1) + r_33*sin(th_23s1))
-th_4s4 = atan2(-r_13*sin(th_1s2) + r_23*cos(th_1s2), -r_13*cos(th_1s2)*cos(th_23s4) - r_23*sin(th_1s2)*cos(th_23s4) + r_33*sin(th_23s4))
-th_4s1 = atan2(r_13*sin(th_1s1) - r_23*cos(th_1s1), r_13*cos(th_1s1)*cos(th_23s2) + r_23*sin(th_1s1)*cos(th_23s2) - r_33*sin(th_23s2))
-th_4s8 = atan2(-r_13*sin(th_1s1) + r_23*cos(th_1s1), -r_13*cos(th_1s1)*cos(th_23s3) - r_23*sin(th_1s1)*cos(th_23s3) + r_33*sin(th_23s3))
-th_4s5 = atan2(r_13*sin(th_1s2) - r_23*cos(th_1s2), r_13*cos(th_1s2)*cos(th_23s1) + r_23*sin(th_1s2)*cos(th_23s1) - r_33*sin(th_23s1))
-
-
-#Variable:  th_5
-th_5s4 = atan2((-r_13*sin(th_1s2) + r_23*cos(th_1s2))/sin(th_4s6), -r_13*sin(th_23s1)*cos(th_1s2) - r_23*sin(th_1s2)*sin(th_23s1) - r_33*cos(th_23s1))
-th_5s8 = atan2((-r_13*sin(th_1s2) + r_23*cos(th_1s2))/sin(th_4s5), -r_13*sin(th_23s1)*cos(th_1s2) - r_23*sin(th_1s2)*sin(th_23s1) - r_33*cos(th_23s1))
-th_5s1 = atan2((-r_13*sin(th_1s2) + r_23*cos(th_1s2))/sin(th_4s3), -r_13*sin(th_23s4)*cos(th_1s2) - r_23*sin(th_1s2)*sin(th_23s4) - r_33*cos(th_23s4))
-th_5s2 = atan2((-r_13*sin(th_1s1) + r_23*cos(th_1s1))/sin(th_4s7), -r_13*sin(th_23s3)*cos(th_1s1) - r_23*sin(th_1s1)*sin(th_23s3) - r_33*cos(th_23s3))
-th_5s6 = atan2((-r_13*sin(th_1s1) + r_23*cos(th_1s1))/sin(th_4s1), -r_13*sin(th_23s2)*cos(th_1s1) - r_23*sin(th_1s1)*sin(th_23s2) - r_33*cos(th_23s2))
-th_5s3 = atan2((-r_13*sin(th_1s1) + r_23*cos(th_1s1))/sin(th_4s2), -r_13*sin(th_23s2)*cos(th_1s1) - r_23*sin(th_1s1)*sin(th_23s2) - r_33*cos(th_23s2))
-th_5s7 = atan2((-r_13*sin(th_1s1) + r_23*cos(th_1s1))/sin(th_4s8), -r_13*sin(th_23s3)*cos(th_1s1) - r_23*sin(th_1s1)*sin(th_23s3) - r_33*cos(th_23s3))
-th_5s5 = atan2((-r_13*sin(th_1s2) + r_23*cos(th_1s2))/sin(th_4s4), -r_13*sin(th_23s4)*cos(th_1s2) - r_23*sin(th_1s2)*sin(th_23s4) - r_33*cos(th_23s4))
-
-
-#Variable:  th_6
-th_6s6 = atan2(-(-r_12*sin(th_23s2)*cos(th_1s1) - r_22*sin(th_1s1)*sin(th_23s2) - r_32*cos(th_23s2))/sin(th_5s3), (-r_11*sin(th_23s2)*cos(th_1s1) - r_21*sin(th_1s1)*sin(th_23s2) - r_31*cos(th_23s2))/sin(th_5s3))
-th_6s5 = atan2(-(-r_12*sin(th_23s2)*cos(th_1s1) - r_22*sin(th_1s1)*sin(th_23s2) - r_32*cos(th_23s2))/sin(th_5s6), (-r_11*sin(th_23s2)*cos(th_1s1) - r_21*sin(th_1s1)*sin(th_23s2) - r_31*cos(th_23s2))/sin(th_5s6))
-th_6s1 = atan2(-(-r_12*sin(th_23s1)*cos(th_1s2) - r_22*sin(th_1s2)*sin(th_23s1) - r_32*cos(th_23s1))/sin(th_5s4), (-r_11*sin(th_23s1)*cos(th_1s2) - r_21*sin(th_1s2)*sin(th_23s1) - r_31*cos(th_23s1))/sin(th_5s4))
-th_6s8 = atan2(-(-r_12*sin(th_23s4)*cos(th_1s2) - r_22*sin(th_1s2)*sin(th_23s4) - r_32*cos(th_23s4))/sin(th_5s5), (-r_11*sin(th_23s4)*cos(th_1s2) - r_21*sin(th_1s2)*sin(th_23s4) - r_31*cos(th_23s4))/sin(th_5s5))
-th_6s4 = atan2(-(-r_12*sin(th_23s3)*cos(th_1s1) - r_22*sin(th_1s1)*sin(th_23s3) - r_32*cos(th_23s3))/sin(th_5s2), (-r_11*sin(th_23s3)*cos(th_1s1) - r_21*sin(th_1s1)*sin(th_23s3) - r_31*cos(th_23s3))/sin(th_5s2))
-th_6s2 = atan2(-(-r_12*sin(th_23s1)*cos(th_1s2) - r_22*sin(th_1s2)*sin(th_23s1) - r_32*cos(th_23s1))/sin(th_5s8), (-r_11*sin(th_23s1)*cos(th_1s2) - r_21*sin(th_1s2)*sin(th_23s1) - r_31*cos(th_23s1))/sin(th_5s8))
-th_6s7 = atan2(-(-r_12*sin(th_23s3)*cos(th_1s1) - r_22*sin(th_1s1)*sin(th_23s3) - r_32*cos(th_23s3))/sin(th_5s7), (-r_11*sin(th_23s3)*cos(th_1s1) - r_21*sin(th_1s1)*sin(th_23s3) - r_31*cos(th_23s3))/sin(th_5s7))
-th_6s3 = atan2(-(-r_12*sin(th_23s4)*cos(th_1s2) - r_22*sin(th_1s2)*sin(th_23s4) - r_32*cos(th_23s4))/sin(th_5s1), (-r_11*sin(th_23s4)*cos(th_1s2) - r_21*sin(th_1s2)*sin(th_23s4) - r_31*cos(th_23s4))/sin(th_5s1))
-
-##################################
+#   The solver is any module with the batch API of the generated code:
+#       JOINTS, NSOLUTIONS        joint names, in the order of out[..., k]
+#       ikin_batch(T, out=None, valid=None) -> out, valid
+#                                 T (n,4,4), out (n,NSOL,NJOINTS), valid (n,NSOL)
+#   i.e. CodeGen/Python/IK_equations<robot>_nb.py (default) or, with --cpp,
+#   CodeGen/Cpp/IK_equations<robot>_lib.py (build_<robot>.sh first).
 #
-#package the solutions into a list for each set
+#   Poses are a dataset directory (ikbtbasics/pose_dataset.py), or a .npy
+#   file of shape (N,4,4); both are opened memory-mapped.  Without one, a
+#   dataset <dir>/<robot>/ of N random reachable poses (FK of random
+#   joint angles) is made first.  <dir> is -o dir (e.g. solution_num/, not
+#   tracked) or a new temporary directory.  For a dataset, the solutions are written
+#   into it (solutions.npy, valid.npy) and read back from there.
 #
-###################################
-solution_list = []
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s2,  th_23s4,  th_2s2,  th_3s4,  th_4s3,  th_5s1,  th_6s3,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s1,  th_23s3,  th_2s4,  th_3s1,  th_4s7,  th_5s2,  th_6s4,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s1,  th_23s2,  th_2s1,  th_3s2,  th_4s2,  th_5s3,  th_6s6,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s2,  th_23s1,  th_2s3,  th_3s3,  th_4s6,  th_5s4,  th_6s1,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s2,  th_23s4,  th_2s2,  th_3s4,  th_4s4,  th_5s5,  th_6s8,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s1,  th_23s2,  th_2s1,  th_3s2,  th_4s1,  th_5s6,  th_6s5,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s1,  th_23s3,  th_2s4,  th_3s1,  th_4s8,  th_5s7,  th_6s7,  ] )
-#(note trailing commas allowed in python
-solution_list.append( [  th_1s2,  th_23s1,  th_2s3,  th_3s3,  th_4s5,  th_5s8,  th_6s2,  ] )
-
-
-
+#   The poses are read, solved and checked batch by batch: every valid
+#   solution goes back through the FK (the robot's T_06, lambdified, so
+#   vectorized over the batch) and is compared with its pose.  Per pose
+#       [number of valid solutions, number of them off by more than TOL,
+#        max position error, max rotation error (max |dR_ij|)]
+#   is written to <dir>/<robot>_errors.npy (a memmap, flushed after
+#   each batch), so nothing the size of the dataset is kept in memory.
 
-# convert to degree
-solution_list = convert_to_degrees(solution_list)
+# Copyright 2017 University of Washington
 
-# create a template
-# write down the symbol for each variable in order (solution_list)
-variable_temp = [th_1, th_23, th_2, th_3, th_4, th_5, th_6]
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
 
-# test if each pose can generate the same T matrices
-
-T_matrices = verify_T_matrices(solution_list, variable_temp, M, params_num)
-
-
-save_dir = 'solution_num/'
-if not os.path.isdir(save_dir):
-    os.mkdir(save_dir)
-
-# save the original version
-np.save('solution_num/Puma_Solutions.npy', solution_list)
-np.save('solution_num/Puma_T_matrices.npy', T_matrices)
-
-# print the truncated/round up version
-
-# print poses/solutions
-# to print float up to 5 decimal places
-class prettyfloat(float):
-    def __repr__(self):
-        #return "%0.5f" % self
-        return "{:10.5f}".format(self)
-        
-for a_set in solution_list:
-    truncated_pose = map(prettyfloat, a_set)
-    print truncated_pose
-
-# this indexing is only for Numpy Array
-def printNumArray(a):
-    for row in range(a.shape[0]):
-        row_ls = a[row].tolist()
-        truncate = map(prettyfloat, row_ls[0])
-        print truncate
-    print '\n'
-
-    
-# print the original T matrix
-print "the original T matrix"
-printNumArray(T)
-
-print "T matrices calculated from solution poses"
-for one_T in T_matrices:
-    printNumArray(one_T)
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
 
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
 
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
 
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sys
+import os
+import argparse
+import importlib
+import unittest
+
+import numpy as np
+import sympy as sp
+from numpy.lib.format import open_memmap
+
+from ikbtbasics.pose_dataset import PoseDataset
+
+BATCH = 10000       # poses per batch
+NPOSE = 100000      # random poses when no pose file is given
+TOL = 1.0e-6        # a solution is bad if its FK is off by more than this
+STATS = ['nvalid', 'nbad', 'pos_err', 'rot_err']   # columns of <robot>_errors.npy
+
+
+def fk_batch(T_06, pvals, joints):
+    """fk(q): q (n, len(joints)) joint values -> (n,4,4) poses"""
+    T = sp.Matrix(T_06).subs(pvals)
+    syms = [sp.Symbol(str(j)) for j in joints]
+    extra = T.free_symbols - set(syms)
+    if len(extra) > 0:
+        raise ValueError('solChecker: no numerical value for: ' + str(extra))
+    fns = [[sp.lambdify(syms, T[i, j], 'numpy') for j in range(4)] for i in range(3)]
+
+    def fk(q):
+        n = q.shape[0]
+        out = np.zeros((n, 4, 4))
+        out[:, 3, 3] = 1.0
+        cols = [q[:, k] for k in range(q.shape[1])]
+        for i in range(3):
+            for j in range(4):
+                out[:, i, j] = fns[i][j](*cols)  # (constants broadcast)
+        return out
+    return fk
+
+
+def load_solver(robot, cpp=False):
+    # the generated batch solver for robot
+    if cpp:
+        d = 'CodeGen/Cpp'
+        mod = 'IK_equations' + robot + '_lib'
+    else:
+        d = 'CodeGen/Python'
+        mod = 'IK_equations' + robot + '_nb'
+    if not os.path.isfile(os.path.join(d, mod + '.py')):
+        raise FileNotFoundError('solChecker: no generated solver ' + os.path.join(d, mod + '.py') +
+                                '   (run ikSolver.py for ' + robot + ')')
+    sys.path.insert(0, d)
+    return importlib.import_module(mod)
+
+
+def load_poses(fname):
+    # a PoseDataset (directory) or an (N,4,4) array
+    if os.path.isdir(fname):
+        return PoseDataset(fname, 'r+')
+    poses = np.load(fname, mmap_mode='r')
+    assert poses.ndim == 3 and poses.shape[1:] == (4, 4), 'poses must be (N,4,4): ' + fname
+    return poses
+
+
+def random_poses(fk, njoints, n, path, robot='', batch=BATCH, seed=0):
+    # dataset of FK of random joint values (every pose reachable)
+    rng = np.random.default_rng(seed)
+    ds = PoseDataset.create(path, n, robot=robot, source='FK of random joint angles',
+                            seed=seed)
+    for [a, b] in ds.chunks(batch):
+        ds.poses[a:b] = fk(rng.uniform(-np.pi, np.pi, (b - a, njoints)))
+    ds.flush()
+    return ds
+
+
+def solved(solver, poses, batch):
+    # [a, b, T, out, valid] for each batch of poses (array or PoseDataset)
+    if isinstance(poses, PoseDataset):
+        poses.solve(solver, batch)
+        for [a, b] in poses.chunks(batch):
+            yield [a, b, poses.poses[a:b], poses.solutions[a:b], poses.valid(a, b)]
+        return
+    for a in range(0, poses.shape[0], batch):
+        b = min(a + batch, poses.shape[0])
+        T = np.ascontiguousarray(poses[a:b], dtype=np.float64)
+        [out, valid] = solver.ikin_batch(T)
+        yield [a, b, T, out, valid]
+
+
+def check(fk, solver, poses, fname, batch=BATCH, tol=TOL):
+    """solve poses with solver, FK the solutions, per pose stats (STATS) to
+    fname (.npy).  Returns the summary dict."""
+    N = len(poses)
+    stats = open_memmap(fname, mode='w+', dtype=np.float64, shape=(N, len(STATS)))
+    s = {'poses': N, 'unsolved': 0, 'solutions': 0, 'bad': 0,
+         'max_pos_err': 0.0, 'max_rot_err': 0.0, 'sum_pos_err': 0.0}
+    for [a, b, T, out, valid] in solved(solver, poses, batch):
+        [n, ns, nj] = out.shape
+        with np.errstate(all='ignore'):     # (invalid solutions are nan)
+            Tq = fk(out.reshape(-1, nj)).reshape(n, ns, 4, 4)
+            dp = np.linalg.norm(Tq[:, :, :3, 3] - T[:, None, :3, 3], axis=2)
+            dr = np.abs(Tq[:, :, :3, :3] - T[:, None, :3, :3]).max(axis=(2, 3))
+        dp = np.where(valid, dp, -np.inf)
+        dr = np.where(valid, dr, -np.inf)
+        nvalid = valid.sum(axis=1)
+        bad = valid & ((dp > tol) | (dr > tol) | np.isnan(dp) | np.isnan(dr))
+        pmax = dp.max(axis=1)
+        rmax = dr.max(axis=1)
+        stats[a:b, 0] = nvalid
+        stats[a:b, 1] = bad.sum(axis=1)
+        stats[a:b, 2] = np.where(nvalid > 0, pmax, np.nan)
+        stats[a:b, 3] = np.where(nvalid > 0, rmax, np.nan)
+        stats.flush()
+        s['unsolved'] += int((nvalid == 0).sum())
+        s['solutions'] += int(nvalid.sum())
+        s['bad'] += int(bad.sum())
+        if nvalid.sum() > 0:
+            s['max_pos_err'] = max(s['max_pos_err'], float(pmax.max()))
+            s['max_rot_err'] = max(s['max_rot_err'], float(rmax.max()))
+            s['sum_pos_err'] += float(dp[valid].sum())
+    del stats
+    s['mean_pos_err'] = s['sum_pos_err'] / s['solutions'] if s['solutions'] > 0 else float('nan')
+    return s
+
+
+def report(name, s):
+    print('\n' + name + ':  ' + str(s['poses']) + ' poses')
+    print('   no valid solution:       {:d}'.format(s['unsolved']))
+    print('   solutions checked:       {:d}'.format(s['solutions']))
+    print('   bad solutions (> TOL):   {:d}'.format(s['bad']))
+    print('   position error max/mean: {:.3e} / {:.3e}'.format(s['max_pos_err'], s['mean_pos_err']))
+    print('   rotation error max:      {:.3e}'.format(s['max_rot_err']))
+
+
+class TestSolChecker(unittest.TestCase):
+    def test_check(self):
+        import tempfile
+        import shutil
+        import types
+        th_1 = sp.Symbol('th_1')
+        l_1 = sp.Symbol('l_1')
+        T_06 = sp.Matrix([[sp.cos(th_1), -sp.sin(th_1), 0, l_1 * sp.cos(th_1)],
+                          [sp.sin(th_1), sp.cos(th_1), 0, l_1 * sp.sin(th_1)],
+                          [0, 0, 1, 0], [0, 0, 0, 1]])
+        fk = fk_batch(T_06, {l_1: 2.0}, ['th_1'])
+        with self.assertRaises(ValueError):
+            fk_batch(T_06, {}, ['th_1'])         # (no value for l_1)
+        with self.assertRaises(FileNotFoundError):
+            load_solver('NoSuchRobot')
+
+        def ikin_batch(T, out=None, valid=None):  # solution 0 right, 1 off by 0.1 rad, 2 never valid
+            th = np.arctan2(T[:, 1, 0], T[:, 0, 0])
+            if out is None:
+                out = np.empty((T.shape[0], 3, 1))
+                valid = np.empty((T.shape[0], 3), dtype=bool)
+            out[:, :, 0] = np.stack([th, th + 0.1, th * np.nan], axis=1)
+            valid[:] = True
+            valid[:, 2] = False
+            return out, valid
+        solver = types.SimpleNamespace(JOINTS=['th_1'], NSOLUTIONS=3, ikin_batch=ikin_batch)
+        d = tempfile.mkdtemp()
+        try:
+            ds = random_poses(fk, 1, 25, os.path.join(d, 'Test'), batch=10)
+            self.assertEqual(ds.poses.shape, (25, 4, 4))
+            np.save(os.path.join(d, 'poses.npy'), ds.poses)
+            s = check(fk, solver, ds, os.path.join(d, 'err.npy'), batch=10)
+            st = np.load(os.path.join(d, 'err.npy'))
+            self.assertEqual(ds.valid(0, 25).sum(), 50)     # (stored)
+            s2 = check(fk, solver, load_poses(os.path.join(d, 'poses.npy')),
+                       os.path.join(d, 'err2.npy'), batch=7)
+            self.assertEqual(s2, s)
+            del ds
+        finally:
+            shutil.rmtree(d)
+        self.assertEqual([s['poses'], s['unsolved'], s['solutions'], s['bad']], [25, 0, 50, 25])
+        self.assertEqual(st.shape, (25, len(STATS)))
+        self.assertTrue((st[:, 0] == 2).all() and (st[:, 1] == 1).all())
+        self.assertAlmostEqual(s['max_pos_err'], 2 * 2.0 * np.sin(0.05), 9)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='check a generated IK solver over many poses')
+    ap.add_argument('robot', nargs='?', default='Puma')
+    ap.add_argument('poses', nargs='?', default=None,
+                    help='dataset directory, or .npy file of shape (N,4,4)')
+    ap.add_argument('-n', '--npose', type=int, default=NPOSE, help='random poses (no pose file)')
+    ap.add_argument('-b', '--batch', type=int, default=BATCH)
+    ap.add_argument('-o', '--outdir', default=None,
+                    help='where the random poses and the errors go (default: a new temp dir)')
+    ap.add_argument('--cpp', action='store_true', help='check the C++ solver (ctypes)')
+    args = ap.parse_args()
+
+    from ikbtbasics.ik_classes import kinematics_pickle
+    from ikbtfunctions.ik_robots import robot_params
+
+    #   Get the robot model
+    [dh, vv, params, pvals, unknowns] = robot_params(args.robot)  # see ik_robots.py
+    [M, R, unknowns] = kinematics_pickle(args.robot, dh, params, pvals, vv, unknowns, False)
+
+    try:
+        solver = load_solver(args.robot, args.cpp)
+        fk = fk_batch(M.T_06, pvals, solver.JOINTS)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+    outdir = args.outdir
+    if outdir is None:
+        import tempfile
+        outdir = tempfile.mkdtemp(prefix='solChecker_')
+    elif not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    if args.poses is None:
+        poses = random_poses(fk, len(solver.JOINTS), args.npose, os.path.join(outdir, args.robot),
+                             args.robot, args.batch)
+    else:
+        poses = load_poses(args.poses)
+
+    errfile = os.path.join(outdir, args.robot + '_errors.npy')
+    s = check(fk, solver, poses, errfile, args.batch)
+    report(args.robot, s)
+    print('   per pose ' + str(STATS) + ': ' + errfile)
@@ -47,6 +47,8 @@ from ikbtleaves.tan_solver import *
 from ikbtleaves.sub_transform import *
 from ikbtleaves.updateL import *
 from ikbtleaves.x2y2_transform import *
+from ikbtleaves.parallel_assigner import *
+from ikbtleaves.sum_id import sum_id, soa_replace
 
 
 import b3 as b3          # behavior trees
@@ -108,6 +110,68 @@ class TestIkClass(unittest.TestCase):
         assert term2a == sp.sin(th_123), fs
         
 
+    def test_SOA_dh(self):
+        # sums of angles found from the DH table (UR5-like: axes 2,3,4 parallel)
+        sp.var('a_2 a_3 d_1 d_4 d_5')
+        dh = sp.Matrix([
+            [0,  0,   d_1, th_1],
+            [sp.pi/2, 0, 0, th_2],
+            [0,  a_2, 0,   th_3],
+            [0,  a_3, d_4, th_4],
+            [sp.pi/2, 0, d_5, th_5],
+            [-sp.pi/2, 0, 0, th_6]])
+        m = kc.mechanism(dh, [], [1, 1, 1, 1, 1, 1])
+        cands = soa_candidates(m)
+        fs = 'soa_candidates: wrong sums of angles'
+        assert set(cands.keys()) == set([th_2+th_3, th_3+th_4, th_2+th_3+th_4]), fs
+
+        unks01 = [kc.unknown(th_1), kc.unknown(th_2), kc.unknown(th_3), kc.unknown(th_4), kc.unknown(th_5), kc.unknown(th_6)]
+        for v in unks01:
+            v.n = int(str(v.symbol)[3:])
+        rtest = Robot()   # (without running the FK)
+        rtest.Mech = m
+        expr = a_2*sp.sin(th_2) + a_3*sp.sin(th_2 + th_3) - d_5*sp.cos(th_2 + th_3 + th_4)
+        term, newj, newe = sum_of_angles_sub(rtest, expr, unks01)
+        fs = 'sum_of_angles_sub: DH sums of angles not substituted'
+        th_23, th_234 = sp.symbols('th_23 th_234')
+        # 3-way sum is th_234, not th_23 + th_4
+        assert term == a_2*sp.sin(th_2) + a_3*sp.sin(th_23) - d_5*sp.cos(th_234), fs
+        assert len(unks01) == 8 and len(rtest.kequation_aux_list) == 2, fs
+
+    def test_sum_id_batch(self):
+        # sum_id: every sum of angles substituted in one pass, untouched entries kept
+        sp.var('l_1 l_2')
+        unks01 = [kc.unknown(th_1), kc.unknown(th_2), kc.unknown(th_3), kc.unknown(th_4)]
+        Ts = sp.zeros(4)
+        Ts[0, 0] = sp.sin(th_1 + th_2)
+        Ts[0, 1] = l_1*sp.cos(th_1 + th_2) + l_2*sp.sin(th_3)
+        Ts[1, 0] = sp.cos(th_4)
+        Ts[1, 1] = sp.sin(th_3 + th_4)
+        Ts[2, 2] = sp.cos(th_3 + th_4)*sp.sin(th_1)
+        rtest = Robot()
+        rtest.mequation_list = [kc.matrix_equation(ik_lhs(), Ts)]
+        Ts0 = rtest.mequation_list[0].Ts
+        bb = b3.Blackboard()
+        bb.set('Robot', rtest)
+        bb.set('unknowns', unks01)
+        tick = b3.Tick(tree=b3.BehaviorTree(), blackboard=bb)
+        sum_id().tick(tick)
+        Ts1 = rtest.mequation_list[0].Ts
+        fs = 'sum_id: sums of angles not substituted'
+        th_12, th_34 = sp.symbols('th_12 th_34')
+        assert Ts1[0, 0] == sp.sin(th_12), fs
+        assert Ts1[0, 1] == l_1*sp.cos(th_12) + l_2*sp.sin(th_3), fs
+        assert Ts1[1, 1] == sp.sin(th_34), fs
+        assert Ts1[2, 2] == sp.cos(th_34)*sp.sin(th_1), fs
+        assert Ts1[1, 0] is Ts0[1, 0], fs
+        assert len(unks01) == 6 and len(rtest.kequation_aux_list) == 2, fs
+        # found again (already an unknown): no new unknown
+        Ts2 = soa_replace(Ts1, [[th_1 + th_2, th_12]])
+        assert Ts2 is Ts1, fs
+        rtest.mequation_list[0].Ts = Ts0
+        sum_id().tick(tick)
+        assert len(unks01) == 6 and len(rtest.kequation_aux_list) == 2, fs
+
     def test_SOA_idsub_2(self):
             
         #####################################################################
@@ -360,6 +424,57 @@ class TestIkClass(unittest.TestCase):
         #print l
         self.assertEqual(l,[e2, e1, e3], ' Equation length sorting FAIL')
 
+    def test_eqn_index(self):
+        # scan_for_equations(): equations kept while unchanged, eqnlist a view
+        Ts = sp.zeros(4)
+        Ts[0, 0] = sp.sin(th_1)
+        Ts[0, 1] = l_1*sp.cos(th_1) + l_2*sp.sin(th_2)
+        Ts[1, 0] = sp.cos(th_1)     # (same equation as [1,0] of the 2nd one)
+        Ts[1, 1] = sp.sin(th_2)*sp.cos(th_3)
+        R = Robot()
+        R.mequation_list = [kc.matrix_equation(ik_lhs(), Ts), kc.matrix_equation(ik_lhs(), Ts)]
+        unks = [kc.unknown(th_1), kc.unknown(th_2), kc.unknown(th_3)]
+        [L1, L2, L3p] = R.scan_for_equations(unks)
+        fs = 'equation index FAIL'
+        self.assertEqual([str(e) for e in L1], ['r_11 = sin(th_1)', 'r_21 = cos(th_1)'], fs)
+        self.assertEqual([str(e) for e in L2], ['r_22 = sin(th_2)*cos(th_3)',
+                                                'r_12 = l_1*cos(th_1) + l_2*sin(th_2)'], fs)
+        self.assertEqual(unks[1].eqnlist, L2, fs)
+        self.assertEqual(len(R.eqn_index.by_symbol[th_2]), 4, fs)
+        unks[0].solved = True
+        R.mequation_list[1].Ts = R.mequation_list[1].Ts.subs(th_2, th_3)
+        [M1, M2, M3p] = R.scan_for_equations(unks)
+        self.assertTrue(M1[1] is L2[1], fs)     # unchanged: the same kequation
+        self.assertEqual(len(M1), 3, fs)
+        self.assertEqual(len(R.eqn_index.by_symbol[th_2]), 2, fs)   # 2 retired by subs()
+        self.assertEqual(len(unks[2].eqnlist), 3, fs)
+        import pickle
+        u2 = pickle.loads(pickle.dumps(unks[1]))
+        self.assertTrue(u2.eqn_index is None, fs)
+        self.assertEqual([str(e) for e in u2.eqnlist], [str(e) for e in unks[1].eqnlist], fs)
+        self.assertTrue(pickle.loads(pickle.dumps(R)).eqn_index.entries == {}, fs)
+
+    def test_notation_squeeze(self):
+        # one xreplace: joints of any name/number and the robot's SOA's
+        A, th_7, th_23, th_234 = sp.symbols('A th_7 th_23 th_234')
+        s_23, c_23, s_234, c_234, s_A, c_7 = sp.symbols('s_23 c_23 s_234 c_234 s_A c_7')
+        T = sp.Matrix([[sp.cos(th_1)*sp.sin(th_2 + th_3), sp.sin(th_2 + th_3 + th_4)],
+                       [sp.sin(A)*sp.cos(th_7), sp.cos(th_234) + sp.cos(th_5 - th_6)]])
+        fs = 'notation_squeeze FAIL'
+        self.assertEqual(notation_squeeze(T)[0, 0], c_1*s_23, fs)   # the old fixed pairs
+        self.assertEqual(notation_squeeze(T)[1, 0], sp.sin(A)*sp.cos(th_7), fs)
+        smap = squeeze_map([th_1, th_2, th_3, th_4, th_5, th_6, th_7, A],
+                           {th_23: th_2 + th_3, th_234: th_2 + th_3 + th_4})
+        self.assertTrue(squeeze_map([th_1, th_2, th_3, th_4, th_5, th_6, th_7, A],
+                                    {th_234: th_2 + th_3 + th_4, th_23: th_2 + th_3}) is smap, fs)
+        S = notation_squeeze(T, smap)
+        self.assertEqual(S, sp.Matrix([[c_1*s_23, s_234],
+                                       [s_A*c_7, c_234 + sp.cos(th_5 - th_6)]]), fs)
+        R = Robot()
+        R.kequation_aux_list = [kc.kequation(th_23, th_2 + th_3), kc.kequation(l_1, l_2**2)]
+        self.assertEqual(notation_squeeze(sp.sin(th_23)*sp.cos(th_2 + th_3), R.squeeze_map()),
+                         s_23*c_23, fs)
+
     def test_unkhash(self):
         # unknown class hash function testing
         a = unknown(th_1)
@@ -404,6 +519,7 @@ if __name__ == '__main__':
     suite2.addTest(TestSolver002())  # algebra_solver.py
     suite2.addTest(TestSolver003())  # sinANDcos_solver.py
     suite2.addTest(TestSolver004())  # tan_solver.py
+    suite2.addTest(TestSolver011())  # parallel_assigner.py
     
     # test the transforms and misc. tests
     suite3 = unittest.TestLoader().loadTestsFromTestCase(TestSolver006)  # sub_transform.py